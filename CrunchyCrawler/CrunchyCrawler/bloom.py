@@ -0,0 +1,185 @@
+"""
+Scalable Bloom filter with on-disk snapshots.
+
+A ScalableBloomFilter is a chain of fixed-size Bloom filters ("slices"):
+when a slice reaches its capacity a new one, twice as large and with a
+tighter error rate, is appended, so the overall false-positive rate stays
+below `error_rate` however many items are added (Almeida et al. 2007).
+
+Slice geometry is derived only from (initial_capacity, error_rate, index),
+so two filters built with the same parameters can be merged by OR-ing
+slice bits. That is what lets several crawler processes share one snapshot
+file: each process merges the file into memory and writes the union back.
+Each slice counts the adds made since the last merge, and a merge adds them
+to the snapshot's count, so a slice shared by several processes is marked
+full once it holds its capacity in total, not per process.
+
+Sizing: a first slice of 1M URLs at 1% error is ~1.4 MB; 5M is ~7 MB.
+"""
+
+import fcntl
+import hashlib
+import math
+import os
+import struct
+import tempfile
+
+SNAPSHOT_MAGIC = b"CRBF"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct(">4sBQdI")  # magic, version, initial_capacity, error_rate, n_slices
+_SLICE_HEADER = struct.Struct(">QQ")  # count, n_bytes
+
+
+class BloomSlice(object):
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.n_hashes = max(1, int(math.ceil(math.log(1.0 / error_rate, 2))))
+        n_bits = int(math.ceil(
+            capacity * abs(math.log(error_rate)) / (math.log(2) ** 2)
+        ))
+        self.n_bytes = (n_bits + 7) // 8
+        self.n_bits = self.n_bytes * 8
+        self.bits = bytearray(self.n_bytes)
+        self.count = 0
+        # Adds since the last merge with the shared snapshot
+        self.added = 0
+
+    def _positions(self, key):
+        # Kirsch-Mitzenmacher: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1, h2 = struct.unpack(">QQ", digest)
+        for i in range(self.n_hashes):
+            yield (h1 + i * h2) % self.n_bits
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key):
+        bits = self.bits
+        for p in self._positions(key):
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+        self.added += 1
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter(object):
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, initial_capacity=1_000_000, error_rate=0.01):
+        self.initial_capacity = int(initial_capacity)
+        self.error_rate = float(error_rate)
+        self.slices = []
+
+    def _new_slice(self, index):
+        capacity = self.initial_capacity * self.GROWTH ** index
+        # Errors of all slices sum to at most error_rate (geometric series)
+        error = self.error_rate * (1 - self.TIGHTENING) * self.TIGHTENING ** index
+        return BloomSlice(capacity, error)
+
+    @staticmethod
+    def _key(item):
+        return item.encode("utf-8") if isinstance(item, str) else item
+
+    def __contains__(self, item):
+        key = self._key(item)
+        return any(key in s for s in reversed(self.slices))
+
+    def add(self, item):
+        """Add item; return True if it was already (probably) present."""
+        key = self._key(item)
+        if any(key in s for s in self.slices):
+            return True
+        if not self.slices or self.slices[-1].full:
+            self.slices.append(self._new_slice(len(self.slices)))
+        self.slices[-1].add(key)
+        return False
+
+    def __len__(self):
+        return sum(s.count for s in self.slices)
+
+    @property
+    def nbytes(self):
+        return sum(s.n_bytes for s in self.slices)
+
+    def merge(self, other):
+        """
+        OR another filter with the same parameters into this one.
+
+        `other` is the shared snapshot, which already holds everything this
+        filter had at its last merge: a slice's count becomes the snapshot's
+        plus this filter's adds since then.
+        """
+        if (other.initial_capacity, other.error_rate) != (self.initial_capacity, self.error_rate):
+            raise ValueError("Cannot merge Bloom filters with different parameters")
+        for index, theirs in enumerate(other.slices):
+            if index >= len(self.slices):
+                self.slices.append(self._new_slice(index))
+            mine = self.slices[index]
+            merged = int.from_bytes(mine.bits, "big") | int.from_bytes(theirs.bits, "big")
+            mine.bits = bytearray(merged.to_bytes(mine.n_bytes, "big"))
+            mine.count = theirs.count + mine.added
+        # Slices the snapshot does not have yet keep their own count; from now on all of it is shared
+        for mine in self.slices:
+            mine.added = 0
+
+    def dumps(self):
+        parts = [_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+            self.initial_capacity, self.error_rate, len(self.slices),
+        )]
+        for s in self.slices:
+            parts.append(_SLICE_HEADER.pack(s.count, s.n_bytes))
+            parts.append(bytes(s.bits))
+        return b"".join(parts)
+
+    @classmethod
+    def loads(cls, data):
+        magic, version, capacity, error_rate, n_slices = _HEADER.unpack_from(data, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("Not a Bloom filter snapshot")
+        bf = cls(capacity, error_rate)
+        offset = _HEADER.size
+        for index in range(n_slices):
+            count, n_bytes = _SLICE_HEADER.unpack_from(data, offset)
+            offset += _SLICE_HEADER.size
+            s = bf._new_slice(index)
+            if s.n_bytes != n_bytes:
+                raise ValueError("Corrupt Bloom filter snapshot")
+            s.bits = bytearray(data[offset:offset + n_bytes])
+            s.count = count
+            offset += n_bytes
+            bf.slices.append(s)
+        return bf
+
+    def sync(self, path):
+        """
+        Merge the snapshot at `path` into this filter and write the union back.
+
+        Holds an exclusive lock on `path + ".lock"` for the read-merge-write so
+        processes sharing the file never lose each other's fingerprints.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        self.merge(self.loads(f.read()))
+                else:
+                    self.merge(ScalableBloomFilter(self.initial_capacity, self.error_rate))
+                fd, tmp = tempfile.mkstemp(dir=directory, prefix=".bloom-")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(self.dumps())
+                os.replace(tmp, path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,279 @@
+"""
+Per-source pool of Playwright browser contexts with warm, reused pages.
+
+Each source (Crunchbase, Tracxn) gets its own browser context, named
+"<source>-<generation>", and a list of idle pages. A request for a source
+is handed an idle page if there is one (scrapy-playwright navigates an
+existing page passed in meta "playwright_page" instead of opening a new
+one). The spider releases the page when it is done with it: the page is
+blanked and goes back to the idle list instead of being closed.
+
+A context is recycled (the source moves to a new generation and the old
+context closes once its last page comes back) after `recycle_after`
+navigations, or right away when the source gets a Cloudflare challenge.
+That way cookies and fingerprints which have been flagged are dropped.
+
+With the proxy pool, a proxy is a setting of the browser context: each
+(source, proxy) pair gets its own contexts, named "<source>@<host:port>-
+<generation>", and a challenge only retires the context of the proxy that
+got it.
+
+Concurrency per source is capped by the Scrapy download slot of the
+source's domain (DOWNLOAD_SLOTS, built from BROWSER_POOL_SOURCES in
+settings), so Tracxn can run many pages in parallel while Crunchbase stays
+at one. Requests are routed to that slot through meta "download_slot", and
+the AIMD throttle keeps adjusting its delay.
+
+A response that will not reach a callback never gets its page released by
+the spider: RetryMiddleware replaces it with a copy of the request, or
+HttpErrorMiddleware drops its status. BrowserPoolMiddleware releases the
+page of those responses itself, with the same checks as those middlewares.
+"""
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.defer import deferred_from_coro
+from loguru import logger
+from CrunchyCrawler.proxy_pool import PROXY_KEY
+from CrunchyCrawler.signals import cloudflare_challenge
+from CrunchyCrawler.utils import extract_proxy_hostport
+
+DEFAULT_SOURCES = {
+    "crunchbase": {"domain": "crunchbase.com", "concurrency": 1, "recycle_after": 40},
+    "tracxn": {"domain": "tracxn.com", "concurrency": 12, "recycle_after": 200},
+}
+
+POOL_CONTEXT_KEY = "browser_pool_context"
+
+
+class _Context(object):
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.context = None
+        self.navigations = 0
+        self.in_use = 0
+        self.idle = []
+        self.retired = False
+
+
+class BrowserPool(object):
+    """Hands out warm pages per source and recycles contexts."""
+
+    def __init__(self, sources, stats=None):
+        """
+        Args:
+            sources: {source: {"domain", "concurrency", "recycle_after"}}
+        """
+        self.sources = sources
+        self.stats = stats
+        # Keyed by (source, proxy); proxy is None without the proxy pool
+        self._generation = {}
+        self._current = {}
+        self._contexts = {}
+
+    def _inc(self, key):
+        if self.stats:
+            self.stats.inc_value(f"browser_pool/{key}")
+
+    def source_for(self, request):
+        """Crawl source of a request: its crawl queue label, else its domain."""
+        queue = request.meta.get("queue")
+        if queue in self.sources:
+            return queue
+        for source, conf in self.sources.items():
+            if conf["domain"] in request.url:
+                return source
+        return None
+
+    def _current_context(self, source, proxy=None):
+        key = (source, proxy)
+        state = self._current.get(key)
+        if state is None or state.retired:
+            self._generation[key] = self._generation.get(key, 0) + 1
+            prefix = source if proxy is None else f"{source}@{extract_proxy_hostport(proxy)}"
+            state = _Context(f"{prefix}-{self._generation[key]}", source)
+            self._current[key] = state
+            self._contexts[state.name] = state
+        return state
+
+    def acquire(self, request, source):
+        """Route the request to the source's context, with a warm page if one is idle."""
+        state = self._current_context(source, request.meta.get(PROXY_KEY))
+        request.meta["playwright_context"] = state.name
+        request.meta[POOL_CONTEXT_KEY] = state.name
+        request.meta.setdefault("download_slot", self.sources[source]["domain"])
+        while state.idle:
+            page = state.idle.pop()
+            if not page.is_closed():
+                request.meta["playwright_page"] = page
+                self._inc(f"{source}/page_reused")
+                break
+        else:
+            self._inc(f"{source}/page_new")
+        state.in_use += 1
+        state.navigations += 1
+        recycle_after = self.sources[source].get("recycle_after") or 0
+        if recycle_after and state.navigations >= recycle_after:
+            self._retire(state, "recycled")
+
+    def _retire(self, state, reason):
+        if state.retired:
+            return
+        state.retired = True
+        logger.info("Browser context {} retired ({}, {} navigations)", state.name, reason, state.navigations)
+        self._inc(f"{state.source}/context_{reason}")
+
+    def retire_source(self, source, reason, proxy=None):
+        state = self._current.get((source, proxy))
+        if state is not None:
+            self._retire(state, reason)
+
+    def release(self, meta, failed=False):
+        """
+        Give back the page of a finished request (idempotent); await the result.
+
+        The page and context are taken out of meta right away, before the
+        coroutine runs: a copy of the request (retry, solve stage) must get a
+        page of its own from `acquire`, not drive one that is back in the
+        idle list. The page of a failed download (`failed`) is closed rather
+        than reused.
+        """
+        name = meta.pop(POOL_CONTEXT_KEY, None)
+        page = meta.pop("playwright_page", None)
+        if name is not None:
+            meta.pop("playwright_context", None)
+        return self._give_back(name, page, failed)
+
+    async def _give_back(self, name, page, failed):
+        state = self._contexts.get(name)
+        if state is None:
+            # Not a pooled request: close the page as the spider used to
+            await self._close(page)
+            return
+        state.in_use -= 1
+        if page is not None and state.context is None:
+            state.context = page.context
+        if (
+            failed
+            or page is None
+            or page.is_closed()
+            or state.retired
+            or len(state.idle) >= self.sources[state.source]["concurrency"]
+        ):
+            await self._close(page)
+        else:
+            try:
+                # Stop scripts and free the DOM before the page waits for its next URL
+                await page.goto("about:blank")
+                state.idle.append(page)
+            except Exception as e:
+                logger.debug(f"Dropping page of {state.name}: {e}")
+                await self._close(page)
+        if state.retired and state.in_use <= 0:
+            await self._close_context(state)
+
+    async def _close(self, page):
+        if page is None or page.is_closed():
+            return
+        try:
+            await page.close()
+        except Exception as e:
+            logger.debug(f"Error closing page: {e}")
+
+    async def _close_context(self, state):
+        self._contexts.pop(state.name, None)
+        for page in state.idle:
+            await self._close(page)
+        state.idle = []
+        if state.context is not None:
+            try:
+                await state.context.close()
+            except Exception as e:
+                logger.debug(f"Error closing context {state.name}: {e}")
+        logger.debug("Browser context {} closed", state.name)
+
+
+class BrowserPoolMiddleware(object):
+    """Downloader middleware: assigns pooled contexts/pages to Playwright requests."""
+
+    def __init__(self, pool, retry_http_codes=(), allowed_codes=(), allow_all=False):
+        """
+        Args:
+            retry_http_codes: statuses RetryMiddleware retries (empty if retries are disabled)
+            allowed_codes / allow_all: HTTPERROR_ALLOWED_CODES / HTTPERROR_ALLOW_ALL
+        """
+        self.pool = pool
+        self.retry_http_codes = set(retry_http_codes)
+        self.allowed_codes = set(allowed_codes)
+        self.allow_all = allow_all
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("BROWSER_POOL_ENABLED", True):
+            raise NotConfigured
+        pool = BrowserPool(settings.getdict("BROWSER_POOL_SOURCES", DEFAULT_SOURCES), stats=crawler.stats)
+        retry_http_codes = settings.getlist("RETRY_HTTP_CODES") if settings.getbool("RETRY_ENABLED") else ()
+        instance = cls(
+            pool,
+            retry_http_codes=(int(code) for code in retry_http_codes),
+            allowed_codes=settings.getlist("HTTPERROR_ALLOWED_CODES"),
+            allow_all=settings.getbool("HTTPERROR_ALLOW_ALL"),
+        )
+        crawler.signals.connect(instance.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(instance.spider_error, signal=signals.spider_error)
+        crawler.signals.connect(instance.challenge, signal=cloudflare_challenge)
+        return instance
+
+    def spider_opened(self, spider):
+        # The spider releases pages through the pool instead of closing them
+        spider.browser_pool = self.pool
+
+    def process_request(self, request, spider):
+        if not request.meta.get("playwright") or POOL_CONTEXT_KEY in request.meta:
+            return None
+        if request.meta.get("playwright_page") is not None:
+            # Already carries a page of its own
+            return None
+        source = self.pool.source_for(request)
+        if source is not None:
+            self.pool.acquire(request, source)
+        return None
+
+    def _reaches_callback(self, request, response, spider):
+        """Whether RetryMiddleware and HttpErrorMiddleware let the response through to the spider."""
+        status = response.status
+        if status in self.retry_http_codes and not request.meta.get("dont_retry"):
+            # Replaced by a retry (or passed on once retries run out: its callback finds no page then)
+            return False
+        if 200 <= status < 300 or request.meta.get("handle_httpstatus_all"):
+            return True
+        if "handle_httpstatus_list" in request.meta:
+            return status in request.meta["handle_httpstatus_list"]
+        if self.allow_all:
+            return True
+        return status in getattr(spider, "handle_httpstatus_list", self.allowed_codes)
+
+    def process_response(self, request, response, spider):
+        if POOL_CONTEXT_KEY in request.meta and not self._reaches_callback(request, response, spider):
+            # The spider will never release this page: back to the pool now
+            deferred_from_coro(self.pool.release(request.meta))
+        return response
+
+    def process_exception(self, request, exception, spider):
+        # The page was never handed to a callback: give it back here, closed
+        if POOL_CONTEXT_KEY in request.meta:
+            deferred_from_coro(self.pool.release(request.meta, failed=True))
+        return None
+
+    def spider_error(self, failure, response, spider):
+        if POOL_CONTEXT_KEY in response.meta:
+            deferred_from_coro(self.pool.release(response.meta))
+
+    def challenge(self, request, response, spider):
+        """A flagged context keeps getting challenged: start a fresh one for the source."""
+        source = self.pool.source_for(request)
+        if source is not None:
+            self.pool.retire_source(source, "blocked", request.meta.get(PROXY_KEY))
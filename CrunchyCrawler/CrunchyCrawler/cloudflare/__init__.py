@@ -3,11 +3,16 @@ Cloudflare challenge detection and bypass module.
 
 This module provides functionality to:
 - Detect Cloudflare challenges in responses
-- Solve challenges using FlareSolverr (free, open-source)
+- Solve challenges using FlareSolverr (free, open-source), through a
+  bounded pool of FlareSolverr sessions
 - Retrieve solved HTML content and cookies
+- Reuse solved clearance cookies until they expire
+- Solve challenges in the background while the crawl goes on
 """
 
 from .handler import (
+    ChallengeVerdict,
+    detect_challenge,
     is_cloudflare_challenge,
     is_cloudflare_challenge_async,
     solve_with_flaresolverr,
@@ -15,12 +20,18 @@ from .handler import (
     destroy_flaresolverr_session,
     CloudflareHandler,
 )
+from .clearance import ClearanceCache
+from .solver import FlareSolverrClient
 
 __all__ = [
+    'ChallengeVerdict',
+    'detect_challenge',
     'is_cloudflare_challenge',
     'is_cloudflare_challenge_async',
     'solve_with_flaresolverr',
     'create_flaresolverr_session',
     'destroy_flaresolverr_session',
     'CloudflareHandler',
+    'ClearanceCache',
+    'FlareSolverrClient',
 ]
@@ -0,0 +1,234 @@
+"""
+Cache of Cloudflare clearances solved by FlareSolverr.
+
+A FlareSolverr solve returns the cookies (cf_clearance, __cf_bm, ...) and
+the user agent of the browser that passed the challenge. Cloudflare only
+honours cf_clearance with that same user agent and from the same client IP,
+so the solve goes through the request's proxy (proxy_pool.PROXY_KEY) and
+clearances are keyed by (domain, user agent, proxy). They are kept until the
+cf_clearance cookie expires (capped at CLEARANCE_MAX_AGE).
+
+ClearanceMiddleware injects a valid clearance into the requests of its
+domain:
+
+- plain HTTP requests get the cookies in request.cookies (CookiesMiddleware
+  turns them into the Cookie header);
+- Playwright requests get them added to the browser context: right away for
+  a pooled page, through meta "playwright_page_init_callback" for a new one.
+
+With CLEARANCE_PIN_USER_AGENT, a request whose user agent has no clearance
+is switched to the user agent of the newest clearance of its domain and
+proxy instead of going without. A cloudflare_challenge signal for a request sent with a
+clearance drops that clearance: Cloudflare no longer accepts it.
+"""
+
+import time
+import weakref
+from urllib.parse import urlparse
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from loguru import logger
+# Module import: proxy_pool imports this package (cloudflare.handler), so its names are only read at run time
+from CrunchyCrawler import proxy_pool
+from CrunchyCrawler.signals import cloudflare_challenge
+
+CLEARANCE_COOKIE = "cf_clearance"
+
+SAME_SITE = {"strict": "Strict", "lax": "Lax", "none": "None"}
+
+
+def _host(url):
+    return (urlparse(url).hostname or "").lower()
+
+
+def _user_agent(request):
+    agent = request.headers.get("User-Agent")
+    return agent.decode("utf-8", "ignore") if isinstance(agent, bytes) else (agent or "")
+
+
+class Clearance(object):
+
+    def __init__(self, domain, user_agent, cookies, expires_at, version, proxy=None):
+        self.domain = domain
+        self.user_agent = user_agent
+        self.proxy = proxy
+        self.cookies = cookies
+        self.expires_at = expires_at
+        self.version = version
+
+    def playwright_cookies(self):
+        """Cookies in the format of BrowserContext.add_cookies."""
+        converted = []
+        for cookie in self.cookies:
+            entry = {
+                "name": cookie["name"],
+                "value": cookie["value"],
+                "domain": cookie.get("domain") or f".{self.domain}",
+                "path": cookie.get("path") or "/",
+                "httpOnly": bool(cookie.get("httpOnly")),
+                "secure": bool(cookie.get("secure")),
+            }
+            if (cookie.get("expires") or -1) > 0:
+                entry["expires"] = cookie["expires"]
+            same_site = SAME_SITE.get(str(cookie.get("sameSite", "")).lower())
+            if same_site:
+                entry["sameSite"] = same_site
+            converted.append(entry)
+        return converted
+
+
+class ClearanceCache(object):
+    """Solved clearances by (domain, user agent, proxy), with expiry and invalidation."""
+
+    def __init__(self, max_age=1800, pin_user_agent=True, stats=None, clock=time.time):
+        self.max_age = max_age
+        self.pin_user_agent = pin_user_agent
+        self.stats = stats
+        self.clock = clock
+        self._entries = {}
+        self._version = 0
+
+    def _inc(self, key):
+        if self.stats:
+            self.stats.inc_value(f"clearance/{key}")
+
+    def store(self, url, user_agent, cookies, proxy=None):
+        """Keep the cookies of a solve made through `proxy`; returns the clearance (None without cookies)."""
+        cookies = [c for c in cookies or () if c.get("name") and "value" in c]
+        if not cookies or not user_agent:
+            return None
+        now = self.clock()
+        expires_at = now + self.max_age
+        domain = _host(url)
+        for cookie in cookies:
+            if cookie["name"] == CLEARANCE_COOKIE:
+                domain = (cookie.get("domain") or domain).lstrip(".").lower()
+                if (cookie.get("expires") or -1) > 0:
+                    expires_at = min(expires_at, cookie["expires"])
+        if domain.startswith("www."):
+            domain = domain[4:]
+        self._version += 1
+        clearance = Clearance(domain, user_agent, cookies, expires_at, self._version, proxy)
+        self._entries[(domain, user_agent, proxy)] = clearance
+        self._inc("stored")
+        logger.info("Stored Cloudflare clearance for {} ({} cookies, {:.0f}s)", domain, len(cookies), expires_at - now)
+        return clearance
+
+    def _valid(self, key):
+        clearance = self._entries.get(key)
+        if clearance is not None and clearance.expires_at <= self.clock():
+            del self._entries[key]
+            self._inc("expired")
+            return None
+        return clearance
+
+    def lookup(self, url, user_agent, proxy=None):
+        """
+        The clearance to send with a request to `url` through `proxy`: its own
+        user agent's, else the newest one of that proxy if pinning.
+        """
+        host = _host(url)
+        candidates = []
+        for key in list(self._entries):
+            domain, agent, solved_through = key
+            if solved_through != proxy or (host != domain and not host.endswith(f".{domain}")):
+                continue
+            clearance = self._valid(key)
+            if clearance is None:
+                continue
+            if agent == user_agent:
+                return clearance
+            candidates.append(clearance)
+        if self.pin_user_agent and candidates:
+            return max(candidates, key=lambda c: c.version)
+        return None
+
+    def invalidate(self, url, version):
+        """Drop clearance `version` of the domain of `url`: a challenge came back despite it."""
+        host = _host(url)
+        for key, clearance in list(self._entries.items()):
+            domain = key[0]
+            if (host == domain or host.endswith(f".{domain}")) and clearance.version == version:
+                del self._entries[key]
+                self._inc("invalidated")
+                logger.info("Cloudflare clearance for {} invalidated", domain)
+
+
+class ClearanceMiddleware(object):
+    """Downloader middleware: sends cached clearances with requests of their domain."""
+
+    def __init__(self, cache, stats=None):
+        self.cache = cache
+        self.stats = stats
+        # Clearance version already added to each Playwright context
+        self._context_versions = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("CLEARANCE_CACHE_ENABLED", True):
+            raise NotConfigured
+        cache = ClearanceCache(
+            max_age=settings.getint("CLEARANCE_MAX_AGE", 1800),
+            pin_user_agent=settings.getbool("CLEARANCE_PIN_USER_AGENT", True),
+            stats=crawler.stats,
+        )
+        instance = cls(cache, stats=crawler.stats)
+        crawler.signals.connect(instance.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(instance.challenge, signal=cloudflare_challenge)
+        return instance
+
+    def _inc(self, key):
+        if self.stats:
+            self.stats.inc_value(f"clearance/{key}")
+
+    def spider_opened(self, spider):
+        # The spider stores what FlareSolverr solves
+        spider.clearance_cache = self.cache
+
+    async def process_request(self, request, spider):
+        clearance = self.cache.lookup(request.url, _user_agent(request), request.meta.get(proxy_pool.PROXY_KEY))
+        if clearance is None:
+            return None
+        if clearance.user_agent != _user_agent(request):
+            request.headers["User-Agent"] = clearance.user_agent
+            self._inc("ua_pinned")
+        request.meta["cf_clearance_version"] = clearance.version
+        if not request.meta.get("playwright"):
+            cookies = {c["name"]: c["value"] for c in clearance.cookies}
+            if isinstance(request.cookies, dict):
+                request.cookies.update(cookies)
+            else:
+                request.cookies.extend({"name": k, "value": v} for k, v in cookies.items())
+            self._inc("hit/http")
+            return None
+        page = request.meta.get("playwright_page")
+        if page is not None:
+            await self._add_to_context(page.context, clearance)
+        else:
+            request.meta["playwright_page_init_callback"] = self._init_page
+        self._inc("hit/playwright")
+        return None
+
+    async def _init_page(self, page, request):
+        clearance = self.cache.lookup(request.url, _user_agent(request), request.meta.get(proxy_pool.PROXY_KEY))
+        if clearance is not None:
+            await self._add_to_context(page.context, clearance)
+
+    async def _add_to_context(self, context, clearance):
+        if self._context_versions.get(context) == clearance.version:
+            return
+        try:
+            await context.add_cookies(clearance.playwright_cookies())
+            self._context_versions[context] = clearance.version
+        except Exception as e:
+            logger.warning(f"Could not add Cloudflare clearance to browser context: {e}")
+
+    def challenge(self, request, response, spider):
+        version = request.meta.get("cf_clearance_version")
+        if version is None:
+            return
+        # Sent with a clearance and challenged anyway: Cloudflare no longer accepts it
+        self._inc("rejected")
+        self.cache.invalidate(request.url, version)
@@ -6,8 +6,10 @@ using the free, open-source FlareSolverr proxy server.
 """
 
 import asyncio
+import re
 import time
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, NamedTuple
+from urllib.parse import unquote, urlsplit
 from loguru import logger
 
 try:
@@ -36,6 +38,68 @@ CLOUDFLARE_TITLE_MARKERS = [
 ]
 
 
+# Only the head of the body is scanned: challenge pages are small and carry their
+# markers near the top, while a full page may mention them in unrelated scripts.
+CHALLENGE_SCAN_BYTES = 32 * 1024
+
+# One pass over the raw bytes for all body markers. The title is found by its literal
+# "<title" prefix and only its text is matched, case-insensitively: a case-insensitive
+# branch in the body pattern would be retried at every "<" of the page.
+_MARKERS_PATTERN = re.compile(b"|".join(re.escape(m.encode("utf-8")) for m in CLOUDFLARE_MARKERS))
+_TITLE_PATTERN = re.compile(rb"<title[^>]*>([^<]{0,256})")
+_TITLE_MARKERS_PATTERN = re.compile(
+    b"|".join(re.escape(m.encode("utf-8")) for m in CLOUDFLARE_TITLE_MARKERS), re.IGNORECASE
+)
+
+
+class ChallengeVerdict(NamedTuple):
+    """Outcome of detect_challenge; `reason` says what matched (None if no challenge)."""
+    is_challenge: bool
+    reason: Optional[str] = None
+
+    def __bool__(self):
+        return self.is_challenge
+
+
+NO_CHALLENGE = ChallengeVerdict(False)
+
+
+def match_challenge(data: bytes, max_bytes: int = CHALLENGE_SCAN_BYTES) -> Optional[str]:
+    """Reason string if the first `max_bytes` of `data` look like a challenge page, else None."""
+    match = _MARKERS_PATTERN.search(data, 0, max_bytes)
+    if match is not None:
+        return f"marker:{match.group().decode('utf-8')}"
+    title = _TITLE_PATTERN.search(data, 0, max_bytes)
+    if title is not None:
+        match = _TITLE_MARKERS_PATTERN.search(title.group(1))
+        if match is not None:
+            return f"title:{match.group().decode('utf-8')}"
+    return None
+
+
+def detect_challenge(response, max_bytes: int = CHALLENGE_SCAN_BYTES) -> ChallengeVerdict:
+    """
+    Detect a Cloudflare challenge from the status, headers and raw body head.
+    
+    Args:
+        response: Scrapy response object
+        max_bytes: How much of the body to scan
+        
+    Returns:
+        ChallengeVerdict (truthy on a challenge) with the reason
+    """
+    headers = getattr(response, "headers", None) or {}
+    mitigated = headers.get("cf-mitigated")
+    if mitigated and mitigated.lower() == b"challenge":
+        return ChallengeVerdict(True, "header:cf-mitigated")
+    reason = match_challenge(response.body, max_bytes)
+    if reason is None:
+        return NO_CHALLENGE
+    if response.status in (403, 503):
+        reason = f"status_{response.status}:{reason}"
+    return ChallengeVerdict(True, reason)
+
+
 def is_cloudflare_challenge(response) -> bool:
     """
     Detect if the response contains a Cloudflare challenge page.
@@ -46,27 +110,10 @@ def is_cloudflare_challenge(response) -> bool:
     Returns:
         True if Cloudflare challenge detected, False otherwise
     """
-    body = response.text if hasattr(response, 'text') else response.body.decode('utf-8', errors='ignore')
-    
-    # Check for Cloudflare markers in body
-    for marker in CLOUDFLARE_MARKERS:
-        if marker in body:
-            logger.info(f"Cloudflare challenge detected: found '{marker}'")
-            return True
-    
-    # Check page title
-    try:
-        from scrapy.selector import Selector
-        sel = Selector(response)
-        title = sel.xpath('//title/text()').get() or ''
-        for title_marker in CLOUDFLARE_TITLE_MARKERS:
-            if title_marker.lower() in title.lower():
-                logger.info(f"Cloudflare challenge detected: title contains '{title_marker}'")
-                return True
-    except Exception as e:
-        logger.debug(f"Error checking title: {e}")
-    
-    return False
+    verdict = detect_challenge(response)
+    if verdict:
+        logger.info(f"Cloudflare challenge detected: {verdict.reason}")
+    return verdict.is_challenge
 
 
 def is_cloudflare_challenge_from_html(html: str) -> bool:
@@ -79,10 +126,7 @@ def is_cloudflare_challenge_from_html(html: str) -> bool:
     Returns:
         True if Cloudflare challenge detected, False otherwise
     """
-    for marker in CLOUDFLARE_MARKERS:
-        if marker in html:
-            return True
-    return False
+    return match_challenge(html[:CHALLENGE_SCAN_BYTES].encode("utf-8", "ignore")) is not None
 
 
 async def is_cloudflare_challenge_async(page) -> bool:
@@ -97,32 +141,72 @@ async def is_cloudflare_challenge_async(page) -> bool:
     """
     try:
         content = await page.content()
-        
-        # Check for Cloudflare markers in content
-        for marker in CLOUDFLARE_MARKERS:
-            if marker in content:
-                logger.info(f"Cloudflare challenge detected (async): found '{marker}'")
-                return True
-        
-        # Check page title
-        title = await page.title()
-        for title_marker in CLOUDFLARE_TITLE_MARKERS:
-            if title_marker.lower() in title.lower():
-                logger.info(f"Cloudflare challenge detected (async): title contains '{title_marker}'")
-                return True
-                
+        reason = match_challenge(content[:CHALLENGE_SCAN_BYTES].encode("utf-8", "ignore"))
+        if reason is not None:
+            logger.info(f"Cloudflare challenge detected (async): {reason}")
+            return True
     except Exception as e:
         logger.debug(f"Error in async Cloudflare detection: {e}")
     
     return False
 
 
+def parse_flaresolverr_solution(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Turn a FlareSolverr request.get reply into the solve result.
+    
+    Args:
+        result: Decoded JSON reply of FlareSolverr
+        
+    Returns:
+        Dictionary with 'response', 'cookies', 'userAgent', 'status', 'headers',
+        or None if FlareSolverr failed or the page is still a challenge
+    """
+    if result.get("status") != "ok":
+        error_msg = result.get("message", "Unknown error")
+        logger.error(f"FlareSolverr failed: {error_msg}")
+        return None
+    
+    solution = result.get("solution", {})
+    html_content = solution.get("response", "")
+    
+    # Check if the returned HTML still has Cloudflare challenge
+    if is_cloudflare_challenge_from_html(html_content):
+        logger.warning("FlareSolverr returned page still has Cloudflare challenge")
+        return None
+    
+    logger.info(
+        f"FlareSolverr solved successfully! "
+        f"Status: {solution.get('status')}, "
+        f"Cookies: {len(solution.get('cookies', []))}"
+    )
+    
+    return {
+        "response": html_content,
+        "cookies": solution.get("cookies", []),
+        "userAgent": solution.get("userAgent", ""),
+        "status": solution.get("status", 200),
+        "headers": solution.get("headers", {}),
+    }
+
+
+def flaresolverr_proxy(proxy: str) -> Dict[str, str]:
+    """Proxy URL -> the "proxy" option of FlareSolverr request.get (credentials as separate fields)."""
+    parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    option = {"url": f"{parts.scheme}://{parts.hostname}" + (f":{parts.port}" if parts.port else "")}
+    if parts.username:
+        option["username"] = unquote(parts.username)
+        option["password"] = unquote(parts.password or "")
+    return option
+
+
 def solve_with_flaresolverr(
     url: str,
     flaresolverr_url: str = "http://localhost:8191/v1",
     max_timeout: int = 60000,
     session: Optional[str] = None,
     cookies: Optional[List[Dict]] = None,
+    proxy: Optional[str] = None,
 ) -> Optional[Dict[str, Any]]:
     """
     Solve Cloudflare challenge using FlareSolverr.
@@ -136,6 +220,7 @@ def solve_with_flaresolverr(
         max_timeout: Maximum time to wait for solution (milliseconds)
         session: Optional session ID for cookie persistence
         cookies: Optional cookies to send with request
+        proxy: Optional proxy URL to solve through (cf_clearance is tied to the client IP)
         
     Returns:
         Dictionary containing:
@@ -164,6 +249,9 @@ def solve_with_flaresolverr(
         if cookies:
             payload["cookies"] = cookies
         
+        if proxy:
+            payload["proxy"] = flaresolverr_proxy(proxy)
+        
         logger.info(f"Sending URL to FlareSolverr: {url}")
         
         # Calculate timeout in seconds (add buffer for processing)
@@ -176,34 +264,7 @@ def solve_with_flaresolverr(
             timeout=timeout_seconds
         )
         
-        result = response.json()
-        
-        if result.get("status") == "ok":
-            solution = result.get("solution", {})
-            html_content = solution.get("response", "")
-            
-            # Check if the returned HTML still has Cloudflare challenge
-            if is_cloudflare_challenge_from_html(html_content):
-                logger.warning("FlareSolverr returned page still has Cloudflare challenge")
-                return None
-            
-            logger.info(
-                f"FlareSolverr solved successfully! "
-                f"Status: {solution.get('status')}, "
-                f"Cookies: {len(solution.get('cookies', []))}"
-            )
-            
-            return {
-                "response": html_content,
-                "cookies": solution.get("cookies", []),
-                "userAgent": solution.get("userAgent", ""),
-                "status": solution.get("status", 200),
-                "headers": solution.get("headers", {}),
-            }
-        else:
-            error_msg = result.get("message", "Unknown error")
-            logger.error(f"FlareSolverr failed: {error_msg}")
-            return None
+        return parse_flaresolverr_solution(response.json())
             
     except requests.exceptions.Timeout:
         logger.error(f"FlareSolverr request timed out after {max_timeout}ms")
@@ -311,6 +372,10 @@ class CloudflareHandler:
         if result:
             html = result['response']
             cookies = result['cookies']
+    
+    With a FlareSolverrClient (cloudflare/solver.py), solves go through its
+    non-blocking connection pool and leased sessions instead of a
+    `requests` call in an executor thread.
     """
     
     def __init__(
@@ -318,6 +383,7 @@ class CloudflareHandler:
         flaresolverr_url: str = "http://localhost:8191/v1",
         solve_timeout: int = 60000,
         use_session: bool = False,
+        client=None,
     ):
         """
         Initialize the Cloudflare handler.
@@ -326,10 +392,12 @@ class CloudflareHandler:
             flaresolverr_url: FlareSolverr API endpoint URL
             solve_timeout: Maximum time to wait for solution (milliseconds)
             use_session: Whether to use persistent sessions for cookies
+            client: Optional FlareSolverrClient used for solves
         """
         self.flaresolverr_url = flaresolverr_url
         self.solve_timeout = solve_timeout
         self.use_session = use_session
+        self.client = client
         self.session_id: Optional[str] = None
         self.last_cookies: List[Dict] = []
         self.last_user_agent: str = ""
@@ -357,7 +425,7 @@ class CloudflareHandler:
             return is_cloudflare_challenge(response)
         return False
     
-    async def solve(self, url: str) -> Optional[Dict[str, Any]]:
+    async def solve(self, url: str, proxy: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Solve Cloudflare challenge for a URL using FlareSolverr.
         
@@ -366,27 +434,33 @@ class CloudflareHandler:
         
         Args:
             url: The URL to solve
+            proxy: Proxy the challenged request went through; the solve uses it too
             
         Returns:
             Dictionary with 'response' (HTML), 'cookies', 'userAgent', 'status'
             Returns None if solving failed
         """
-        # Run the synchronous FlareSolverr call in a thread pool
-        # to avoid blocking the async event loop
-        loop = asyncio.get_event_loop()
-        
-        session = self._ensure_session() if self.use_session else None
-        
-        result = await loop.run_in_executor(
-            None,
-            lambda: solve_with_flaresolverr(
-                url=url,
-                flaresolverr_url=self.flaresolverr_url,
-                max_timeout=self.solve_timeout,
-                session=session,
-                cookies=self.last_cookies if self.last_cookies else None,
+        if self.client is not None:
+            result = await self.client.solve(url, cookies=self.last_cookies or None, proxy=proxy)
+        else:
+            # Run the synchronous FlareSolverr call in a thread pool
+            # to avoid blocking the async event loop
+            loop = asyncio.get_event_loop()
+            
+            # A session keeps the proxy it was created with
+            session = self._ensure_session() if self.use_session and not proxy else None
+            
+            result = await loop.run_in_executor(
+                None,
+                lambda: solve_with_flaresolverr(
+                    url=url,
+                    flaresolverr_url=self.flaresolverr_url,
+                    max_timeout=self.solve_timeout,
+                    session=session,
+                    cookies=self.last_cookies if self.last_cookies else None,
+                    proxy=proxy,
+                )
             )
-        )
         
         if result:
             # Store cookies and user agent for future requests
@@ -458,9 +532,10 @@ class CloudflareHandler:
             destroy_flaresolverr_session(self.session_id, self.flaresolverr_url)
             self.session_id = None
     
-    def __del__(self):
-        """Destructor to clean up session."""
-        try:
-            self.cleanup()
-        except Exception:
-            pass
+    async def close(self):
+        """Release FlareSolverr sessions: the client's pool, or the ad hoc session."""
+        if self.client is not None:
+            await self.client.close()
+        elif self.session_id:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self.cleanup)
@@ -0,0 +1,148 @@
+"""
+Out-of-band Cloudflare solve stage.
+
+Solving a challenge inline in the spider callback keeps the response in the
+scraper, the Playwright page checked out and the crawl message's prefetch
+slot taken for as long as FlareSolverr needs (up to
+CLOUDFLARE_SOLVE_TIMEOUT). With the solve stage the spider releases the
+page, hands the challenged response over and returns right away; the
+crawler keeps rendering other pages.
+
+When the solve finishes, the stage schedules the original request again
+(same callback, same crawl message) with the outcome in meta:
+
+- "cf_solved_body": the solved HTML. SolveStageMiddleware answers the request
+  with it (status 200) without downloading anything, and the callback parses
+  it like any page;
+- "cf_solve_failed": the challenged page is answered again, and the callback
+  turns it into a retry item as before.
+
+Either way the crawl message is acked or sent to retry by the pipelines as
+usual. At most SOLVE_STAGE_MAX_PENDING solves are held; beyond that the
+spider sends the message to retry straight away (reason
+"cloudflare_solve_backlog"). Those requests are "local_only": they are never
+spilled to the broker spider queue, which could not carry the solved page.
+
+Stats: cloudflare/solve_stage/submitted, solved, failed, rejected and
+pending_max.
+"""
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from scrapy.utils.defer import deferred_from_coro
+from loguru import logger
+
+SOLVED_BODY_KEY = "cf_solved_body"
+SOLVE_FAILED_KEY = "cf_solve_failed"
+
+# Meta of the original request the rescheduled one keeps (no page, context or tier state)
+KEPT_META = (
+    "queue",
+    "previousResult",
+    "delivery_tag",
+    "entry_point",
+    "page_profile",
+    "handle_httpstatus_list",
+    "download_slot",
+)
+
+
+class SolveStage(object):
+    """Solves challenged pages in the background and feeds the result back to the spider."""
+
+    def __init__(self, crawler, max_pending=8, stats=None):
+        self.crawler = crawler
+        self.max_pending = max_pending
+        self.stats = stats
+        self.pending = set()
+        self.closed = False
+
+    def _inc(self, key):
+        if self.stats:
+            self.stats.inc_value(f"cloudflare/solve_stage/{key}")
+
+    def submit(self, response, solve):
+        """
+        Start solving `response` in the background.
+
+        Args:
+            solve: coroutine function response -> (success, solved_response)
+        Returns:
+            False if the stage is full (or closed): the caller settles the message itself
+        """
+        if self.closed or len(self.pending) >= self.max_pending:
+            self._inc("rejected")
+            return False
+        d = deferred_from_coro(self._solve(response, solve))
+        self.pending.add(d)
+        d.addBoth(self._done, d)
+        self._inc("submitted")
+        if self.stats:
+            self.stats.max_value("cloudflare/solve_stage/pending_max", len(self.pending))
+        return True
+
+    def _done(self, result, d):
+        self.pending.discard(d)
+        return None
+
+    async def _solve(self, response, solve):
+        try:
+            success, solved = await solve(response)
+        except Exception as e:
+            logger.error(f"Solve stage error for {response.url}: {e!r}")
+            success, solved = False, None
+        if self.closed:
+            # The crawl message is redelivered once the channel closes
+            return
+        meta = {key: response.meta[key] for key in KEPT_META if key in response.meta}
+        meta["local_only"] = True
+        if success and solved is not None:
+            meta[SOLVED_BODY_KEY] = solved.body
+            self._inc("solved")
+        else:
+            meta[SOLVE_FAILED_KEY] = {"status": response.status, "body": response.body}
+            self._inc("failed")
+        request = response.request.replace(meta=meta, dont_filter=True)
+        self.crawler.engine.crawl(request)
+
+    def close(self):
+        if self.pending:
+            logger.info("Abandoning {} pending Cloudflare solves", len(self.pending))
+        self.closed = True
+
+
+class SolveStageMiddleware(object):
+    """Downloader middleware: owns the solve stage and answers requests it rescheduled."""
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("SOLVE_STAGE_ENABLED", True):
+            raise NotConfigured
+        stage = SolveStage(crawler, max_pending=settings.getint("SOLVE_STAGE_MAX_PENDING", 8), stats=crawler.stats)
+        instance = cls(stage)
+        crawler.signals.connect(instance.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(instance.spider_closed, signal=signals.spider_closed)
+        return instance
+
+    def spider_opened(self, spider):
+        # The spider submits challenged pages instead of solving them inline
+        spider.solve_stage = self.stage
+
+    def spider_closed(self, spider):
+        self.stage.close()
+
+    def process_request(self, request, spider):
+        if SOLVED_BODY_KEY in request.meta:
+            body = request.meta.pop(SOLVED_BODY_KEY)
+            return HtmlResponse(request.url, status=200, body=body, encoding="utf-8", request=request, flags=["cf_solved"])
+        failed = request.meta.get(SOLVE_FAILED_KEY)
+        if failed is not None:
+            return HtmlResponse(
+                request.url, status=failed["status"], body=failed["body"], request=request, flags=["cf_solve_failed"]
+            )
+        return None
@@ -0,0 +1,207 @@
+"""
+Non-blocking FlareSolverr client with a bounded session pool.
+
+solve_with_flaresolverr posts with `requests` from an executor thread: one
+new connection per solve and no limit on how many solves pile up on the
+FlareSolverr container when many pages get challenged at once.
+
+FlareSolverrClient instead:
+
+- talks to FlareSolverr through Twisted's Agent (the reactor is already
+  running on asyncio) over a persistent, keep-alive connection pool;
+- runs at most `max_concurrency` solves at a time, the others wait;
+- creates `session_pool_size` FlareSolverr sessions (each one a browser
+  kept open by FlareSolverr) when started, and leases one per solve, so
+  a solve does not pay for a browser launch. A session that errors is
+  replaced;
+- gives every call a timeout (the solve timeout plus a margin).
+
+Cloudflare ties cf_clearance to the client IP, so a solve for a request
+sent through a proxy goes through that proxy too ("proxy" of request.get).
+FlareSolverr ignores that option for a session, whose browser keeps the
+proxy it was created with: proxied solves run without a pooled session.
+
+Stats: cloudflare/solve/<outcome>, cloudflare/solve/latency_ms_max/avg and
+cloudflare/solve/queue_ms_max (time spent waiting for a free slot).
+"""
+
+import asyncio
+import json
+import time
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+from twisted.internet import reactor as default_reactor
+from twisted.web.client import Agent, FileBodyProducer, HTTPConnectionPool, readBody
+from twisted.web.http_headers import Headers
+from scrapy.utils.defer import maybe_deferred_to_future
+from loguru import logger
+
+from CrunchyCrawler.cloudflare.handler import flaresolverr_proxy, parse_flaresolverr_solution
+from CrunchyCrawler.utils import extract_proxy_hostport
+
+# Seconds added to FlareSolverr's maxTimeout for the HTTP call itself
+TIMEOUT_MARGIN = 30
+
+
+class FlareSolverrError(Exception):
+    pass
+
+
+class FlareSolverrClient(object):
+    """Leases pooled FlareSolverr sessions to a bounded number of concurrent solves."""
+
+    def __init__(
+        self,
+        flaresolverr_url: str = "http://localhost:8191/v1",
+        solve_timeout: int = 60000,
+        max_concurrency: int = 2,
+        session_pool_size: int = 2,
+        stats=None,
+        reactor=default_reactor,
+    ):
+        """
+        Args:
+            solve_timeout: FlareSolverr maxTimeout per solve (milliseconds)
+            session_pool_size: sessions created at start (0: FlareSolverr opens a browser per solve)
+        """
+        self.flaresolverr_url = flaresolverr_url
+        self.solve_timeout = solve_timeout
+        self.max_concurrency = max_concurrency
+        self.session_pool_size = session_pool_size
+        self.stats = stats
+        self.reactor = reactor
+        pool = HTTPConnectionPool(reactor, persistent=True)
+        pool.maxPersistentPerHost = max(max_concurrency, 1) + 1
+        self._pool = pool
+        self._agent = Agent(reactor, pool=pool)
+        self._slots = None
+        self._sessions = None
+        self._started = False
+        self._solves = 0
+        self._latency_total = 0.0
+
+    def _inc(self, key):
+        if self.stats:
+            self.stats.inc_value(f"cloudflare/solve/{key}")
+
+    async def _post(self, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        body = FileBodyProducer(BytesIO(json.dumps(payload).encode("utf-8")))
+        d = self._agent.request(
+            b"POST",
+            self.flaresolverr_url.encode("utf-8"),
+            Headers({b"Content-Type": [b"application/json"]}),
+            body,
+        )
+        d.addCallback(readBody)
+        d.addTimeout(timeout, self.reactor)
+        try:
+            data = await maybe_deferred_to_future(d)
+        except Exception as e:
+            raise FlareSolverrError(f"{payload['cmd']} failed: {type(e).__name__}: {e}")
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise FlareSolverrError(f"{payload['cmd']}: response is not JSON: {e}")
+
+    async def _create_session(self) -> Optional[str]:
+        try:
+            result = await self._post({"cmd": "sessions.create"}, TIMEOUT_MARGIN)
+        except FlareSolverrError as e:
+            logger.warning(f"Could not create FlareSolverr session: {e}")
+            return None
+        if result.get("status") != "ok":
+            logger.warning(f"Could not create FlareSolverr session: {result.get('message')}")
+            return None
+        self._inc("session_created")
+        return result.get("session")
+
+    async def _destroy_session(self, session: str):
+        try:
+            await self._post({"cmd": "sessions.destroy", "session": session}, TIMEOUT_MARGIN)
+        except FlareSolverrError as e:
+            logger.debug(f"Could not destroy FlareSolverr session {session}: {e}")
+
+    async def start(self):
+        """Create the session pool (idempotent). Solves start it on first use otherwise."""
+        if self._started:
+            return
+        self._started = True
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._sessions = asyncio.Queue()
+        created = await asyncio.gather(*(self._create_session() for _ in range(self.session_pool_size)))
+        for session in created:
+            # A slot without a session still solves, FlareSolverr just opens a browser for it
+            self._sessions.put_nowait(session)
+        logger.info(
+            "FlareSolverr client ready: {} concurrent solves, {}/{} sessions",
+            self.max_concurrency, sum(1 for s in created if s), self.session_pool_size,
+        )
+
+    async def solve(
+        self, url: str, cookies: Optional[List[Dict]] = None, proxy: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Solve the Cloudflare challenge of `url`, through `proxy` if given.
+
+        Returns the same dictionary as solve_with_flaresolverr ('response',
+        'cookies', 'userAgent', 'status', 'headers'), or None on failure.
+        """
+        await self.start()
+        queued_at = time.monotonic()
+        async with self._slots:
+            if self.stats:
+                self.stats.max_value("cloudflare/solve/queue_ms_max", round((time.monotonic() - queued_at) * 1000, 1))
+            leased = bool(self.session_pool_size) and not proxy
+            session = await self._sessions.get() if leased else None
+            started = time.monotonic()
+            try:
+                result = await self._solve(url, session, cookies, proxy)
+            except FlareSolverrError as e:
+                logger.error(f"FlareSolverr error for {url}: {e}")
+                self._inc("error")
+                if session:
+                    # The session's browser may be stuck: replace it
+                    await self._destroy_session(session)
+                    session = await self._create_session()
+                result = None
+            finally:
+                if leased:
+                    self._sessions.put_nowait(session)
+            self._record(started, result)
+            return result
+
+    async def _solve(self, url, session, cookies, proxy=None):
+        payload: Dict[str, Any] = {"cmd": "request.get", "url": url, "maxTimeout": self.solve_timeout}
+        if session:
+            payload["session"] = session
+        if cookies:
+            payload["cookies"] = cookies
+        if proxy:
+            payload["proxy"] = flaresolverr_proxy(proxy)
+        logger.info(f"Sending URL to FlareSolverr: {url} (session {session}, proxy {proxy and extract_proxy_hostport(proxy)})")
+        return parse_flaresolverr_solution(
+            await self._post(payload, self.solve_timeout / 1000 + TIMEOUT_MARGIN)
+        )
+
+    def _record(self, started, result):
+        latency_ms = (time.monotonic() - started) * 1000
+        self._solves += 1
+        self._latency_total += latency_ms
+        if result is not None:
+            self._inc("success")
+        else:
+            self._inc("failed")
+        if self.stats:
+            self.stats.max_value("cloudflare/solve/latency_ms_max", round(latency_ms, 1))
+            self.stats.set_value("cloudflare/solve/latency_ms_avg", round(self._latency_total / self._solves, 1))
+
+    async def close(self):
+        """Destroy the pooled sessions and drop idle connections."""
+        if self._started:
+            sessions = []
+            while not self._sessions.empty():
+                sessions.append(self._sessions.get_nowait())
+            await asyncio.gather(*(self._destroy_session(s) for s in sessions if s))
+            self._started = False
+        await maybe_deferred_to_future(self._pool.closeCachedConnections())
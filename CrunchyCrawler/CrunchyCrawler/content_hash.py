@@ -0,0 +1,105 @@
+"""
+Content-hash change detection for company pages.
+
+A periodic recrawl of a company whose page did not change still gets
+published to databucket, and the consumer runs update_or_create and the
+merge updates for nothing. ContentHashPipeline hashes the extracted item
+(normalized: sorted keys, collapsed whitespace, crawl-internal keys left
+out) and compares the hash with the last one published for the company's
+canonical URL (see ContentHashPipeline in pipelines.py):
+
+- same hash: the item is marked "_unchanged"; DatabucketPipeline does not
+  publish it and RabbitMQPipeline acks the crawl message as usual;
+- new company or different hash: published as before.
+
+The hash is only recorded once the item made it through every pipeline
+(item_scraped), i.e. after databucket confirmed it: an item that is not
+confirmed goes to retry and is compared with the old hash again.
+
+An unchanged item is still published when its last publish is older than
+CONTENT_HASH_MAX_AGE seconds (0: never), so the consumer's "last seen" data
+keeps moving. Hashes live in a SQLite file (CONTENT_HASH_PATH, WAL mode)
+that the CB and Tracxn crawler processes can share, like the dupefilter
+snapshot.
+
+Stats: content_hash/new, changed, unchanged, stale and recorded.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+
+from CrunchyCrawler.utils import canonical_company_url
+
+UNCHANGED_KEY = "_unchanged"
+CONTENT_HASH_KEY = "_content_hash"
+
+# Keys that change from one crawl to the next without the page changing
+VOLATILE_KEYS = frozenset(("_response", "delivery_tag", "queue", "entry_point", "previousResult", "retry_reason"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def company_url(item):
+    url = item.get("crunchbase_url") or item.get("tracxn_url")
+    return canonical_company_url(url) if url else None
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", value).strip()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def content_hash(item):
+    """Hash of the item's content: crawl-internal ("_" prefixed) and volatile keys excluded."""
+    content = {
+        k: _normalize(v) for k, v in item.items()
+        if k not in VOLATILE_KEYS and not str(k).startswith("_")
+    }
+    data = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ContentHashStore(object):
+    """Last published content hash per company URL, in a SQLite file."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS content_hashes ("
+            "url TEXT PRIMARY KEY, hash TEXT NOT NULL, published_at REAL NOT NULL)"
+        )
+        self.db.commit()
+
+    def get(self, url):
+        """(hash, published_at) of the last publish of `url`, or None."""
+        return self.db.execute(
+            "SELECT hash, published_at FROM content_hashes WHERE url = ?", (url,)
+        ).fetchone()
+
+    def put(self, url, digest, published_at):
+        self.db.execute(
+            "INSERT OR REPLACE INTO content_hashes (url, hash, published_at) VALUES (?, ?, ?)",
+            (url, digest, published_at),
+        )
+        self.db.commit()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM content_hashes").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
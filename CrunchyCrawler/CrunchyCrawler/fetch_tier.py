@@ -0,0 +1,130 @@
+"""
+HTTP-first fetch tier with escalation to Playwright.
+
+Tracxn's /d/companies/ pages are server-rendered SEO pages: TracxnDataParser
+reads them from the static markup, so a plain GET is enough most of the
+time at a fraction of the cost of a headless Firefox render.
+
+For a source listed in FETCH_TIER_HTTP_FIRST, a Playwright request whose
+URL contains one of the source's `url_contains` patterns is first sent
+without Playwright (meta "fetch_tier" = "http"). The response is kept only
+if it is complete: status 200, no Cloudflare challenge markers, and every
+`required_xpaths` entry matching something. Otherwise (and on download
+errors) the same request is sent again through Playwright
+(fetch_tier = "playwright") with the same crawl message.
+
+    FETCH_TIER_HTTP_FIRST = {
+        "tracxn": {
+            "url_contains": ["/d/companies/"],
+            "required_xpaths": ["//h1//text()", "//*[contains(@class, 'txn--seo-companies')]"],
+        },
+    }
+
+Stats: fetch_tier/<source>/<tier>/ok, fetch_tier/<source>/http/escalated/<reason>
+and fetch_tier/<source>/playwright/incomplete/<reason>.
+"""
+
+from scrapy.exceptions import NotConfigured
+from scrapy.selector import Selector
+from loguru import logger
+from CrunchyCrawler.cloudflare.handler import is_cloudflare_challenge
+
+DEFAULT_HTTP_FIRST = {
+    "tracxn": {
+        "url_contains": ["/d/companies/"],
+        "required_xpaths": ["//h1//text()", "//*[contains(@class, 'txn--seo-companies')]"],
+    },
+}
+
+
+def source_of(request, sources):
+    queue = request.meta.get("queue")
+    if queue in sources:
+        return queue
+    for source in sources:
+        if f"{source}.com" in request.url:
+            return source
+    return None
+
+
+def incomplete_reason(response, required_xpaths):
+    """Why the response can't be parsed as-is, or None if it is complete."""
+    if response.status != 200:
+        return f"status_{response.status}"
+    if not hasattr(response, "text"):
+        return "not_html"
+    if is_cloudflare_challenge(response):
+        return "challenge"
+    selector = Selector(response)
+    for xpath in required_xpaths:
+        if not selector.xpath(xpath).get(default="").strip():
+            return "missing_xpath"
+    return None
+
+
+class FetchTierMiddleware(object):
+    """Downloader middleware: plain HTTP first, Playwright when the HTTP page is not usable."""
+
+    def __init__(self, sources, stats=None):
+        self.sources = sources
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        sources = settings.getdict("FETCH_TIER_HTTP_FIRST", DEFAULT_HTTP_FIRST)
+        if not settings.getbool("FETCH_TIER_ENABLED", True) or not sources:
+            raise NotConfigured
+        return cls(sources, stats=crawler.stats)
+
+    def _inc(self, key):
+        if self.stats:
+            self.stats.inc_value(f"fetch_tier/{key}")
+
+    def process_request(self, request, spider):
+        if not request.meta.get("playwright") or "fetch_tier_source" in request.meta:
+            return None
+        source = source_of(request, self.sources)
+        patterns = self.sources.get(source, {}).get("url_contains", ())
+        if source is None or not any(pattern in request.url for pattern in patterns):
+            return None
+        if request.meta.get("fetch_tier") == "playwright":
+            # Escalated before going through the spider queue: stay on Playwright
+            request.meta["fetch_tier_source"] = source
+            return None
+        request.meta["fetch_tier"] = "http"
+        request.meta["fetch_tier_source"] = source
+        request.meta["playwright"] = False
+        # Escalate instead of retrying a blocked or broken plain GET
+        request.meta["dont_retry"] = True
+        return None
+
+    def process_response(self, request, response, spider):
+        source = request.meta.get("fetch_tier_source")
+        tier = request.meta.get("fetch_tier")
+        if source is None:
+            return response
+        reason = incomplete_reason(response, self.sources[source].get("required_xpaths", ()))
+        if reason is None:
+            self._inc(f"{source}/{tier}/ok")
+            return response
+        if tier == "http":
+            return self._escalate(request, source, reason)
+        self._inc(f"{source}/{tier}/incomplete/{reason}")
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if request.meta.get("fetch_tier") == "http" and request.meta.get("fetch_tier_source"):
+            return self._escalate(request, request.meta["fetch_tier_source"], type(exception).__name__)
+        return None
+
+    def _escalate(self, request, source, reason):
+        logger.info("HTTP tier failed for {} ({}), escalating to Playwright", request.url, reason)
+        self._inc(f"{source}/http/escalated")
+        self._inc(f"{source}/http/escalated/{reason}")
+        meta = dict(request.meta)
+        meta.pop("dont_retry", None)
+        meta.pop("download_slot", None)
+        meta.update(playwright=True, fetch_tier="playwright")
+        # Same crawl message (delivery_tag): not a duplicate, let it through the dupefilter
+        return request.replace(meta=meta, dont_filter=True)
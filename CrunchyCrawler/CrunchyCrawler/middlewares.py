@@ -1,5 +1,9 @@
-from CrunchyCrawler.rabbitmq.connection import get_channels
+from CrunchyCrawler.rabbitmq.connection import get_retry_router
 from CrunchyCrawler.agents import AGENTS
+from CrunchyCrawler.cloudflare.handler import detect_challenge
+from CrunchyCrawler.ua_bandit import CHALLENGE_STATUSES, UABandit, domain_of
+from scrapy import signals
+from twisted.internet import task
 import random
 from loguru import logger
 
@@ -17,26 +21,91 @@ class CrunchyHttpProxyMiddleware(object):
 
 
 class CrunchyUserAgentMiddleware(object):
+    """
+    Picks the User-Agent of every request: by Thompson sampling over the
+    per-domain challenge history of each agent (see ua_bandit.py), or
+    uniformly at random with UA_BANDIT_ENABLED=false.
+    """
+
+    def __init__(self, bandit=None, path=None, sync_interval=300, stats=None):
+        self.bandit = bandit
+        self.path = path
+        self.sync_interval = sync_interval
+        self.stats = stats
+        self._sync_task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('UA_BANDIT_ENABLED', True):
+            return cls()
+        bandit = UABandit(AGENTS, max_observations=settings.getint('UA_BANDIT_MAX_OBSERVATIONS', 500))
+        instance = cls(
+            bandit,
+            path=settings.get('UA_BANDIT_PATH'),
+            sync_interval=settings.getfloat('UA_BANDIT_SYNC_INTERVAL', 300),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(instance.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(instance.spider_closed, signal=signals.spider_closed)
+        # Straight from the downloader: RetryMiddleware would swallow 503s/429s before process_response
+        crawler.signals.connect(instance.response_downloaded, signal=signals.response_downloaded)
+        return instance
+
+    def spider_opened(self, spider):
+        self.sync()
+        if self.path and self.sync_interval > 0:
+            self._sync_task = task.LoopingCall(self.sync)
+            self._sync_task.start(self.sync_interval, now=False)
+
+    def spider_closed(self, spider):
+        if self._sync_task is not None and self._sync_task.running:
+            self._sync_task.stop()
+        self.sync()
+
+    def sync(self):
+        if not self.path:
+            return
+        try:
+            self.bandit.sync(self.path)
+        except Exception as e:
+            logger.error(f"User agent bandit sync failed: {e}")
+
     def process_request(self, request, spider):
-        agent = random.choice(AGENTS)
+        if self.bandit is None:
+            agent = random.choice(AGENTS)
+        else:
+            agent = self.bandit.choose(domain_of(request.url))
         request.headers['User-Agent'] = agent
         logger.info(f"Selected agent: {agent}")
-        
+
+    def response_downloaded(self, response, request, spider):
+        if 'cf_clearance_version' in request.meta:
+            # Got through thanks to a clearance (and with its pinned agent): says nothing about the agent
+            return
+        if response.status in CHALLENGE_STATUSES or detect_challenge(response):
+            success = False
+        elif response.status == 200:
+            success = True
+        else:
+            return
+        agent = request.headers.get('User-Agent', b'').decode('utf-8', 'ignore')
+        domain = domain_of(request.url)
+        self.bandit.record(domain, agent, success)
+        if self.stats:
+            self.stats.inc_value(f"ua_bandit/{domain}/{'success' if success else 'challenge'}")
+
     def process_exception(self, request, exception, spider):
         logger.error(f"Error in CrunchyUserAgentMiddleware {exception}")
         return None
 
 class RabbitMQMiddleware(object):
-    def __init__(self, cb_channel, tracxn_channel):
-        self.channels = {
-            'crunchbase': cb_channel,
-            'tracxn': tracxn_channel,
-        }
+    def __init__(self, retry_router):
+        self.retry_router = retry_router
 
     @classmethod
     def from_crawler(cls, crawler):
-        cb_channel, tracxn_channel = get_channels()
-        return cls(cb_channel, tracxn_channel)
+        return cls(get_retry_router())
     
     # only send ack or nack incase of final result
     def process_response(self, request, response, spider):
@@ -48,33 +117,26 @@ class RabbitMQMiddleware(object):
         queue = request.meta.get('queue')
         logger.error(f"process_exception: {delivery_tag}", request.meta, exception)
         if delivery_tag:
-            self.nack(delivery_tag, queue)
+            self.nack(delivery_tag, queue, type(exception).__name__)
         return None
 
-    def nack(self, delivery_tag, queue):
-        logger.warning("RQ:DownloadMiddleware:Sending nack for", delivery_tag)
-        channel = self.channels.get(queue)
-        if channel is not None:
-            channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+    def nack(self, delivery_tag, queue, reason):
+        logger.warning(f"RQ:DownloadMiddleware:Sending to retry: {delivery_tag} ({reason})")
+        if queue in self.retry_router.queues:
+            self.retry_router.reject(queue, delivery_tag, reason)
 
 class RabbitMQSpiderMiddleware:
-    def __init__(self, cb_channel, tracxn_channel):
-        self.channels = {
-            'crunchbase': cb_channel,
-            'tracxn': tracxn_channel,
-        }
+    def __init__(self, retry_router):
+        self.retry_router = retry_router
 
     @classmethod
     def from_crawler(cls, crawler):
-        cb_channel, tracxn_channel = get_channels()
-        return cls(cb_channel, tracxn_channel)
+        return cls(get_retry_router())
     
-    def nack(self, delivery_tag, queue):
-        channel = self.channels.get(queue)
-        logger.warning(f"RQSpider Middleware checking Channel: {channel} for delivery:{delivery_tag}")
-        if channel is not None:
-            logger.warning(f"RQSpider Middleware:Sending nack for: {delivery_tag}")
-            channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+    def nack(self, delivery_tag, queue, reason):
+        logger.warning(f"RQSpider Middleware:Sending to retry: {delivery_tag} queue:{queue} ({reason})")
+        if queue in self.retry_router.queues:
+            self.retry_router.reject(queue, delivery_tag, reason)
 
     def process_spider_exception(self, response, exception, spider):
         delivery_tag = response.meta.get('delivery_tag', None)
@@ -82,7 +144,7 @@ class RabbitMQSpiderMiddleware:
         logger.error(f"process_spider_exception: {exception} delivery:{delivery_tag} queue:{queue} {response.meta} ")
         logger.exception(exception)
         if delivery_tag:
-            self.nack(delivery_tag, queue)
+            self.nack(delivery_tag, queue, type(exception).__name__)
         return None
 
 
@@ -1,11 +1,29 @@
 import json
-import pika
-from CrunchyCrawler.rabbitmq.connection import get_channels, get_databucket_channel
-from scrapy.exceptions import DropItem
+import sqlite3
+import time
+from scrapy import signals
+from CrunchyCrawler.content_hash import (
+    CONTENT_HASH_KEY,
+    UNCHANGED_KEY,
+    ContentHashStore,
+    company_url,
+    content_hash,
+)
+from CrunchyCrawler.rabbitmq.connection import get_retry_router, get_databucket_channel
+from CrunchyCrawler.rabbitmq.envelope import encode_envelope, resolve_compression
+from CrunchyCrawler.rabbitmq.publisher import ConfirmedPublisher
+from scrapy.exceptions import DropItem, NotConfigured
 from loguru import logger
 
 # Keys that must not be sent to databucket (crawl-internal only)
-DATABUCKET_SKIP_KEYS = frozenset(('_response', 'delivery_tag', 'queue'))
+DATABUCKET_SKIP_KEYS = frozenset(('_response', 'delivery_tag', 'queue', CONTENT_HASH_KEY))
+
+
+def crawl_succeeded(item):
+    """True if the item comes from a successful crawl (not a retry / error item)."""
+    # Normalize: response can be int 200 or string "200"
+    response = item.get('_response')
+    return (response == 200 or response == "200") and not item.get('_retry')
 
 
 def _serialize_item_for_databucket(item):
@@ -14,6 +32,74 @@ def _serialize_item_for_databucket(item):
     return json.dumps(payload, default=str)
 
 
+class ContentHashPipeline:
+    """Marks items whose content did not change since their last publish (see content_hash.py)."""
+
+    def __init__(self, store, max_age=0, stats=None, clock=time.time):
+        self.store = store
+        self.max_age = max_age
+        self.stats = stats
+        self.clock = clock
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('CONTENT_HASH_ENABLED', True):
+            raise NotConfigured
+        instance = cls(
+            ContentHashStore(settings.get('CONTENT_HASH_PATH', 'state/content_hashes.sqlite3')),
+            max_age=settings.getfloat('CONTENT_HASH_MAX_AGE', 0),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(instance.item_scraped, signal=signals.item_scraped)
+        return instance
+
+    def _inc(self, key):
+        if self.stats:
+            self.stats.inc_value(f"content_hash/{key}")
+
+    def open_spider(self, spider):
+        logger.info(f"ContentHashPipeline: {len(self.store)} company hashes in {self.store.path}")
+
+    def close_spider(self, spider):
+        self.store.close()
+
+    def process_item(self, item, spider):
+        if item.get('source') not in ('crunchbase', 'tracxn') or not crawl_succeeded(item):
+            return item
+        url = company_url(item)
+        if not url:
+            return item
+        digest = content_hash(item)
+        item[CONTENT_HASH_KEY] = digest
+        previous = self.store.get(url)
+        if previous is None:
+            self._inc("new")
+        elif previous[0] != digest:
+            self._inc("changed")
+        elif self.max_age and self.clock() - previous[1] >= self.max_age:
+            # Unchanged, but republished so the consumer sees the company again
+            self._inc("stale")
+        else:
+            item[UNCHANGED_KEY] = True
+            self._inc("unchanged")
+            logger.info(f"Content unchanged, not publishing: {url}")
+        return item
+
+    def item_scraped(self, item, response, spider):
+        """The item was published (databucket confirmed it): remember its hash."""
+        digest = item.get(CONTENT_HASH_KEY)
+        if not digest or item.get(UNCHANGED_KEY):
+            return
+        url = company_url(item)
+        try:
+            self.store.put(url, digest, self.clock())
+        except sqlite3.Error as e:
+            logger.error(f"Could not record content hash for {url}: {e}")
+            return
+        self._inc("recorded")
+
+
 class DatabucketPipeline:
     """
     RabbitMQ pipeline that routes scraped items to databucket queues by source.
@@ -21,7 +107,11 @@ class DatabucketPipeline:
     - Items with source='crunchbase' go to crunchbase_databucket_queue
     - Items with source='tracxn' go to tracxn_databucket_queue
 
-    Uses the same RabbitMQ connection as the crawl pipeline so publish works whenever ack works.
+    Publishes in confirm mode through a ConfirmedPublisher (batched, on the
+    connection manager's self-healing databucket channel). process_item
+    returns a Deferred that fires once the broker has confirmed the item, so
+    RabbitMQPipeline only acks the crawl message after that. An item that is
+    not confirmed is marked for a delayed retry instead.
     """
 
     @classmethod
@@ -30,85 +120,54 @@ class DatabucketPipeline:
         exchange = settings.get('RB_DATABUCKET_EXCHANGE', 'databucket_exchange')
         crunchbase_rk = settings.get('RB_DATABUCKET_CRUNCHBASE_RK', 'crunchbase_databucket')
         tracxn_rk = settings.get('RB_DATABUCKET_TRACXN_RK', 'tracxn_databucket')
-        channel = get_databucket_channel()
-        rabbitmq_url = settings.get('RABBITMQ_URL')
+        publisher = ConfirmedPublisher(
+            get_databucket_channel(),
+            exchange,
+            batch_size=settings.getint('RB_DATABUCKET_BATCH_SIZE', 50),
+            flush_interval=settings.getfloat('RB_DATABUCKET_FLUSH_INTERVAL', 0.2),
+            confirm_timeout=settings.getfloat('RB_DATABUCKET_CONFIRM_TIMEOUT', 30),
+            stats=crawler.stats,
+        )
         return cls(
             exchange=exchange,
             crunchbase_routing_key=crunchbase_rk,
             tracxn_routing_key=tracxn_rk,
-            channel=channel,
-            rabbitmq_url=rabbitmq_url,
+            publisher=publisher,
+            compression=resolve_compression(settings.get('RB_DATABUCKET_COMPRESSION', 'gzip')),
+            compress_min_size=settings.getint('RB_DATABUCKET_COMPRESS_MIN_BYTES', 1024),
         )
 
-    def __init__(self, exchange, crunchbase_routing_key, tracxn_routing_key, channel, rabbitmq_url=None):
+    def __init__(self, exchange, crunchbase_routing_key, tracxn_routing_key, publisher,
+                 compression='gzip', compress_min_size=1024):
         self.exchange = exchange
         self.crunchbase_routing_key = crunchbase_routing_key
         self.tracxn_routing_key = tracxn_routing_key
-        self._channel = channel
-        self._rabbitmq_url = rabbitmq_url
-        self._fallback_connection = None
-        self._fallback_channel = None
-
-    def _ensure_channel(self):
-        """Use shared channel if open; else open a dedicated connection and use its channel."""
-        if self._channel is not None and self._channel.is_open:
-            return self._channel
-        if self._fallback_channel is not None and self._fallback_channel.is_open:
-            return self._fallback_channel
-        if not self._rabbitmq_url:
-            return None
-        try:
-            if self._fallback_connection is not None:
-                try:
-                    self._fallback_connection.close()
-                except Exception:
-                    pass
-                self._fallback_connection = None
-                self._fallback_channel = None
-            parameters = pika.URLParameters(self._rabbitmq_url + '?heartbeat=600')
-            self._fallback_connection = pika.BlockingConnection(parameters)
-            self._fallback_channel = self._fallback_connection.channel()
-            self._fallback_channel.exchange_declare(
-                exchange=self.exchange,
-                exchange_type='direct',
-                durable=True,
-            )
-            logger.info("DatabucketPipeline: using fallback RabbitMQ connection for publish")
-            return self._fallback_channel
-        except Exception as e:
-            logger.error(f"DatabucketPipeline: fallback connection failed: {e}")
-            return None
+        self.publisher = publisher
+        self.compression = compression
+        self.compress_min_size = compress_min_size
 
     def open_spider(self, spider):
-        if self._channel and self._channel.is_open:
-            logger.info(f"DatabucketPipeline using shared RabbitMQ channel, exchange={self.exchange}")
-        else:
-            logger.warning("DatabucketPipeline: shared channel not open; will use fallback connection when publishing")
+        logger.info(
+            f"DatabucketPipeline publishing to exchange={self.exchange} "
+            f"(confirms, batches of {self.publisher.batch_size}, compression={self.compression})"
+        )
 
     def close_spider(self, spider):
-        if self._fallback_channel and self._fallback_channel.is_open:
-            try:
-                self._fallback_channel.close()
-            except Exception as e:
-                logger.debug(f"DatabucketPipeline fallback channel close: {e}")
-        if self._fallback_connection and self._fallback_connection.is_open:
-            try:
-                self._fallback_connection.close()
-            except Exception as e:
-                logger.debug(f"DatabucketPipeline fallback connection close: {e}")
-        self._fallback_channel = None
-        self._fallback_connection = None
+        # Wait for the last batch to be confirmed
+        return self.publisher.close()
 
     def process_item(self, item, spider):
         source = item.get('source', 'crunchbase')
-        channel = self._ensure_channel()
-        channel_ok = channel is not None
         logger.debug(
-            "DatabucketPipeline process_item: source=%s channel_ok=%s name=%s",
-            source, channel_ok, item.get('name') or item.get('url'),
+            "DatabucketPipeline process_item: source={} name={}",
+            source, item.get('name') or item.get('url'),
         )
-        if not channel_ok:
-            logger.warning("DatabucketPipeline: no channel, skipping publish")
+
+        # Don't publish internal/retry items or failed crawls (RabbitMQPipeline drops those)
+        if source in ('retry', 'unknown') or not crawl_succeeded(item):
+            return item
+        # Same content as the last publish: RabbitMQPipeline just acks it
+        if item.get(UNCHANGED_KEY):
             return item
 
         if source == 'tracxn':
@@ -116,53 +175,42 @@ class DatabucketPipeline:
         else:
             routing_key = self.crunchbase_routing_key
 
-        # Don't publish internal/retry items
-        if source in ('retry', 'unknown'):
-            return item
-
         try:
             json_data = _serialize_item_for_databucket(item)
         except Exception as e:
             logger.error(f"DatabucketPipeline serialization failed: {e}")
             return item
 
-        for attempt in (1, 2):
-            try:
-                channel = self._ensure_channel()
-                if channel is None:
-                    return item
-                channel.basic_publish(
-                    exchange=self.exchange,
-                    routing_key=routing_key,
-                    body=json_data,
-                    properties=pika.BasicProperties(
-                        delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
-                        content_type='application/json',
-                    ),
-                )
-                logger.info(f"Sent to databucket ({source} -> {routing_key}): {item.get('name', item.get('url', '?'))}")
-                return item
-            except Exception as e:
-                logger.warning(f"DatabucketPipeline publish failed (attempt {attempt}/2): {e}")
-                if attempt == 1:
-                    self._fallback_channel = None
-                    self._fallback_connection = None
-                if attempt == 2:
-                    return item
+        # Schema-versioned envelope, compressed above compress_min_size (see rabbitmq/envelope.py)
+        body, properties = encode_envelope(json_data, self.compression, self.compress_min_size)
+        d = self.publisher.publish(routing_key, body, properties)
+        d.addCallbacks(
+            self._confirmed, self._not_confirmed,
+            callbackArgs=(item, source, routing_key), errbackArgs=(item,),
+        )
+        return d
+
+    def _confirmed(self, _, item, source, routing_key):
+        logger.info(f"Sent to databucket ({source} -> {routing_key}): {item.get('name', item.get('url', '?'))}")
+        return item
+
+    def _not_confirmed(self, failure, item):
+        # Crawl it again later rather than ack a crawl whose data never reached databucket
+        logger.warning(f"DatabucketPipeline publish not confirmed: {failure.getErrorMessage()}")
+        item['_retry'] = True
+        item['retry_reason'] = 'databucket_unconfirmed'
         return item
 
 
 class RabbitMQPipeline:
-    def __init__(self, cb_channel, tracxn_channel):
-        self.channels = {
-            'crunchbase': cb_channel,
-            'tracxn': tracxn_channel,
-        }
+    """Settles the crawl message of every item: ack on success, delayed retry otherwise."""
+
+    def __init__(self, retry_router):
+        self.retry_router = retry_router
 
     @classmethod
     def from_crawler(cls, crawler):
-        cb_channel, tracxn_channel = get_channels()
-        return cls(cb_channel, tracxn_channel)
+        return cls(get_retry_router())
 
     def open_spider(self, spider):
         pass
@@ -177,26 +225,26 @@ class RabbitMQPipeline:
             response = item['_response']
             delivery_tag = item.get('delivery_tag')
             queue = item.get('queue')
-            channel = self.channels.get(queue)
+            tracked = queue in self.retry_router.queues
             logger.debug(f"RabbitMQ Pipeline: {response} {item}")
 
             # Use "is not None" so delivery_tag=0 is still valid
             if delivery_tag is not None:
                 logger.debug(f"response: {response}")
-                # Normalize: response can be int 200 or string "200"
-                ok = (response == 200) or (response == "200")
-                if ok:
-                    if channel is not None:
+                # A retry item (e.g. Cloudflare not solved, databucket publish not confirmed)
+                # can carry a 200 response
+                if crawl_succeeded(item):
+                    if tracked:
                         logger.info(f"RabbitMQ Sent ack: {delivery_tag}")
-                        channel.basic_ack(delivery_tag=delivery_tag)
+                        self.retry_router.ack(queue, delivery_tag)
                     del item['_response']
                     del item['delivery_tag']
                     del item['queue']
                 else:
-                    if channel is not None:
-                        logger.info(f"RabbitMQ Sent nack: {delivery_tag}")
-                        channel.basic_nack(
-                            delivery_tag=delivery_tag, requeue=True)
+                    if tracked:
+                        reason = item.get('retry_reason') or f"status_{response}"
+                        logger.info(f"RabbitMQ Sent to retry: {delivery_tag} ({reason})")
+                        self.retry_router.reject(queue, delivery_tag, reason)
                     raise DropItem(
                         f"Item dropped due to unsuccessful response. URL: {item.get('crunchbase_url')}, Status Code: {response}")
         except Exception as e:
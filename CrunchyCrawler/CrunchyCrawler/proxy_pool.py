@@ -0,0 +1,259 @@
+"""
+Health-scored proxy pool.
+
+Proxies come from PROXY_POOL_LIST (JSON list) and/or PROXY_POOL_LIST_PATH
+(one proxy URL per line, "#" comments, e.g. proxy-list.txt). Their state
+(good / dead / unchecked, with jittered exponential backoff before a dead
+proxy is tried again) is kept by expire.Proxies; on top of that each proxy
+has a health score:
+
+- success: exponentially weighted success rate of its requests;
+- latency: exponentially weighted download latency (seconds).
+
+A request gets one of the available (good or unchecked) proxies at random,
+weighted by success ** 2 / latency, so a proxy that is twice as slow gets
+half the traffic and a flaky one much less. When every proxy is dead they
+are all reset to unchecked rather than crawling without a proxy.
+
+ProxyPoolMiddleware assigns the proxy:
+
+- plain HTTP requests: meta "proxy" (Scrapy's HttpProxyMiddleware connects
+  through it, credentials in the URL included);
+- Playwright requests: a proxy belongs to a browser context. The browser
+  pool keeps one context per (source, proxy); without the pool the request
+  gets a context of its own per proxy, "proxy-<host:port>".
+
+A 2xx/3xx/404 response marks the proxy good; a download error, a
+403/407/429/503 or a Cloudflare challenge marks it dead. Dead proxies are
+reanimated every PROXY_POOL_REANIMATE_INTERVAL seconds once their backoff
+has passed. Cloudflare ties cf_clearance to the client IP: a challenge is
+solved through the proxy that got it, and the cached clearance
+(cloudflare/clearance.py) is only sent through that proxy again.
+
+Stats: proxy_pool/good, dead, unchecked, reanimated (current counts),
+proxy_pool/assigned/http|playwright, proxy_pool/reset and
+proxy_pool/<host:port>/ok|failed/<reason>.
+
+utility/proxy_standin.py runs local stand-in proxies (healthy, slow,
+blocking, down) to try the pool without real ones.
+"""
+
+import random
+from urllib.parse import unquote, urlsplit
+
+from twisted.internet import task
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from loguru import logger
+from CrunchyCrawler.cloudflare.handler import detect_challenge
+from CrunchyCrawler.expire import Proxies
+from CrunchyCrawler.utils import extract_proxy_hostport
+
+# Meta key: proxy (as listed) the request was sent through
+PROXY_KEY = "proxy_pool_proxy"
+
+# Statuses that mean the proxy is blocked, refused or out of quota
+DEAD_STATUSES = (403, 407, 429, 503)
+
+
+def load_proxy_list(proxies=None, path=None):
+    """Proxies from a list and/or a file (one per line, blank lines and # comments skipped)."""
+    loaded = [p.strip() for p in proxies or () if p and p.strip()]
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    loaded.append(line)
+    # Keep the order, drop duplicates
+    return list(dict.fromkeys(loaded))
+
+
+def playwright_proxy(proxy):
+    """Proxy URL -> the "proxy" option of a Playwright browser context."""
+    parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    server = f"{parts.scheme}://{parts.hostname}"
+    if parts.port:
+        server += f":{parts.port}"
+    option = {"server": server}
+    if parts.username:
+        option["username"] = unquote(parts.username)
+        option["password"] = unquote(parts.password or "")
+    return option
+
+
+class ProxyHealth(object):
+
+    def __init__(self, success=0.75, latency=None):
+        self.success = success
+        self.latency = latency
+
+    def weight(self, default_latency):
+        latency = self.latency if self.latency is not None else default_latency
+        return max(self.success, 0.01) ** 2 / max(latency, 0.1)
+
+
+class ProxyPool(object):
+    """expire.Proxies plus a health score per proxy for weighted selection."""
+
+    def __init__(self, proxy_list, alpha=0.2, default_latency=5.0, stats=None, backoff=None):
+        """
+        Args:
+            alpha: weight of the newest observation in the success/latency averages
+            default_latency: latency (seconds) assumed for a proxy not measured yet
+        """
+        self.proxies = Proxies(proxy_list, backoff=backoff)
+        self.health = {proxy: ProxyHealth() for proxy in self.proxies.proxies}
+        self.alpha = alpha
+        self.default_latency = default_latency
+        self.stats = stats
+
+    def __len__(self):
+        return len(self.health)
+
+    def _inc(self, key):
+        if self.stats:
+            self.stats.inc_value(f"proxy_pool/{key}")
+
+    def _record_counts(self):
+        if self.stats:
+            self.stats.set_value("proxy_pool/good", len(self.proxies.good))
+            self.stats.set_value("proxy_pool/dead", len(self.proxies.dead))
+            self.stats.set_value("proxy_pool/unchecked", len(self.proxies.unchecked))
+            self.stats.set_value("proxy_pool/reanimated", len(self.proxies.reanimated))
+
+    def choose(self):
+        """An available proxy, weighted by health; resets the dead ones if none is left."""
+        available = list(self.proxies.good | self.proxies.unchecked)
+        if not available:
+            if not self.proxies.dead:
+                return None
+            logger.warning("All {} proxies are dead, marking them unchecked", len(self.proxies.dead))
+            self.proxies.reset()
+            self._inc("reset")
+            self._record_counts()
+            available = list(self.proxies.unchecked)
+        weights = [self.health[p].weight(self.default_latency) for p in available]
+        return random.choices(available, weights=weights)[0]
+
+    def is_available(self, proxy):
+        return proxy in self.proxies.good or proxy in self.proxies.unchecked
+
+    def mark_good(self, proxy, latency=None):
+        health = self.health.get(proxy)
+        if health is None:
+            return
+        health.success += self.alpha * (1.0 - health.success)
+        if latency is not None:
+            health.latency = latency if health.latency is None else health.latency + self.alpha * (latency - health.latency)
+        self.proxies.mark_good(proxy)
+        self._inc(f"{extract_proxy_hostport(proxy)}/ok")
+        self._record_counts()
+
+    def mark_dead(self, proxy, reason):
+        health = self.health.get(proxy)
+        if health is None:
+            return
+        health.success -= self.alpha * health.success
+        was_dead = proxy in self.proxies.dead
+        if not was_dead:
+            # Several requests in flight through a dead proxy fail at once: back off only once
+            self.proxies.mark_dead(proxy)
+        self._inc(f"{extract_proxy_hostport(proxy)}/failed/{reason}")
+        self._record_counts()
+
+    def reanimate(self):
+        n = self.proxies.reanimate()
+        if n:
+            logger.info("Reanimated {} proxies: {}", n, self.proxies)
+        self._record_counts()
+        return n
+
+
+class ProxyPoolMiddleware(object):
+    """Downloader middleware: sends requests through the pool's proxies and scores them by outcome."""
+
+    def __init__(self, pool, reanimate_interval=60, stats=None):
+        self.pool = pool
+        self.stats = stats
+        self.reanimate_interval = reanimate_interval
+        self._reanimate_task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("PROXY_POOL_ENABLED", True):
+            raise NotConfigured
+        proxy_list = load_proxy_list(settings.getlist("PROXY_POOL_LIST"), settings.get("PROXY_POOL_LIST_PATH"))
+        if not proxy_list:
+            raise NotConfigured("No proxies in PROXY_POOL_LIST / PROXY_POOL_LIST_PATH")
+        pool = ProxyPool(
+            proxy_list,
+            alpha=settings.getfloat("PROXY_POOL_HEALTH_ALPHA", 0.2),
+            default_latency=settings.getfloat("PROXY_POOL_DEFAULT_LATENCY", 5.0),
+            stats=crawler.stats,
+        )
+        instance = cls(
+            pool, reanimate_interval=settings.getfloat("PROXY_POOL_REANIMATE_INTERVAL", 60), stats=crawler.stats
+        )
+        crawler.signals.connect(instance.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(instance.spider_closed, signal=signals.spider_closed)
+        return instance
+
+    def spider_opened(self, spider):
+        logger.info("Proxy pool: {} proxies", len(self.pool))
+        self.pool.reanimate()
+        self._reanimate_task = task.LoopingCall(self.pool.reanimate)
+        self._reanimate_task.start(self.reanimate_interval, now=False)
+
+    def spider_closed(self, spider):
+        if self._reanimate_task is not None and self._reanimate_task.running:
+            self._reanimate_task.stop()
+        logger.info("Proxy pool at close: {}", self.pool.proxies)
+
+    def _inc(self, key):
+        if self.stats:
+            self.stats.inc_value(f"proxy_pool/{key}")
+
+    def process_request(self, request, spider):
+        proxy = request.meta.get(PROXY_KEY)
+        if proxy is None and request.meta.get("proxy"):
+            # Sent through a proxy of its own
+            return None
+        if request.meta.get("playwright") and request.meta.get("playwright_page") is not None:
+            # The page's context already has its proxy
+            return None
+        if proxy is None or not self.pool.is_available(proxy):
+            proxy = self.pool.choose()
+            if proxy is None:
+                return None
+        request.meta[PROXY_KEY] = proxy
+        if request.meta.get("playwright"):
+            request.meta.pop("proxy", None)
+            request.meta["playwright_context_kwargs"] = {"proxy": playwright_proxy(proxy)}
+            # The browser pool (next) moves the request to the context of its (source, proxy);
+            # without the pool, one context per proxy
+            request.meta["playwright_context"] = f"proxy-{extract_proxy_hostport(proxy)}"
+            self._inc("assigned/playwright")
+        else:
+            request.meta["proxy"] = proxy
+            self._inc("assigned/http")
+        return None
+
+    def process_response(self, request, response, spider):
+        proxy = request.meta.get(PROXY_KEY)
+        if proxy is None:
+            return response
+        if response.status in DEAD_STATUSES:
+            self.pool.mark_dead(proxy, f"status_{response.status}")
+        elif detect_challenge(response):
+            self.pool.mark_dead(proxy, "challenge")
+        elif response.status < 500:
+            self.pool.mark_good(proxy, request.meta.get("download_latency"))
+        return response
+
+    def process_exception(self, request, exception, spider):
+        proxy = request.meta.get(PROXY_KEY)
+        if proxy is not None:
+            self.pool.mark_dead(proxy, type(exception).__name__)
+        return None
@@ -0,0 +1,176 @@
+"""
+Asyncio RabbitMQ transport: pika AsyncioConnection on the reactor's event loop.
+
+The crawler runs on AsyncioSelectorReactor, so the asyncio loop that drives
+Playwright is also the one Twisted runs on. A BlockingConnection call
+(basic_get, a passive queue_declare, even an ack) stops that loop until the
+broker answers. With AsyncioConnection, acks, nacks and publishes are
+written to the socket buffer and return at once. Deliveries are pushed by
+basic_consume and dispatched by the loop between page events. Heartbeats
+are serviced by the loop.
+
+The channels handed out (AioChannel) keep the call signatures the
+scheduler, pipelines and middlewares already use with blocking channels.
+The only difference is queue_declare(passive=True): it cannot wait for the
+answer, so it returns the last known message count (None until the broker
+first answered) and refreshes it in the background, at most once per
+DEPTH_REFRESH_INTERVAL seconds per queue.
+
+Reconnecting and channel recovery live in connection.ConnectionManager;
+this module only opens things and reports when the broker closes them.
+"""
+
+import asyncio
+import time
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+from twisted.internet.defer import Deferred
+from loguru import logger
+
+# Seconds between two passive declares of the same queue: the scheduler asks for
+# a queue's depth on every empty pop
+DEPTH_REFRESH_INTERVAL = 1.0
+
+
+class AioChannel(object):
+    """pika asyncio Channel with non-blocking, blocking-compatible queue_declare."""
+
+    def __init__(self, channel, refresh_interval=DEPTH_REFRESH_INTERVAL):
+        self._channel = channel
+        self.refresh_interval = refresh_interval
+        self._message_counts = {}
+        # queue -> monotonic time of the last passive declare sent; queues waiting for their DeclareOk
+        self._asked_at = {}
+        self._asking = set()
+
+    def __getattr__(self, name):
+        # basic_ack / basic_nack / basic_publish / basic_qos / basic_consume /
+        # queue_purge / is_open / close: same signatures, none of them wait
+        return getattr(self._channel, name)
+
+    def queue_declare(self, queue, passive=False, **kwargs):
+        def on_declare_ok(frame):
+            self._message_counts[queue] = frame.method.message_count
+            self._asking.discard(queue)
+
+        now = time.monotonic()
+        if not passive or (
+            queue not in self._asking and now - self._asked_at.get(queue, -self.refresh_interval) >= self.refresh_interval
+        ):
+            if passive:
+                self._asked_at[queue] = now
+                self._asking.add(queue)
+            self._channel.queue_declare(queue, passive=passive, callback=on_declare_ok, **kwargs)
+        return pika.frame.Method(
+            self._channel.channel_number,
+            pika.spec.Queue.DeclareOk(
+                queue=queue, message_count=self._message_counts.get(queue)
+            ),
+        )
+
+
+class AsyncioTransport(object):
+    """Opens the connection, channels and declarations without blocking the loop.
+
+    Every method that talks to the broker returns a Deferred.
+    """
+
+    # basic_get would need a round trip per message: always consume with a prefetch window
+    consume_only = True
+
+    def __init__(self, url, heartbeat=60):
+        self.url = url
+        self.heartbeat = heartbeat
+        self.connection = None
+        # Set by ConnectionManager: told when the broker closes a channel or the connection
+        self.manager = None
+        self._pending = set()
+
+    def _future(self):
+        future = asyncio.get_event_loop().create_future()
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return future
+
+    @staticmethod
+    def _settle(future, result=None, error=None):
+        # pika may report a failure after the success callback (or twice)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _fail_pending(self, reason):
+        for future in list(self._pending):
+            self._settle(future, error=pika.exceptions.AMQPError(reason))
+
+    def connection_is_open(self):
+        return self.connection is not None and self.connection.is_open
+
+    def open_connection(self):
+        return Deferred.fromFuture(asyncio.ensure_future(self._open_connection()))
+
+    async def _open_connection(self):
+        parameters = pika.URLParameters(self.url)
+        parameters.heartbeat = self.heartbeat
+        opened = self._future()
+        self.connection = AsyncioConnection(
+            parameters,
+            on_open_callback=lambda connection: self._settle(opened, connection),
+            on_open_error_callback=lambda connection, error: self._settle(
+                opened, error=pika.exceptions.AMQPConnectionError(error)
+            ),
+            on_close_callback=self._on_connection_closed,
+            custom_ioloop=asyncio.get_event_loop(),
+        )
+        await opened
+
+    def open_channel(self, number):
+        return Deferred.fromFuture(asyncio.ensure_future(self._open_channel(number)))
+
+    async def _open_channel(self, number):
+        opened = self._future()
+        self.connection.channel(
+            channel_number=number,
+            on_open_callback=lambda channel: self._settle(opened, channel),
+        )
+        channel = await opened
+        channel.add_on_close_callback(self._on_channel_closed)
+        return AioChannel(channel)
+
+    def declare(self, channel, method, kwargs):
+        return Deferred.fromFuture(asyncio.ensure_future(self._declare(channel, method, kwargs)))
+
+    async def _declare(self, channel, method, kwargs):
+        declared = self._future()
+        getattr(channel._channel, method)(
+            callback=lambda frame: self._settle(declared, frame), **kwargs
+        )
+        await declared
+
+    def enable_confirms(self, channel, on_confirm):
+        # Confirm.Select goes out before any later publish on the channel, no need to wait for SelectOk
+        channel._channel.confirm_delivery(ack_nack_callback=on_confirm)
+        return True
+
+    def pump(self, time_limit=0):
+        # Deliveries and heartbeats are handled by the event loop
+        pass
+
+    def close(self):
+        if self.connection_is_open():
+            self.connection.close()
+
+    def _on_channel_closed(self, channel, reason):
+        logger.warning("RabbitMQ channel {} closed: {}", channel.channel_number, reason)
+        self._fail_pending(reason)
+        if self.manager is not None:
+            self.manager.channel_lost(channel.channel_number, reason)
+
+    def _on_connection_closed(self, connection, reason):
+        logger.warning("RabbitMQ connection closed: {}", reason)
+        self._fail_pending(reason)
+        if self.manager is not None:
+            self.manager.connection_lost(reason)
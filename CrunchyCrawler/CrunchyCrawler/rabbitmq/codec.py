@@ -0,0 +1,78 @@
+"""
+Compact, schema-versioned codec for requests put on the spider queue.
+
+Replaces pickling request.to_dict(): that carried the whole
+playwright_page_methods list (including the inline "Read more" JS) in every
+message, and unpickling from a shared queue can execute arbitrary code.
+
+A message is a small JSON object:
+
+    {"v": 1, "url": ..., "q": "crunchbase", "ep": "tracxn", "dt": 12,
+     "p": "crunchbase", "cb": "parseSimilarCompanies", "pr": 0, "prev": {...}}
+
+`p` names a profile in CrunchyCrawler.request.PAGE_PROFILES; decoding goes
+back through generateRequest so the page methods, timeouts and status
+handling always come from the current code rather than from the queue.
+`t` is only set on requests escalated to Playwright by the fetch tier
+(CrunchyCrawler.fetch_tier), so they are not tried over plain HTTP again.
+"""
+
+import json
+from CrunchyCrawler.request import generateRequest
+
+SCHEMA_VERSION = 1
+
+
+class RequestCodecError(ValueError):
+    pass
+
+
+def encode_request(request, spider=None):
+    meta = request.meta
+    callback = getattr(request.callback, "__name__", None)
+    payload = {
+        "v": SCHEMA_VERSION,
+        "url": request.url,
+        "q": meta.get("queue"),
+        "ep": meta.get("entry_point"),
+        "dt": meta.get("delivery_tag"),
+        "p": meta.get("page_profile"),
+        "cb": callback,
+        "pr": request.priority or None,
+        "df": request.dont_filter or None,
+        "prev": meta.get("previousResult") or None,
+        "t": "playwright" if meta.get("fetch_tier") == "playwright" else None,
+    }
+    payload = {k: v for k, v in payload.items() if v is not None}
+    return json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def decode_request(data, spider):
+    try:
+        payload = json.loads(data)
+    except (TypeError, ValueError) as e:
+        raise RequestCodecError(f"Not a codec message: {e}")
+    if not isinstance(payload, dict) or payload.get("v") != SCHEMA_VERSION:
+        raise RequestCodecError(f"Unsupported request schema: {str(payload)[:100]}")
+
+    callback = None
+    if payload.get("cb"):
+        callback = getattr(spider, payload["cb"], None)
+        if callback is None:
+            raise RequestCodecError(f"Spider has no callback {payload['cb']!r}")
+
+    request = generateRequest(
+        payload["url"],
+        payload.get("dt"),
+        queue=payload.get("q", "normal"),
+        callback=callback,
+        previousResult=payload.get("prev") or {},
+        entry_point=payload.get("ep"),
+        profile=payload.get("p"),
+    )
+    if payload.get("t"):
+        request.meta["fetch_tier"] = payload["t"]
+    return request.replace(
+        priority=payload.get("pr", 0),
+        dont_filter=payload.get("df", False),
+    )
@@ -1,10 +1,45 @@
+"""
+RabbitMQ connection for the crawler: lazy, self-healing, one channel per role.
+
+Nothing talks to the broker at import time. Everything that needs a channel
+gets a ChannelProxy from get_channels() / get_internal_channel() /
+get_databucket_channel(). These roles keep a channel of their own because
+delivery tags, prefetch consumers and confirm mode belong to one channel.
+Other callers (ad-hoc publishes, passive declares) share a small pool of
+RB_CHANNEL_POOL_SIZE channels through get_pooled_channel(), handed out
+round-robin; they must not close it. The proxy is a stable handle: the
+ConnectionManager opens the connection on the first connect() (the
+scheduler's open), and re-opens channels and the connection behind it:
+
+- a channel closed by the broker (e.g. PRECONDITION_FAILED) is re-opened and
+  its part of the topology re-declared
+- a lost connection (missed heartbeats, broker restart, network) is
+  re-established with jittered exponential backoff (RB_RECONNECT_MAX_BACKOFF)
+
+Every re-open bumps the proxy's `generation`. Delivery tags only mean
+something on the channel that delivered them, so RetryRouter drops tags of
+an older generation (the broker has already requeued those messages), and
+prefetch consumers re-subscribe (see proxy.add_reopen_callback).
+"""
+
+import itertools
 import pika
 from scrapy.utils.project import get_project_settings
+from twisted.internet import defer, reactor, task
+from twisted.python.failure import Failure
 from loguru import logger
+from CrunchyCrawler.expire import exp_backoff_full_jitter
+from CrunchyCrawler.rabbitmq.retry import RetryRouter, retry_topology
 
 settings = get_project_settings()
 
-connection_dsn = settings.get('RABBITMQ_URL') + '?heartbeat=0'
+rabbitmq_url = settings.get('RABBITMQ_URL')
+heartbeat = settings.getint('RB_HEARTBEAT', 60)
+reconnect_max_backoff = settings.getfloat('RB_RECONNECT_MAX_BACKOFF', 60)
+channel_pool_size = settings.getint('RB_CHANNEL_POOL_SIZE', 2)
+
+# 'asyncio' (pika AsyncioConnection on the reactor's loop) or 'blocking' (pika BlockingConnection)
+transport_name = settings.get('RB_TRANSPORT', 'asyncio')
 
 # Crawl queues (decoupled: Crunchbase and Tracxn)
 crawl_exchange = settings.get('RB_CRAWL_EXCHANGE', 'crawl_exchange')
@@ -12,49 +47,390 @@ cb_queue = settings.get('RB_CRUNCHBASE_CRAWL_QUEUE', 'crawl_crunchbase_queue')
 cb_rk = settings.get('RB_CRUNCHBASE_CRAWL_RK', 'crawl_crunchbase')
 tracxn_queue = settings.get('RB_TRACXN_CRAWL_QUEUE', 'crawl_tracxn_queue')
 tracxn_rk = settings.get('RB_TRACXN_CRAWL_RK', 'crawl_tracxn')
+# Priority lanes: must match CrunchyRest's declaration (x-max-priority cannot be changed in place)
+crawl_queue_arguments = {'x-max-priority': settings.getint('RB_CRAWL_MAX_PRIORITY', 10)}
+# Delayed retry tiers (seconds) for failed crawls, see rabbitmq/retry.py
+retry_delays = [float(d) for d in settings.getlist('RB_RETRY_DELAYS', [30, 300, 1800, 7200])]
 
-# Connect to RabbitMQ
-parameters = pika.URLParameters(connection_dsn)
-connection = pika.BlockingConnection(parameters)
+databucket_exchange = settings.get('RB_DATABUCKET_EXCHANGE', 'databucket_exchange')
 
-internal_channel = connection.channel(1)
-cb_channel = connection.channel(2)
-tracxn_channel = connection.channel(5)
+# One channel per role; numbers kept from the original fixed channels
+CHANNEL_NUMBERS = {
+    'internal': 1,
+    'crunchbase': 2,
+    'tracxn': 5,
+    'databucket': 10,
+}
+# Shared pool: roles "pool-<n>" on channels 20, 21, ...
+POOL_ROLES = [f'pool-{n}' for n in range(channel_pool_size)]
+CHANNEL_NUMBERS.update({role: 20 + n for n, role in enumerate(POOL_ROLES)})
 
-# Crawl exchange and Crunchbase queue
-cb_channel.exchange_declare(exchange=crawl_exchange, exchange_type='direct')
-cb_channel.queue_declare(queue=cb_queue, durable=True)
-cb_channel.queue_bind(queue=cb_queue, exchange=crawl_exchange, routing_key=cb_rk)
 
-# Tracxn queue (same exchange)
-tracxn_channel.exchange_declare(exchange=crawl_exchange, exchange_type='direct')
-tracxn_channel.queue_declare(queue=tracxn_queue, durable=True)
-tracxn_channel.queue_bind(queue=tracxn_queue, exchange=crawl_exchange, routing_key=tracxn_rk)
+def topology():
+    """(role, channel method, kwargs) steps declaring every exchange and queue the crawler uses."""
+    steps = []
+    for role, queue, rk in (('crunchbase', cb_queue, cb_rk), ('tracxn', tracxn_queue, tracxn_rk)):
+        # Crawl exchange, crawl queue and its retry tiers
+        steps.append((role, 'exchange_declare', {'exchange': crawl_exchange, 'exchange_type': 'direct'}))
+        steps.append((role, 'queue_declare', {'queue': queue, 'durable': True, 'arguments': crawl_queue_arguments}))
+        steps.append((role, 'queue_bind', {'queue': queue, 'exchange': crawl_exchange, 'routing_key': rk}))
+        steps += [(role, method, kwargs) for method, kwargs in retry_topology(crawl_exchange, queue, rk, retry_delays)]
+    # Databucket exchange: scraped items published here for CrunchyRest consumers
+    steps.append((
+        'databucket',
+        'exchange_declare',
+        {'exchange': databucket_exchange, 'exchange_type': 'direct', 'durable': True},
+    ))
+    return steps
 
-# Databucket exchange: scraped items published here for CrunchyRest consumers
-databucket_exchange = settings.get('RB_DATABUCKET_EXCHANGE', 'databucket_exchange')
-databucket_channel = connection.channel(10)
-databucket_channel.exchange_declare(
-    exchange=databucket_exchange,
-    exchange_type='direct',
-    durable=True,
-)
+
+def is_channel_failure(error):
+    """True if error means the channel (or its connection) is gone, not e.g. a nacked publish."""
+    if isinstance(error, (pika.exceptions.NackError, pika.exceptions.UnroutableError)):
+        return False
+    return isinstance(error, (pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError))
+
+
+class ChannelProxy(object):
+    """Stable handle for one role's channel; forwards every call to the current channel.
+
+    A call that fails because the channel or connection is gone asks the
+    manager to recover, then re-raises: the caller decides whether the
+    operation is worth repeating.
+    """
+
+    def __init__(self, role, manager):
+        self.role = role
+        self.manager = manager
+        self.channel = None
+        self.generation = 0
+        self.closed = False
+        self._reopen_callbacks = []
+
+    @property
+    def is_open(self):
+        return self.channel is not None and self.channel.is_open
+
+    def add_reopen_callback(self, callback):
+        """callback(proxy) runs every time the channel is re-opened (not on the first open)."""
+        self._reopen_callbacks.append(callback)
+
+    def attach(self, channel):
+        self.channel = channel
+        self.generation += 1
+        if self.generation == 1:
+            return
+        logger.info("RabbitMQ channel '{}' re-opened (generation {})", self.role, self.generation)
+        for callback in self._reopen_callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"RabbitMQ '{self.role}' reopen callback failed: {e}")
+
+    def detach(self):
+        self.channel = None
+
+    def close(self):
+        self.closed = True
+        if self.is_open:
+            self.channel.close()
+
+    def process_data_events(self, time_limit=0):
+        """Let a blocking connection dispatch deliveries (no-op for asyncio)."""
+        self.manager.pump(time_limit)
+
+    def enable_confirms(self, on_confirm):
+        """Put the current channel in confirm mode.
+
+        Returns True if confirms arrive later through on_confirm(frame), False
+        if basic_publish itself waits for the confirm (raising NackError).
+        """
+        if self.channel is None:
+            raise pika.exceptions.ChannelWrongStateError(f"RabbitMQ channel '{self.role}' is not open")
+        try:
+            return self.manager.transport.enable_confirms(self.channel, on_confirm)
+        except Exception as e:
+            if is_channel_failure(e):
+                self.manager.channel_failed(self, e)
+            raise
+
+    def __getattr__(self, name):
+        channel = self.__dict__.get("channel")
+        if channel is None:
+            raise pika.exceptions.ChannelWrongStateError(
+                f"RabbitMQ channel '{self.__dict__.get('role')}' is not open"
+            )
+        attr = getattr(channel, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            except Exception as e:
+                if is_channel_failure(e):
+                    self.manager.channel_failed(self, e)
+                raise
+
+        return call
+
+
+class BlockingTransport(object):
+    """pika BlockingConnection: every broker call waits for the broker's answer.
+
+    Heartbeats only go out while pika is processing events, so a LoopingCall
+    pumps the connection every heartbeat / 2 seconds.
+    """
+
+    consume_only = False
+
+    def __init__(self, url, heartbeat=60):
+        self.url = url
+        self.heartbeat = heartbeat
+        self.connection = None
+        self.manager = None
+        self._pump_task = None
+
+    def connection_is_open(self):
+        return self.connection is not None and self.connection.is_open
+
+    def open_connection(self):
+        parameters = pika.URLParameters(self.url)
+        parameters.heartbeat = self.heartbeat
+        self.connection = pika.BlockingConnection(parameters)
+        if self._pump_task is not None and self._pump_task.running:
+            self._pump_task.stop()
+        if self.heartbeat:
+            self._pump_task = task.LoopingCall(self.pump)
+            self._pump_task.start(max(self.heartbeat / 2.0, 1.0), now=False)
+        return defer.succeed(self.connection)
+
+    def open_channel(self, number):
+        return defer.succeed(self.connection.channel(number))
+
+    def declare(self, channel, method, kwargs):
+        getattr(channel, method)(**kwargs)
+        return defer.succeed(None)
+
+    def enable_confirms(self, channel, on_confirm):
+        # BlockingChannel.basic_publish then waits for each confirm
+        channel.confirm_delivery()
+        return False
+
+    def pump(self, time_limit=0):
+        if not self.connection_is_open():
+            return
+        try:
+            self.connection.process_data_events(time_limit=time_limit)
+        except pika.exceptions.AMQPConnectionError as e:
+            logger.warning(f"RabbitMQ connection lost: {e!r}")
+            if self.manager is not None:
+                self.manager.connection_lost(e)
+
+    def close(self):
+        if self._pump_task is not None and self._pump_task.running:
+            self._pump_task.stop()
+        self._pump_task = None
+        if self.connection_is_open():
+            try:
+                self.connection.close()
+            except pika.exceptions.AMQPError as e:
+                logger.debug(f"RabbitMQ close: {e!r}")
+
+
+class ConnectionManager(object):
+    """Connects lazily, keeps a channel per role open and heals channels and the connection."""
+
+    def __init__(self, transport, topology, channel_numbers, max_backoff=60, pool_roles=()):
+        """
+        Args:
+            channel_numbers: role -> channel number, one channel per role
+            pool_roles: roles (in channel_numbers) shared round-robin through pooled()
+        """
+        self.transport = transport
+        transport.manager = self
+        self.topology = topology
+        self.channel_numbers = channel_numbers
+        self.max_backoff = max_backoff
+        self.proxies = {role: ChannelProxy(role, self) for role in channel_numbers}
+        self._pool = itertools.cycle([self.proxies[role] for role in pool_roles]) if pool_roles else None
+        self.connected = False
+        self.closing = False
+        self._connecting = None
+        self._waiters = []
+        self._attempt = 0
+        self._reconnect_call = None
+        self._reopening = set()
+
+    @property
+    def consume_only(self):
+        return self.transport.consume_only
+
+    def channel(self, role):
+        return self.proxies[role]
+
+    def pooled(self):
+        """Next channel of the shared pool (None without one)."""
+        return next(self._pool) if self._pool is not None else None
+
+    def connect(self):
+        """Deferred that fires once every channel is open and declared.
+
+        While the broker is unreachable it keeps retrying with backoff, so the
+        crawl waits for RabbitMQ instead of failing at startup.
+        """
+        if self.connected:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self._waiters.append(d)
+        self._start()
+        return d
+
+    def _start(self):
+        if self._connecting is not None or self.closing:
+            return
+        self._connecting = self._establish()
+        self._connecting.addBoth(self._established)
+
+    @defer.inlineCallbacks
+    def _establish(self):
+        yield defer.maybeDeferred(self.transport.open_connection)
+        for proxy in self.proxies.values():
+            if not proxy.closed:
+                yield self._open_role(proxy)
+
+    @defer.inlineCallbacks
+    def _open_role(self, proxy):
+        channel = yield defer.maybeDeferred(self.transport.open_channel, self.channel_numbers[proxy.role])
+        for role, method, kwargs in self.topology:
+            if role == proxy.role:
+                yield defer.maybeDeferred(self.transport.declare, channel, method, kwargs)
+        proxy.attach(channel)
+
+    def _established(self, result):
+        self._connecting = None
+        if isinstance(result, Failure):
+            logger.error(f"RabbitMQ connect failed: {result.getErrorMessage()}")
+            for proxy in self.proxies.values():
+                proxy.detach()
+            # Drop a half-open connection (e.g. a declaration was refused) before retrying
+            self.transport.close()
+            self._schedule_reconnect()
+            return None
+        self.connected = True
+        self._attempt = 0
+        logger.info("RabbitMQ connected ({}, {} channels)", type(self.transport).__name__, len(self.proxies))
+        waiters, self._waiters = self._waiters, []
+        for d in waiters:
+            d.callback(None)
+        return None
+
+    def _schedule_reconnect(self):
+        if self.closing or (self._reconnect_call is not None and self._reconnect_call.active()):
+            return
+        delay = exp_backoff_full_jitter(self._attempt, cap=self.max_backoff, base=1)
+        self._attempt += 1
+        logger.warning("RabbitMQ reconnect in {:.1f}s (attempt {})", delay, self._attempt)
+        self._reconnect_call = reactor.callLater(delay, self._start)
+
+    def connection_lost(self, reason):
+        if self.closing or self._connecting is not None:
+            # While connecting, the failure surfaces through _established
+            return
+        self.connected = False
+        for proxy in self.proxies.values():
+            proxy.detach()
+        self._schedule_reconnect()
+
+    def channel_lost(self, number, reason):
+        """The broker closed one channel; re-open it if the connection is still up."""
+        if self.closing or self._connecting is not None or not self.transport.connection_is_open():
+            return
+        for proxy in self.proxies.values():
+            if self.channel_numbers[proxy.role] == number and not proxy.closed:
+                self._reopen(proxy)
+
+    def channel_failed(self, proxy, error):
+        """A call through proxy failed with a channel/connection error."""
+        if self.closing or proxy.closed:
+            return
+        logger.warning(f"RabbitMQ channel '{proxy.role}' failed: {error!r}")
+        if self.transport.connection_is_open():
+            self._reopen(proxy)
+        else:
+            self.connection_lost(error)
+
+    def _reopen(self, proxy):
+        # A reopen callback failing on the new channel must not recurse into another reopen
+        if proxy.role in self._reopening:
+            return
+        self._reopening.add(proxy.role)
+        proxy.detach()
+        d = self._open_role(proxy)
+        d.addErrback(lambda failure: self.connection_lost(failure.value))
+        d.addBoth(lambda _: self._reopening.discard(proxy.role))
+
+    def pump(self, time_limit=0):
+        self.transport.pump(time_limit)
+
+    def close(self):
+        self.closing = True
+        if self._reconnect_call is not None and self._reconnect_call.active():
+            self._reconnect_call.cancel()
+        self.transport.close()
+
+
+def _create_transport():
+    if transport_name == 'blocking':
+        return BlockingTransport(rabbitmq_url, heartbeat)
+    from CrunchyCrawler.rabbitmq.aio import AsyncioTransport
+
+    return AsyncioTransport(rabbitmq_url, heartbeat)
+
+
+manager = ConnectionManager(_create_transport(), topology(), CHANNEL_NUMBERS, reconnect_max_backoff, POOL_ROLES)
+retry_router = RetryRouter(retry_delays)
+
+
+def connect():
+    """Deferred that fires once the channels are open and the topology is declared."""
+    logger.debug("Connecting to RabbitMQ ({} transport)", transport_name)
+    return manager.connect()
+
+
+def get_transport():
+    return manager
 
 
 def get_channels():
     """Return (cb_channel, tracxn_channel) for scheduler/pipeline (Crunchbase / Tracxn)."""
     logger.debug("Getting RabbitMQ Channel Instance")
-    return cb_channel, tracxn_channel
+    return manager.channel('crunchbase'), manager.channel('tracxn')
 
 
 def get_internal_channel():
-    return internal_channel
+    return manager.channel('internal')
 
 
 def get_databucket_channel():
     """Return the channel for publishing scraped items to the databucket exchange."""
-    return databucket_channel
+    return manager.channel('databucket')
+
+
+def get_pooled_channel():
+    """Return a channel of the shared pool, for callers without a role of their own (do not close it)."""
+    return manager.pooled()
+
+
+def get_retry_router():
+    """Return the RetryRouter that acks / delays / parks crawl messages."""
+    return retry_router
 
 
 def close(channel):
     channel.close()
+
+
+def shutdown():
+    """Close the connection and stop reconnecting (end of crawl)."""
+    manager.close()
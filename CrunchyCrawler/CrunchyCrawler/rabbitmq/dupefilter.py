@@ -1,52 +1,111 @@
-import time
-from .connection import get_channels
+import os
+from twisted.internet import task
 from scrapy.dupefilters import BaseDupeFilter
-from scrapy.utils.request import request_fingerprint
+from loguru import logger
+from CrunchyCrawler.bloom import ScalableBloomFilter
+from CrunchyCrawler.utils import canonical_company_url
 
 
 class RFPDupeFilter(BaseDupeFilter):
-    """RabbitMQ-based request duplication filter"""
+    """Persistent Bloom-filter duplicate filter keyed on canonical company URLs.
 
-    def __init__(self, server, key):
-        """Initialize duplication filter
+    The filter lives in memory and is synced (merged with the file, then
+    written back) to DUPEFILTER_PATH every DUPEFILTER_SYNC_INTERVAL seconds
+    and on close. Point the CB and Tracxn crawler processes at the same file
+    (shared volume) and each one picks up what the other crawled.
 
-        Parameters
-        ----------
-        server : RabbitMQ instance
-        key : str
-            Where to store fingerprints
-        """
-        self.server = server
-        self.key = key
+    A company is only marked as seen once its item went through the
+    pipelines (the scheduler calls mark_seen on item_scraped), so a failed
+    crawl that is retried is not dropped as a duplicate.
+
+    Spider follow-ups (request_seen) are only deduplicated within the run,
+    in an in-memory set: they are checked when enqueued, before they are
+    crawled, so persisting them would filter a follow-up that failed or was
+    dropped on close in every later run.
+    """
+
+    def __init__(self, path=None, capacity=1_000_000, error_rate=0.01, sync_interval=60, stats=None):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.stats = stats
+        self.filter = ScalableBloomFilter(capacity, error_rate)
+        self.requests = set()
+        self._sync_task = None
 
     @classmethod
     def from_settings(cls, settings):
-        server = get_channels()
-        # create one-time key. needed to support to use this
-        # class as standalone dupefilter with scrapy's default scheduler
-        # if scrapy passes spider on open() method this wouldn't be needed
-        key = "dupefilter:%s" % int(time.time())
-        return cls(server, key)
+        return cls(
+            path=settings.get("DUPEFILTER_PATH"),
+            capacity=settings.getint("DUPEFILTER_CAPACITY", 1_000_000),
+            error_rate=settings.getfloat("DUPEFILTER_ERROR_RATE", 0.01),
+            sync_interval=settings.getfloat("DUPEFILTER_SYNC_INTERVAL", 60),
+        )
 
     @classmethod
     def from_crawler(cls, crawler):
-        return cls.from_settings()
+        instance = cls.from_settings(crawler.settings)
+        instance.stats = crawler.stats
+        return instance
+
+    def open(self):
+        self.sync()
+        logger.info(
+            "Dupefilter: {} fingerprints ({:.1f} MB) from {}",
+            len(self.filter),
+            self.filter.nbytes / 1e6,
+            self.path,
+        )
+        if self.path and self.sync_interval > 0:
+            self._sync_task = task.LoopingCall(self.sync)
+            self._sync_task.start(self.sync_interval, now=False)
+
+    def sync(self):
+        if not self.path:
+            return
+        try:
+            self.filter.sync(self.path)
+        except Exception as e:
+            logger.error(f"Dupefilter snapshot sync failed: {e}")
+            return
+        if self.stats:
+            self.stats.set_value("dupefilter/fingerprints", len(self.filter))
+            self.stats.set_value("dupefilter/bytes", self.filter.nbytes)
+
+    def seen(self, url):
+        """True if this company URL was (probably) crawled already."""
+        return canonical_company_url(url) in self.filter
+
+    def mark_seen(self, url):
+        if url:
+            self.filter.add(canonical_company_url(url))
 
     def request_seen(self, request):
-        fp = request_fingerprint(request)
+        """Scrapy API: check and record in one step (used for spider follow-ups).
 
-        added = self.server.basic_publish(
-            exchange='',
-            routing_key=self.key,
-            body=fp
-        )
+        Follow-ups are keyed on their exact URL, apart from the company
+        filter, so a company's sub-page does not mark the company itself as
+        crawled. Per run only, like Scrapy's own RFPDupeFilter without a
+        JOBDIR.
+        """
+        if request.url in self.requests:
+            return True
+        self.requests.add(request.url)
+        return False
 
-        return not added
+    def log(self, request, spider):
+        logger.debug("Filtered duplicate request: {}", request.url)
+        if self.stats:
+            self.stats.inc_value("dupefilter/filtered", spider=spider)
 
     def close(self, reason):
-        """Delete data on close. Called by scrapy's scheduler"""
-        self.clear()
+        """Write the final snapshot. Called by the scheduler."""
+        if self._sync_task is not None and self._sync_task.running:
+            self._sync_task.stop()
+        self.sync()
 
     def clear(self):
-        """Clears fingerprints data"""
-        self.server.queue_purge(self.key)
+        """Forget all fingerprints (in memory and on disk)"""
+        self.filter = ScalableBloomFilter(self.filter.initial_capacity, self.filter.error_rate)
+        self.requests = set()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
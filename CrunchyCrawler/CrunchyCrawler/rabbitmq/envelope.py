@@ -0,0 +1,97 @@
+"""
+Envelope for databucket messages: schema version plus optional compression.
+
+The body is the item JSON (UTF-8), compressed when it is at least
+`min_size` bytes. Everything else is in the AMQP properties:
+
+    content_type      application/json
+    content_encoding  gzip | zstd | (unset: plain JSON)
+    headers           {"x-schema-version": 1}
+
+Long Crunchbase descriptions and Tracxn competitor lists compress 3-6x,
+which is that much less for the broker to persist. Small items are sent
+uncompressed because compression would barely help them.
+
+CrunchyRest decodes the envelope in utils/envelope.py (keep the two in
+sync). A message without the schema header is a plain JSON body from
+before the envelope existed.
+"""
+
+import gzip
+import pika
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SCHEMA_VERSION = 1
+SCHEMA_HEADER = "x-schema-version"
+CONTENT_TYPE = "application/json"
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+class EnvelopeError(ValueError):
+    pass
+
+
+def resolve_compression(name):
+    """Compression actually used for `name` ('gzip', 'zstd' or 'none')."""
+    name = (name or "none").lower()
+    if name == "zstd" and zstandard is None:
+        logger.warning("zstandard not installed, databucket messages use gzip instead of zstd")
+        return "gzip"
+    if name not in ("gzip", "zstd", "none"):
+        raise EnvelopeError(f"Unknown databucket compression: {name}")
+    return name
+
+
+def compress(data, encoding):
+    if encoding == "gzip":
+        # mtime=0: the same item always gives the same bytes
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise EnvelopeError(f"Unknown content encoding: {encoding}")
+
+
+def decompress(data, encoding):
+    if not encoding:
+        return data
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise EnvelopeError("zstd message but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise EnvelopeError(f"Unknown content encoding: {encoding}")
+
+
+def encode_envelope(payload, compression="gzip", min_size=1024):
+    """Return (body, properties) for a JSON payload (str or bytes).
+
+    `compression` must already be resolved (see resolve_compression).
+    """
+    data = payload.encode("utf-8") if isinstance(payload, str) else payload
+    encoding = None
+    if compression != "none" and len(data) >= min_size:
+        encoding = compression
+        data = compress(data, encoding)
+    properties = pika.BasicProperties(
+        delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
+        content_type=CONTENT_TYPE,
+        content_encoding=encoding,
+        headers={SCHEMA_HEADER: SCHEMA_VERSION},
+    )
+    return data, properties
+
+
+def decode_envelope(body, content_encoding=None, headers=None):
+    """Payload bytes of an envelope (what CrunchyRest's consumer does before json.loads)."""
+    version = (headers or {}).get(SCHEMA_HEADER, 0)
+    if version > SCHEMA_VERSION:
+        raise EnvelopeError(f"Unsupported databucket schema version {version}")
+    return decompress(body, content_encoding)
@@ -0,0 +1,151 @@
+"""
+Scheduling policies: decide which crawl queue (source) the scheduler pops next.
+
+A policy only orders the sources. The scheduler tries them in that order and
+reports back which one produced a request (served) and which were empty, so
+an idle queue never blocks a busy one.
+
+Configure with SCHEDULER_POLICY_CLASS and SCHEDULER_SOURCE_WEIGHTS, e.g.
+{"tracxn": 1, "crunchbase": 2}. Sources without a weight get 1.
+"""
+
+from loguru import logger
+
+
+class BasePolicy(object):
+
+    def __init__(self, weights=None):
+        self.weights = {name: float(w) for name, w in (weights or {}).items()}
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(weights=settings.getdict("SCHEDULER_SOURCE_WEIGHTS"))
+
+    def weight(self, source):
+        return max(self.weights.get(source, 1.0), 0.0)
+
+    def order(self, sources):
+        """Return sources in the order they should be tried."""
+        raise NotImplementedError
+
+    def served(self, source, request):
+        """A request was popped from source."""
+        pass
+
+    def empty(self, source):
+        """Source had nothing to hand out."""
+        pass
+
+    def latency(self, source, seconds):
+        """A page from source took this long to download/render."""
+        pass
+
+
+class SourcePriorityPolicy(BasePolicy):
+    """Legacy behaviour: always drain sources in the given order (Tracxn, then Crunchbase)."""
+
+    def order(self, sources):
+        return list(sources)
+
+
+class WeightedRoundRobinPolicy(BasePolicy):
+    """
+    Smooth weighted round robin (as in nginx upstreams).
+
+    With weights tracxn=3, crunchbase=1 the sources are interleaved T T C T
+    rather than served in bursts. Only sources that actually have work earn
+    credit, so a queue that was empty for an hour does not get a burst later.
+    """
+
+    def __init__(self, weights=None):
+        super().__init__(weights)
+        self._current = {}
+        self._active = []
+
+    def order(self, sources):
+        self._active = list(sources)
+        return sorted(
+            self._active,
+            key=lambda s: self._current.get(s, 0.0) + self.weight(s),
+            reverse=True,
+        )
+
+    def served(self, source, request):
+        total = 0.0
+        for s in self._active:
+            w = self.weight(s)
+            self._current[s] = self._current.get(s, 0.0) + w
+            total += w
+        self._current[source] = self._current.get(source, 0.0) - total
+
+    def empty(self, source):
+        self._current[source] = 0.0
+
+
+class DeficitRoundRobinPolicy(BasePolicy):
+    """
+    Deficit round robin where a request costs its source's average page latency.
+
+    Weights are therefore shares of browser time, not of request count: a
+    source whose pages take 20 s cannot crowd out one whose pages take 2 s.
+    Latency is an EWMA fed from response_received; until a source has been
+    observed every request costs 1.
+    """
+
+    def __init__(self, weights=None, alpha=0.2, initial_cost=1.0):
+        super().__init__(weights)
+        self.alpha = alpha
+        self.initial_cost = initial_cost
+        self._deficit = {}
+        self._cost = {}
+        self._ring = []
+        self._index = 0
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            weights=settings.getdict("SCHEDULER_SOURCE_WEIGHTS"),
+            alpha=settings.getfloat("SCHEDULER_LATENCY_ALPHA", 0.2),
+        )
+
+    def cost(self, source):
+        return self._cost.get(source, self.initial_cost)
+
+    def order(self, sources):
+        for s in sources:
+            if s not in self._ring:
+                self._ring.append(s)
+        ring = [s for s in self._ring if s in sources]
+        if not ring:
+            return []
+        # Quantum >= the largest request cost, so one round always lets
+        # every positively weighted source afford at least one request.
+        quantum = max(self.cost(s) for s in ring)
+        for _ in range(2 * len(ring) + 1):
+            source = ring[self._index % len(ring)]
+            if self._deficit.get(source, 0.0) >= self.cost(source):
+                start = ring.index(source)
+                return ring[start:] + ring[:start]
+            self._deficit[source] = (
+                self._deficit.get(source, 0.0) + quantum * self.weight(source)
+            )
+            self._index += 1
+        return ring
+
+    def served(self, source, request):
+        self._deficit[source] = self._deficit.get(source, 0.0) - self.cost(source)
+
+    def empty(self, source):
+        # Classic DRR: an idle queue does not bank credit. The scheduler only calls
+        # this once the broker queue is drained, not while its prefetch slots are busy.
+        self._deficit[source] = 0.0
+
+    def latency(self, source, seconds):
+        if seconds is None or seconds < 0:
+            return
+        previous = self._cost.get(source)
+        if previous is None:
+            self._cost[source] = seconds
+        else:
+            self._cost[source] = (1 - self.alpha) * previous + self.alpha * seconds
+        logger.debug("DRR cost for {}: {:.2f}s", source, self._cost[source])
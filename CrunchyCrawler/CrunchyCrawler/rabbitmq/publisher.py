@@ -0,0 +1,250 @@
+"""
+Confirmed, batched publishing for the databucket channel.
+
+publish() puts the message in an outbound batch and returns a Deferred that
+fires once the broker has confirmed it (publisher confirms). A batch is
+sent when it reaches `batch_size` messages or `flush_interval` seconds after
+its first message, whichever comes first. Its confirms are awaited without
+blocking the loop: the broker acks (usually with `multiple`) while the
+crawl goes on.
+
+If the channel is re-opened before a message is confirmed, the message is
+re-sent on the new channel (at-least-once: the databucket consumers upsert
+by company). A message that is nacked, or not confirmed within
+`confirm_timeout` seconds of publish(), fails with PublishNotConfirmed.
+
+On the blocking transport, basic_publish itself waits for the confirm, so
+a batch is confirmed message by message while it is sent.
+"""
+
+import pika
+from twisted.internet import defer, reactor
+from loguru import logger
+
+
+class PublishNotConfirmed(Exception):
+    pass
+
+
+class _Batch(object):
+
+    def __init__(self, size, sent_at):
+        self.size = size
+        self.remaining = size
+        self.sent_at = sent_at
+
+
+class ConfirmedPublisher(object):
+    """Batches publishes to one exchange and resolves them on publisher confirms."""
+
+    def __init__(self, channel, exchange, batch_size=50, flush_interval=0.2,
+                 confirm_timeout=30, stats=None, clock=reactor):
+        """
+        Args:
+            channel: ChannelProxy to publish on (confirm mode is enabled on every generation)
+            batch_size: send the batch once it holds this many messages
+            flush_interval: ... or this many seconds after its first message
+            confirm_timeout: fail a message not confirmed this many seconds after publish()
+        """
+        self.channel = channel
+        self.exchange = exchange
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.confirm_timeout = confirm_timeout
+        self.stats = stats
+        self.clock = clock
+        # (routing_key, body, properties, deferred, published_at) waiting to be sent
+        self._outbox = []
+        # sequence number -> (message, batch) sent and waiting for the broker's confirm
+        self._unconfirmed = {}
+        self._seq = 0
+        self._confirm_generation = None
+        self._async_confirms = True
+        self._flush_call = None
+        self._expire_call = None
+        self._batches = 0
+        self._batch_latency_total = 0.0
+        self._batch_size_total = 0
+        if hasattr(channel, "add_reopen_callback"):
+            channel.add_reopen_callback(self._resend_unconfirmed)
+
+    def __len__(self):
+        return len(self._outbox) + len(self._unconfirmed)
+
+    def _inc(self, key, count=1):
+        if self.stats:
+            self.stats.inc_value(key, count)
+
+    def publish(self, routing_key, body, properties=None):
+        """Queue a message; the Deferred fires with None once the broker confirmed it."""
+        d = defer.Deferred()
+        self._outbox.append((routing_key, body, properties, d, self.clock.seconds()))
+        if len(self._outbox) >= self.batch_size:
+            self.flush()
+        elif self._flush_call is None:
+            self._flush_call = self.clock.callLater(self.flush_interval, self.flush)
+        self._schedule_expire()
+        return d
+
+    def flush(self):
+        """Send everything in the outbox (as one batch) if the channel is open."""
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        if not self._outbox:
+            return
+        if not self._ensure_confirms():
+            # Channel is being re-opened: try again later, _expire bounds the wait
+            self._flush_call = self.clock.callLater(self.flush_interval, self.flush)
+            return
+
+        pending, self._outbox = self._outbox, []
+        batch = _Batch(len(pending), self.clock.seconds())
+        for index, message in enumerate(pending):
+            routing_key, body, properties, d, _ = message
+            try:
+                self.channel.basic_publish(
+                    exchange=self.exchange,
+                    routing_key=routing_key,
+                    body=body,
+                    properties=properties,
+                )
+            except pika.exceptions.NackError:
+                # Blocking transport: the broker refused this one
+                self._settle(message, batch, False)
+                continue
+            except Exception as e:
+                # Channel gone: the proxy has asked for a re-open, send the rest on the new channel
+                logger.warning(f"Databucket publish failed, {len(pending) - index} messages held back: {e!r}")
+                batch.size -= len(pending) - index
+                batch.remaining -= len(pending) - index
+                if batch.remaining == 0 and batch.size:
+                    self._record_batch(batch)
+                self._outbox[:0] = pending[index:]
+                self._flush_call = self.clock.callLater(self.flush_interval, self.flush)
+                break
+            if self._async_confirms:
+                self._seq += 1
+                self._unconfirmed[self._seq] = (message, batch)
+            else:
+                self._settle(message, batch, True)
+        self._inc("databucket/published", batch.size)
+
+    def _ensure_confirms(self):
+        """Put the current channel generation in confirm mode; False if the channel is not open."""
+        if not self.channel.is_open:
+            return False
+        if self._confirm_generation == self.channel.generation:
+            return True
+        try:
+            self._async_confirms = self.channel.enable_confirms(self._on_confirm)
+        except Exception as e:
+            logger.warning(f"Databucket confirm mode failed: {e!r}")
+            return False
+        self._confirm_generation = self.channel.generation
+        # Publish sequence numbers restart at 1 on every channel
+        self._seq = 0
+        return True
+
+    def _on_confirm(self, frame):
+        """Basic.Ack / Basic.Nack from the broker (asyncio transport)."""
+        method = frame.method
+        ok = isinstance(method, pika.spec.Basic.Ack)
+        if method.multiple:
+            tags = [seq for seq in self._unconfirmed if seq <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        for seq in tags:
+            entry = self._unconfirmed.pop(seq, None)
+            if entry is not None:
+                self._settle(entry[0], entry[1], ok)
+
+    def _settle(self, message, batch, ok):
+        d = message[3]
+        if ok:
+            self._inc("databucket/confirmed")
+            d.callback(None)
+        else:
+            self._inc("databucket/nacked")
+            d.errback(PublishNotConfirmed(f"nacked by the broker ({message[0]})"))
+        batch.remaining -= 1
+        if batch.remaining == 0:
+            self._record_batch(batch)
+
+    def _record_batch(self, batch):
+        """Per-batch size and publish-to-last-confirm latency as stats."""
+        latency_ms = (self.clock.seconds() - batch.sent_at) * 1000
+        self._batches += 1
+        self._batch_latency_total += latency_ms
+        self._batch_size_total += batch.size
+        logger.debug("Databucket batch of {} confirmed in {:.1f} ms", batch.size, latency_ms)
+        if not self.stats:
+            return
+        self.stats.inc_value("databucket/batches")
+        self.stats.max_value("databucket/batch/latency_ms_max", round(latency_ms, 1))
+        self.stats.set_value(
+            "databucket/batch/latency_ms_avg", round(self._batch_latency_total / self._batches, 1)
+        )
+        self.stats.max_value("databucket/batch/size_max", batch.size)
+        self.stats.set_value(
+            "databucket/batch/size_avg", round(self._batch_size_total / self._batches, 1)
+        )
+
+    def _resend_unconfirmed(self, proxy):
+        """Confirms for the old channel will never come: send those messages again."""
+        if not self._unconfirmed:
+            return
+        resend = []
+        for seq in sorted(self._unconfirmed):
+            message, batch = self._unconfirmed[seq]
+            batch.size -= 1
+            batch.remaining -= 1
+            if batch.remaining == 0 and batch.size:
+                self._record_batch(batch)
+            resend.append(message)
+        self._unconfirmed = {}
+        logger.info("Re-sending {} unconfirmed databucket messages on the new channel", len(resend))
+        self._inc("databucket/resent", len(resend))
+        self._outbox[:0] = resend
+        self.flush()
+
+    def _schedule_expire(self):
+        if self._expire_call is None and self.confirm_timeout:
+            self._expire_call = self.clock.callLater(self.confirm_timeout, self._expire)
+
+    def _expire(self):
+        """Fail messages that have waited longer than confirm_timeout since publish()."""
+        self._expire_call = None
+        deadline = self.clock.seconds() - self.confirm_timeout
+        expired = [message for message in self._outbox if message[4] <= deadline]
+        self._outbox = [message for message in self._outbox if message[4] > deadline]
+        for seq, (message, batch) in list(self._unconfirmed.items()):
+            if message[4] <= deadline:
+                del self._unconfirmed[seq]
+                batch.size -= 1
+                batch.remaining -= 1
+                if batch.remaining == 0 and batch.size:
+                    self._record_batch(batch)
+                expired.append(message)
+        for message in expired:
+            self._inc("databucket/timeout")
+            message[3].errback(PublishNotConfirmed(
+                f"not confirmed within {self.confirm_timeout}s ({message[0]})"
+            ))
+        if self._outbox or self._unconfirmed:
+            self._schedule_expire()
+
+    def close(self):
+        """Send what is left; the Deferred fires once every message is settled."""
+        self.flush()
+        waiting = [message[3] for message in self._outbox]
+        waiting += [message[3] for message, _ in self._unconfirmed.values()]
+        d = defer.DeferredList(waiting, consumeErrors=True)
+
+        def cancel_timers(result):
+            for call in (self._flush_call, self._expire_call):
+                if call is not None and call.active():
+                    call.cancel()
+            return result
+
+        return d.addBoth(cancel_timers)
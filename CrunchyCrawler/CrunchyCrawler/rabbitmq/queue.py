@@ -1,37 +1,120 @@
-from scrapy.utils.request import request_from_dict
-import pickle
+import heapq
+import itertools
 import json
 from scrapy import Request
-from scrapy_playwright.page import PageMethod
 from loguru import logger
 from CrunchyCrawler.request import generateRequest
+from CrunchyCrawler.rabbitmq.codec import encode_request, decode_request, RequestCodecError
+
+
+class PrefetchConsumer(object):
+    """Push-based consumer for one queue: basic_consume with a prefetch window.
+
+    Deliveries are buffered locally as they arrive, so handing out the next
+    message is a heap pop instead of a basic_get round trip to the broker.
+    The buffer is ordered by AMQP priority (FIFO within a priority): the broker
+    only orders what it has not delivered yet, so an interactive message that
+    arrives while low-priority ones are buffered must still go first.
+    Buffered messages stay unacked; if the channel closes they are requeued
+    by RabbitMQ.
+    """
+
+    def __init__(self, server, key, prefetch_count):
+        self.server = server
+        self.key = key
+        self.prefetch_count = prefetch_count
+        self._buffer = []
+        self._seq = itertools.count()
+        self._consume()
+        if hasattr(server, "add_reopen_callback"):
+            server.add_reopen_callback(self._resubscribe)
+
+    def _consume(self):
+        self.server.basic_qos(prefetch_count=self.prefetch_count)
+        self.consumer_tag = self.server.basic_consume(
+            queue=self.key, on_message_callback=self._on_message
+        )
+        logger.debug("Consuming {} with prefetch {}", self.key, self.prefetch_count)
+
+    def _resubscribe(self, channel):
+        # Buffered deliveries died with the old channel (the broker requeued them)
+        self._buffer = []
+        self._consume()
+
+    def _on_message(self, channel, method, properties, body):
+        priority = (properties.priority if properties is not None else None) or 0
+        heapq.heappush(
+            self._buffer, (-priority, next(self._seq), (method, properties, body))
+        )
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def _fill(self):
+        # Blocking channels: dispatch whatever the broker already pushed to us
+        # (never waits). Asyncio channels get deliveries from the event loop.
+        # ChannelProxy.process_data_events does the right thing for both.
+        if hasattr(self.server, "process_data_events"):
+            self.server.process_data_events(time_limit=0)
+            return
+        process_data_events = getattr(self.server.connection, "process_data_events", None)
+        if process_data_events is not None:
+            process_data_events(time_limit=0)
+
+    def peek_priority(self):
+        """Priority of the next buffered message, or None if nothing is buffered."""
+        if not self._buffer:
+            self._fill()
+        if self._buffer:
+            return -self._buffer[0][0]
+        return None
+
+    def get(self):
+        """Return the next buffered (method, properties, body), or (None, None, None)."""
+        if not self._buffer:
+            self._fill()
+        if self._buffer:
+            return heapq.heappop(self._buffer)[2]
+        return None, None, None
 
 
 class Base(object):
 
-    def __init__(self, server, spider, key, exchange=None):
+    def __init__(self, server, spider, key, exchange=None, prefetch_count=0):
         """Initialize per-spider RabbitMQ queue.
         Parameters:
             server -- rabbitmq connection
             spider -- spider instance
             key -- key for this queue (e.g. "%(spider)s:queue")
+            prefetch_count -- consume with this prefetch window (0 = poll with basic_get)
         """
         self.server = server
         self.spider = spider
         self.key = key % {'spider': spider.name}
         logger.debug(f"starting here --> {key % {'spider': spider.name}}" )
         self._declare_queue()
+        if hasattr(server, "add_reopen_callback"):
+            server.add_reopen_callback(lambda channel: self._declare_queue())
+        self._consumer = None
+        if prefetch_count > 0:
+            self._consumer = PrefetchConsumer(server, self.key, prefetch_count)
 
     def _declare_queue(self):
         pass
 
+    def _get(self):
+        """Fetch one (method, properties, body) from the prefetch buffer or via basic_get."""
+        if self._consumer is not None:
+            return self._consumer.get()
+        return self.server.basic_get(queue=self.key)
+
     def _encode_request(self, request: Request):
         """Encode a request object"""
-        return pickle.dumps(request.to_dict(spider=self.spider))
+        return encode_request(request, spider=self.spider)
 
     def _decode_request(self, encoded_request):
         """Decode an request previously encoded"""
-        return request_from_dict(pickle.loads(encoded_request), spider=self.spider)
+        return decode_request(encoded_request, spider=self.spider)
 
     def __len__(self):
         """Return the length of the queue"""
@@ -59,7 +142,9 @@ class SpiderQueue(Base):
     def __len__(self):
         """Return the length of the queue"""
         response = self.server.queue_declare(self.key, passive=True)
-        return response.method.message_count
+        buffered = len(self._consumer) if self._consumer is not None else 0
+        # None: an asyncio channel has no answer from the broker yet
+        return (response.method.message_count or 0) + buffered
 
     def push(self, request):
         self.server.basic_publish(
@@ -69,27 +154,95 @@ class SpiderQueue(Base):
         )
 
     def pop(self):
-        method_frame, header, body = self.server.basic_get(queue=self.key)
+        method_frame, header, body = self._get()
         if body != None:
             logger.info(f"SpiderQ Sent ack: {method_frame.delivery_tag}")
             self.server.basic_ack(delivery_tag=method_frame.delivery_tag)
-            return self._decode_request(body)
+            try:
+                return self._decode_request(body)
+            except RequestCodecError as e:
+                # e.g. a legacy pickled request left on the queue: never unpickle it
+                logger.warning("Discarded undecodable spider queue message: {}", e)
+                return None
+
+
+class LocalSpiderQueue(object):
+    """In-memory priority queue for requests the spider creates itself (follow-ups).
+
+    Follow-ups come back to the same process anyway, so they stay in a heap
+    (highest Request.priority first, FIFO within a priority) instead of a
+    publish -> basic_get -> decode round trip. The broker SpiderQueue is only
+    used as spill-over once more than `max_size` requests are pending, and is
+    drained after the local heap so spilled requests are not lost.
+
+    Requests with meta "local_only" carry state the codec can't encode (e.g.
+    a page solved out of band) and are never spilled.
+    """
+
+    def __init__(self, spill_queue, max_size=1000, stats=None, spider=None):
+        self.spill_queue = spill_queue
+        self.max_size = max_size
+        self.stats = stats
+        self.spider = spider
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._heap) + len(self.spill_queue)
+
+    def _inc(self, key):
+        if self.stats:
+            self.stats.inc_value(key, spider=self.spider)
+
+    def push(self, request):
+        if len(self._heap) >= self.max_size and not request.meta.get("local_only"):
+            self._inc("scheduler/enqueued/spilled")
+            self.spill_queue.push(request)
+            return
+        self._inc("scheduler/enqueued/local")
+        heapq.heappush(self._heap, (-request.priority, next(self._seq), request))
+
+    def pop(self):
+        if self._heap:
+            self._inc("scheduler/dequeued/local")
+            return heapq.heappop(self._heap)[2]
+        return self.spill_queue.pop()
+
+    def close(self, spill=False):
+        """On shutdown, optionally hand pending follow-ups to the broker queue.
+
+        Their delivery tags belong to a channel that is about to close (the
+        crawl messages will be redelivered), so they are spilled without one.
+        """
+        if not spill:
+            if self._heap:
+                logger.info("Dropping {} in-memory follow-ups on close", len(self._heap))
+            self._heap = []
+            return
+        while self._heap:
+            request = heapq.heappop(self._heap)[2]
+            if request.meta.get("local_only"):
+                continue
+            request.meta["delivery_tag"] = None
+            self._inc("scheduler/enqueued/spilled")
+            self.spill_queue.push(request)
 
 
 def _parse_crawl_message(body: str):
-    """Parse crawl queue message: JSON {"url": ..., "entry_point": ...} or plain URL. Returns (url, entry_point)."""
+    """Parse crawl queue message: JSON {"url": ..., "entry_point": ..., ...} or plain URL.
+    Returns (url, entry_point, data) where data is the full JSON dict ({} for a plain URL)."""
     body = (body or "").strip()
     if not body:
-        return "", None
+        return "", None, {}
     if body.startswith("{") and "url" in body:
         try:
             data = json.loads(body)
             url = data.get("url", "")
             entry_point = data.get("entry_point")
-            return url or "", entry_point
-        except (json.JSONDecodeError, TypeError):
+            return url or "", entry_point, data
+        except (json.JSONDecodeError, TypeError, AttributeError):
             pass
-    return body, None
+    return body, None, {}
 
 
 def _is_crunchbase_url(url):
@@ -105,37 +258,95 @@ def _is_tracxn_url(url):
 class CrawlQueue:
     """Single crawl queue (Crunchbase or Tracxn). Consumes from one RabbitMQ queue; validates URL matches queue type."""
 
-    def __init__(self, server, spider, key=None, meta_label="crunchbase", exchange=None):
+    def __init__(self, server, spider, key=None, meta_label="crunchbase", exchange=None, prefetch_count=0, retry_router=None):
         """
         Args:
             server: RabbitMQ channel
             spider: spider instance
             key: RabbitMQ queue name (e.g. crawl_crunchbase_queue)
             meta_label: 'crunchbase' or 'tracxn' (for request meta and URL validation)
+            prefetch_count: consume with this prefetch window (0 = poll with basic_get)
+            retry_router: RetryRouter that settles the messages handed out (ack / delayed retry)
         """
         self.server = server
+        self.retry_router = retry_router
         self.spider = spider
         self.key = key
         self.meta_label = meta_label
+        self._consumer = None
+        if self.key is not None and prefetch_count > 0:
+            self._consumer = PrefetchConsumer(server, self.key, prefetch_count)
+        if self.key is not None and retry_router is not None:
+            retry_router.bind(meta_label, server, self.key)
         logger.debug("Crawl queue: {} ({})", self.key, meta_label)
 
+    @property
+    def prefetching(self):
+        return self._consumer is not None
+
+    def head_priority(self):
+        """AMQP priority of the next buffered message (None when polling or empty)."""
+        if self._consumer is None:
+            return None
+        return self._consumer.peek_priority()
+
+    def _ready_count(self):
+        """Messages ready in the broker queue; None while an asyncio channel has no answer yet."""
+        return self.server.queue_declare(self.key, passive=True).method.message_count
+
     def __len__(self):
         if self.key is None:
             return 0
-        response = self.server.queue_declare(self.key, passive=True)
-        return response.method.message_count
+        buffered = len(self._consumer) if self._consumer is not None else 0
+        return (self._ready_count() or 0) + buffered
+
+    def drained(self):
+        """True if the broker has nothing ready in this queue and none of its messages are in flight.
+
+        An empty local buffer is not enough: with every prefetch slot taken the
+        broker stops pushing although the queue still has a backlog. An
+        unknown depth (asyncio channel before its first DeclareOk) is not
+        drained either.
+        """
+        if self.key is None:
+            return True
+        if self.retry_router is not None and self.retry_router.inflight(self.meta_label):
+            return False
+        if self._consumer is not None and len(self._consumer):
+            return False
+        try:
+            ready = self._ready_count()
+        except Exception as e:
+            logger.debug("Could not read the depth of {}: {}", self.key, e)
+            return False
+        return ready == 0
 
     def push(self, request):
         pass
 
+    def _get(self):
+        if self._consumer is not None:
+            return self._consumer.get()
+        return self.server.basic_get(queue=self.key)
+
     def pop(self):
         if self.key is None:
             return None
-        method_frame, header, body = self.server.basic_get(queue=self.key)
+        method_frame, header, body = self._get()
         if body is None:
             return None
         encoded = body.decode("utf-8")
         request = self._decode_request(encoded, method_frame.delivery_tag)
+        if request is not None and header is not None:
+            if header.timestamp:
+                # Publish time (set by CrunchyRest) -> scheduler wait-time stats
+                request.meta["enqueued_at"] = header.timestamp
+            if header.priority:
+                # Crawl lane priority (follow-ups carry it into the local queue)
+                request = request.replace(priority=header.priority)
+        if request is not None and self.retry_router is not None:
+            token = self.retry_router.track(self.meta_label, method_frame.delivery_tag, body, header)
+            request.meta["delivery_tag"] = token
         if request is None:
             # Invalid URL for this queue: ack to remove message, do not create request
             self.server.basic_ack(delivery_tag=method_frame.delivery_tag)
@@ -154,7 +365,7 @@ class CrawlQueue:
 
     def _decode_request(self, encoded_request, delivery_tag):
         """Decode body; return Request or None if URL does not match this queue (strict URL handling)."""
-        url, entry_point = _parse_crawl_message(encoded_request)
+        url, entry_point, data = _parse_crawl_message(encoded_request)
         if not url:
             return None
         if self.meta_label == "crunchbase":
@@ -163,9 +374,21 @@ class CrawlQueue:
         else:  # tracxn
             if not _is_tracxn_url(url):
                 return None
-        return generateRequest(
+        request = generateRequest(
             url, delivery_tag, queue=self.meta_label, entry_point=entry_point
         )
+        if data.get("dont_filter"):
+            # Explicit recrawl (e.g. refresh): bypass the dupefilter
+            request = request.replace(dont_filter=True)
+        return request
+
+    def ack(self, delivery_tag):
+        if delivery_tag is None:
+            return
+        if self.retry_router is not None:
+            self.retry_router.ack(self.meta_label, delivery_tag)
+        else:
+            self.server.basic_ack(delivery_tag=delivery_tag)
 
     def clear(self):
         if self.key is not None:
@@ -0,0 +1,286 @@
+"""
+Delayed retries for failed crawl messages.
+
+A failed crawl is not nacked back to the head of its queue (which re-crawled
+a Cloudflare-blocked page straight away). Instead it is re-published to a
+delay queue and the original is acked:
+
+    crawl_crunchbase_queue --fail--> crawl_crunchbase_queue.retry.30s
+        --(x-message-ttl expires)--> crawl_exchange / crawl_crunchbase
+        --> crawl_crunchbase_queue  (x-retry-count: 1)
+
+Each further failure moves the message one tier up (RB_RETRY_DELAYS, e.g.
+30s, 5m, 30m, 2h). After the last tier it goes to
+"<queue>.parked", which nothing consumes: inspect it, then shovel it back
+or purge it.
+
+Every queue has its own fixed TTL, so messages in one delay queue expire in
+order and never wait behind a longer delay.
+
+The copy is published with mandatory=True on a channel in confirm mode, and
+the original is only acked once the broker has confirmed the copy. A copy
+that is nacked or returned unroutable (e.g. its delay queue is not declared
+yet, or is being re-created) gets the original nacked back to its crawl
+queue instead, so the crawl is never lost.
+"""
+
+import itertools
+import os
+import pika
+from loguru import logger
+
+RETRY_COUNT_HEADER = "x-retry-count"
+RETRY_REASON_HEADER = "x-retry-reason"
+# Publish sequence number of a retry copy, to match a Basic.Return to its original
+RETRY_PUBLISH_HEADER = "x-retry-publish-seq"
+
+
+def retry_queue_name(queue_name, delay):
+    return f"{queue_name}.retry.{int(delay)}s"
+
+
+def parking_queue_name(queue_name):
+    return f"{queue_name}.parked"
+
+
+def retry_topology(exchange, queue_name, routing_key, delays):
+    """(channel method, kwargs) steps declaring the delay queues (dead-lettering back
+    to exchange/routing_key) and the parking queue."""
+    steps = [
+        (
+            "queue_declare",
+            {
+                "queue": retry_queue_name(queue_name, delay),
+                "durable": True,
+                "arguments": {
+                    "x-message-ttl": int(delay * 1000),
+                    "x-dead-letter-exchange": exchange,
+                    "x-dead-letter-routing-key": routing_key,
+                },
+            },
+        )
+        for delay in delays
+    ]
+    steps.append(("queue_declare", {"queue": parking_queue_name(queue_name), "durable": True}))
+    return steps
+
+
+class RetryRouter(object):
+    """Settles crawl messages: ack on success, delayed retry or parking on failure.
+
+    CrawlQueue registers every message it hands out (body and properties are
+    needed to re-publish it) and puts the returned token in request.meta
+    "delivery_tag". Tokens never repeat, while AMQP delivery tags restart at
+    1 on every re-opened channel, so a request from before a reconnect can
+    never ack a new message that happens to reuse its tag. They are also
+    unique across processes (a random prefix per router): a follow-up spilled
+    to the broker keeps its parent's token, and when another process (e.g.
+    the next worker with the same CRUNCHY_WORKER) pops it, the token settles
+    nothing there instead of some other crawl.
+
+    A message is settled at most once. A second ack/reject for the same token
+    (e.g. a download error followed by a spider error for the same request) is
+    ignored; so are tokens from an older channel generation, which the broker
+    has already requeued.
+    """
+
+    def __init__(self, delays, stats=None):
+        """
+        Args:
+            delays: retry tier delays in seconds
+        """
+        self.queues = {}
+        self.delays = list(delays)
+        self.stats = stats
+        self._inflight = {}
+        self._token_prefix = os.urandom(4).hex()
+        self._tokens = itertools.count(1)
+        # Confirm mode per source: channel generation it was enabled on, whether confirms
+        # arrive asynchronously, and the publish sequence number on that channel
+        self._confirm_generation = {}
+        self._async_confirms = {}
+        self._publish_seq = {}
+        # (source, seq) -> (generation, delivery_tag, token, target, stat, reason, attempt) of
+        # retry copies waiting for their confirm; the originals are still unacked
+        self._awaiting = {}
+        self._returned = set()
+
+    def __len__(self):
+        return len(self._inflight) + len(self._awaiting)
+
+    def inflight(self, source):
+        """Messages of `source` handed out and not settled yet."""
+        handed_out = sum(1 for entry in self._inflight.values() if entry[0] == source)
+        return handed_out + sum(1 for key in self._awaiting if key[0] == source)
+
+    def _inc(self, key):
+        if self.stats:
+            self.stats.inc_value(key)
+
+    def bind(self, source, channel, queue_name):
+        """Settle messages of `source` on `channel` (CrawlQueue binds itself once its channel is open)."""
+        self.queues[source] = (channel, queue_name)
+        if hasattr(channel, "add_reopen_callback"):
+            channel.add_reopen_callback(lambda proxy: self._forget_stale(source))
+
+    def _forget_stale(self, source):
+        generation = getattr(self.queues[source][0], "generation", 0)
+        stale = [
+            token for token, entry in self._inflight.items()
+            if entry[0] == source and entry[1] != generation
+        ]
+        for token in stale:
+            del self._inflight[token]
+        # Confirms for the old channel will never come; the broker requeued those originals too
+        awaiting = [key for key, entry in self._awaiting.items() if key[0] == source and entry[0] != generation]
+        for key in awaiting:
+            del self._awaiting[key]
+            self._returned.discard(key)
+            stale.append(key)
+        if stale:
+            logger.info("{} {} messages were requeued by the broker on channel loss", len(stale), source)
+
+    def track(self, source, delivery_tag, body, properties):
+        """Register a delivered message; returns the token to settle it with."""
+        token = f"{self._token_prefix}-{next(self._tokens)}"
+        generation = getattr(self.queues[source][0], "generation", 0)
+        self._inflight[token] = (source, generation, delivery_tag, body, properties)
+        return token
+
+    def _settleable(self, source, token, action):
+        entry = self._inflight.pop(token, None)
+        if entry is None or entry[0] != source:
+            logger.debug("{} skipped, {} {} already settled", action, source, token)
+            return None
+        channel = self.queues[source][0]
+        if entry[1] != getattr(channel, "generation", 0):
+            logger.debug("{} skipped, {} {} is from a closed channel", action, source, token)
+            return None
+        return entry
+
+    def ack(self, source, token):
+        entry = self._settleable(source, token, "Ack")
+        if entry is None:
+            return False
+        channel, _ = self.queues[source]
+        channel.basic_ack(delivery_tag=entry[2])
+        return True
+
+    def reject(self, source, token, reason):
+        """Send the message to its next delay tier (or park it); the original is acked once the broker has the copy."""
+        entry = self._settleable(source, token, "Reject")
+        if entry is None:
+            return False
+        _, _, delivery_tag, body, properties = entry
+        channel, queue_name = self.queues[source]
+        headers = dict(properties.headers or {}) if properties is not None else {}
+        attempt = int(headers.get(RETRY_COUNT_HEADER, 0)) + 1
+        headers[RETRY_COUNT_HEADER] = attempt
+        headers[RETRY_REASON_HEADER] = reason
+
+        if attempt > len(self.delays):
+            target = parking_queue_name(queue_name)
+            stat = f"retry/{source}/parked"
+        else:
+            delay = self.delays[attempt - 1]
+            target = retry_queue_name(queue_name, delay)
+            stat = f"retry/{source}/delayed/{int(delay)}s"
+
+        if not self._ensure_confirms(source, channel):
+            self._requeue(source, delivery_tag, token, target, "confirm mode unavailable")
+            return False
+        seq = self._publish_seq[source] = self._publish_seq[source] + 1
+        headers[RETRY_PUBLISH_HEADER] = seq
+        try:
+            channel.basic_publish(
+                exchange="",
+                routing_key=target,
+                body=body,
+                properties=pika.BasicProperties(
+                    delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
+                    content_type=getattr(properties, "content_type", None),
+                    # Keep the first publish time so wait-time stats include the retries
+                    timestamp=getattr(properties, "timestamp", None),
+                    priority=getattr(properties, "priority", None),
+                    headers=headers,
+                ),
+                mandatory=True,
+            )
+        except (pika.exceptions.NackError, pika.exceptions.UnroutableError) as e:
+            # Blocking transport: basic_publish waited for the confirm
+            self._requeue(source, delivery_tag, token, target, e)
+            return False
+        except Exception as e:
+            # Left unacked: the broker requeues it when the channel goes away
+            logger.error(f"Retry publish to {target} failed, message left unacked: {e}")
+            return False
+        if self._async_confirms[source]:
+            self._awaiting[(source, seq)] = (
+                getattr(channel, "generation", 0), delivery_tag, token, target, stat, reason, attempt
+            )
+            return True
+        self._settled(source, delivery_tag, token, target, stat, reason, attempt)
+        return True
+
+    def _settled(self, source, delivery_tag, token, target, stat, reason, attempt):
+        """The retry copy is safe with the broker: ack the original."""
+        channel, _ = self.queues[source]
+        channel.basic_ack(delivery_tag=delivery_tag)
+        logger.info("Retry {} {} -> {} (attempt {}, {})", source, token, target, attempt, reason)
+        self._inc(stat)
+        self._inc(f"retry/{source}/reason/{reason}")
+
+    def _requeue(self, source, delivery_tag, token, target, error):
+        """The retry copy was refused: put the original back on its crawl queue rather than lose it."""
+        channel, _ = self.queues[source]
+        logger.error(f"Retry publish of {source} {token} to {target} not confirmed ({error}), requeueing the original")
+        try:
+            channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+        except Exception as e:
+            # Left unacked: the broker requeues it when the channel goes away
+            logger.error(f"Requeue of {source} {token} failed: {e}")
+        self._inc(f"retry/{source}/requeued")
+
+    def _ensure_confirms(self, source, channel):
+        """Put the source's current channel generation in confirm mode; False if that fails."""
+        generation = getattr(channel, "generation", 0)
+        if self._confirm_generation.get(source) == generation:
+            return True
+        try:
+            self._async_confirms[source] = channel.enable_confirms(lambda frame: self._on_confirm(source, frame))
+            if self._async_confirms[source]:
+                channel.add_on_return_callback(lambda *args: self._on_return(source, *args))
+        except Exception as e:
+            logger.warning(f"Retry confirm mode on {source} failed: {e!r}")
+            return False
+        self._confirm_generation[source] = generation
+        # Publish sequence numbers restart at 1 on every channel
+        self._publish_seq[source] = 0
+        return True
+
+    def _on_return(self, source, channel, method, properties, body):
+        """Basic.Return of an unroutable retry copy; its confirm (an ack) follows."""
+        seq = (properties.headers or {}).get(RETRY_PUBLISH_HEADER) if properties is not None else None
+        if seq is not None:
+            self._returned.add((source, int(seq)))
+
+    def _on_confirm(self, source, frame):
+        """Basic.Ack / Basic.Nack for retry copies (asyncio transport)."""
+        method = frame.method
+        ok = isinstance(method, pika.spec.Basic.Ack)
+        if method.multiple:
+            keys = [key for key in self._awaiting if key[0] == source and key[1] <= method.delivery_tag]
+        else:
+            keys = [(source, method.delivery_tag)]
+        generation = getattr(self.queues[source][0], "generation", 0)
+        for key in keys:
+            entry = self._awaiting.pop(key, None)
+            returned = key in self._returned
+            self._returned.discard(key)
+            if entry is None or entry[0] != generation:
+                continue
+            _, delivery_tag, token, target, stat, reason, attempt = entry
+            if ok and not returned:
+                self._settled(source, delivery_tag, token, target, stat, reason, attempt)
+            else:
+                self._requeue(source, delivery_tag, token, target, "returned unroutable" if returned else "nacked")
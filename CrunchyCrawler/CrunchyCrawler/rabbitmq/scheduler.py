@@ -1,6 +1,17 @@
-from .connection import get_channels, get_internal_channel, close
+import time
+from .connection import (
+    connect,
+    get_channels,
+    get_internal_channel,
+    get_retry_router,
+    get_transport,
+    close,
+    shutdown,
+)
+from scrapy import signals
 from scrapy.utils.misc import load_object
 from loguru import logger
+from .queue import LocalSpiderQueue
 
 
 # default values
@@ -8,12 +19,19 @@ SCHEDULER_PERSIST = True
 QUEUE_KEY = "%(spider)s:requests"
 SPIDER_QUEUE_CLASS = "CrunchyCrawler.rabbitmq.queue.SpiderQueue"
 CRAWL_QUEUE_CLASS = "CrunchyCrawler.rabbitmq.queue.CrawlQueue"
+LOCAL_QUEUE_SIZE = 1000
 DUPEFILTER_KEY = "%(spider)s:dupefilter"
 IDLE_BEFORE_CLOSE = 0
+PREFETCH_COUNT = 0
+CRAWL_QUEUE_THRESHOLD = 60
+POLICY_CLASS = "CrunchyCrawler.rabbitmq.policy.DeficitRoundRobinPolicy"
+DUPEFILTER_CLASS = "CrunchyCrawler.rabbitmq.dupefilter.RFPDupeFilter"
+URGENT_PRIORITY = 9
 
 
 class Scheduler(object):
-    """RabbitMQ Scheduler for Scrapy. Consumes from spider queue, then Tracxn crawl queue, then Crunchbase crawl queue."""
+    """RabbitMQ Scheduler for Scrapy. Hands out in-process follow-ups first, then pops the
+    Tracxn / Crunchbase crawl queues in the order chosen by the scheduling policy."""
 
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -33,6 +51,15 @@ class Scheduler(object):
         crawl_queue_cls,
         dupefilter_key,
         idle_before_close,
+        prefetch_count=PREFETCH_COUNT,
+        crawl_queue_threshold=CRAWL_QUEUE_THRESHOLD,
+        policy=None,
+        df=None,
+        local_queue_size=LOCAL_QUEUE_SIZE,
+        spill_on_close=False,
+        urgent_priority=URGENT_PRIORITY,
+        retry_router=None,
+        source_inflight=None,
         *args,
         **kwargs,
     ):
@@ -46,10 +73,24 @@ class Scheduler(object):
         self.queue_cls = spider_queue_cls
         self.crawl_queue_cls = crawl_queue_cls
         self.dupefilter_key = dupefilter_key
+        self.df = df
+        self.local_queue_size = local_queue_size
+        self.spill_on_close = spill_on_close
+        self.urgent_priority = urgent_priority
+        self.retry_router = retry_router
+        # Messages per source crawled in parallel (browser pool caps); each needs a prefetch slot
+        self.source_inflight = source_inflight or {}
         self.idle_before_close = idle_before_close
         self.stats = None
+        self.prefetch_count = prefetch_count
         self.counter = 0
-        self.threshold = 60
+        # The crawl queue gate only exists to space out basic_get polling; with a
+        # prefetch window the next message is already buffered locally.
+        self.threshold = 0 if prefetch_count > 0 else crawl_queue_threshold
+        self.policy = policy
+        self.crawl_queues = {}
+        self._source_dequeued = {}
+        self._source_wait_total = {}
         logger.debug("Using custom scheduler")
 
     def __len__(self):
@@ -78,12 +119,25 @@ class Scheduler(object):
         idle_before_close = settings.get(
             "SCHEDULER_IDLE_BEFORE_CLOSE", IDLE_BEFORE_CLOSE
         )
-        cb_channel, tracxn_channel = get_channels()
-        internal_channel = get_internal_channel()
+        prefetch_count = settings.getint("SCHEDULER_PREFETCH_COUNT", PREFETCH_COUNT)
+        crawl_queue_threshold = settings.getint(
+            "SCHEDULER_CRAWL_QUEUE_THRESHOLD", CRAWL_QUEUE_THRESHOLD
+        )
+        policy_cls = load_object(settings.get("SCHEDULER_POLICY_CLASS", POLICY_CLASS))
+        policy = policy_cls.from_settings(settings)
+        dupefilter_cls = load_object(
+            settings.get("SCHEDULER_DUPEFILTER_CLASS", DUPEFILTER_CLASS)
+        )
+        df = dupefilter_cls.from_settings(settings)
+        local_queue_size = settings.getint("SCHEDULER_LOCAL_QUEUE_SIZE", LOCAL_QUEUE_SIZE)
+        spill_on_close = settings.getbool("SCHEDULER_SPILL_ON_CLOSE", False)
+        urgent_priority = settings.getint("SCHEDULER_URGENT_PRIORITY", URGENT_PRIORITY)
+        source_inflight = settings.getdict("SCHEDULER_SOURCE_INFLIGHT", {})
+        # Channels are resolved in open(), once the transport is connected
         return cls(
-            internal_channel,
-            cb_channel,
-            tracxn_channel,
+            None,
+            None,
+            None,
             persist,
             spider_queue_key,
             spider_queue_cls,
@@ -92,43 +146,109 @@ class Scheduler(object):
             crawl_queue_cls,
             dupefilter_key,
             idle_before_close,
+            prefetch_count=prefetch_count,
+            crawl_queue_threshold=crawl_queue_threshold,
+            policy=policy,
+            df=df,
+            local_queue_size=local_queue_size,
+            spill_on_close=spill_on_close,
+            urgent_priority=urgent_priority,
+            retry_router=get_retry_router(),
+            source_inflight=source_inflight,
         )
 
     @classmethod
     def from_crawler(cls, crawler):
         instance = cls.from_settings(crawler.settings)
         instance.stats = crawler.stats
+        instance.df.stats = crawler.stats
+        if instance.retry_router is not None:
+            instance.retry_router.stats = crawler.stats
+        crawler.signals.connect(
+            instance.response_received, signal=signals.response_received
+        )
+        crawler.signals.connect(instance.item_scraped, signal=signals.item_scraped)
         return instance
 
     def open(self, spider):
+        """Connect the RabbitMQ transport, then open the queues (returns a Deferred)."""
         self.spider = spider
+        d = connect()
+        d.addCallback(lambda _: self._open_queues(spider))
+        return d
+
+    def _open_queues(self, spider):
+        if self.cb_channel is None:
+            self.cb_channel, self.tracxn_channel = get_channels()
+        if self.internal_channel is None:
+            self.internal_channel = get_internal_channel()
+        if get_transport().consume_only and self.prefetch_count <= 0:
+            # The asyncio transport has no blocking basic_get: consume instead
+            self.prefetch_count = 1
+            self.threshold = 0
 
-        self.queue = self.queue_cls(
-            self.internal_channel, spider, self.spider_queue_key
+        # Follow-ups stay in memory; the broker spider queue is only spill-over
+        self.queue = LocalSpiderQueue(
+            self.queue_cls(
+                self.internal_channel,
+                spider,
+                self.spider_queue_key,
+                prefetch_count=self.prefetch_count,
+            ),
+            max_size=self.local_queue_size,
+            stats=self.stats,
+            spider=spider,
         )
         self.cb_crawl_queue = self.crawl_queue_cls(
-            self.cb_channel, spider, self.cb_crawl_queue_key, meta_label="crunchbase"
+            self.cb_channel,
+            spider,
+            self.cb_crawl_queue_key,
+            meta_label="crunchbase",
+            prefetch_count=self._source_prefetch("crunchbase"),
+            retry_router=self.retry_router,
         )
         self.tracxn_crawl_queue = self.crawl_queue_cls(
             self.tracxn_channel,
             spider,
             self.tracxn_crawl_queue_key,
             meta_label="tracxn",
+            prefetch_count=self._source_prefetch("tracxn"),
+            retry_router=self.retry_router,
         )
+        # Insertion order is the tie-break order for the policy (Tracxn first, as before)
+        self.crawl_queues = {
+            "tracxn": self.tracxn_crawl_queue,
+            "crunchbase": self.cb_crawl_queue,
+        }
 
         if self.idle_before_close < 0:
             self.idle_before_close = 0
 
+        self.df.open()
+
         if len(self.queue):
             spider.log("Resuming crawl (%d requests scheduled)" % len(self.queue))
 
+    def _source_prefetch(self, source):
+        """Prefetch window of a crawl queue: one per parallel crawl, plus the buffered messages."""
+        if self.prefetch_count <= 0:
+            return self.prefetch_count
+        return self.prefetch_count + max(int(self.source_inflight.get(source, 1)), 1) - 1
+
     def close(self, reason):
-        close(self.cb_channel)
-        close(self.tracxn_channel)
+        if self.retry_router is not None and len(self.retry_router):
+            logger.info("{} unsettled crawl messages will be redelivered", len(self.retry_router))
+        self.queue.close(spill=self.spill_on_close)
+        self.df.close(reason)
+        for channel in (self.cb_channel, self.tracxn_channel):
+            if channel is not None:
+                close(channel)
+        shutdown()
 
     def enqueue_request(self, request):
-        # if not request.dont_filter and self.df.request_seen(request):
-        #     return
+        if not request.dont_filter and self.df.request_seen(request):
+            self.df.log(request, self.spider)
+            return False
         if self.stats:
             self.stats.inc_value("scheduler/enqueued/rabbitmq", spider=self.spider)
         self.queue.push(request)
@@ -136,31 +256,90 @@ class Scheduler(object):
     def next_request(self):
         logger.debug("Getting new request")
         request = self.queue.pop()
-        logger.info("From Spider queue {} live:{}", request, self.cb_channel.is_open)
+        logger.info("From follow-up queue {} live:{}", request, self.cb_channel.is_open)
         logger.info(
             "Counter---->>> Counter:{} Threshold:{}", self.counter, self.threshold
         )
         if request is None and self.counter >= self.threshold:
-            if self.tracxn_crawl_queue.key is not None:
-                request = self.tracxn_crawl_queue.pop()
-                logger.info(
-                    "From Tracxn crawl queue: {} live:{}",
-                    request,
-                    self.tracxn_channel.is_open,
-                )
-            if request is None and self.cb_crawl_queue.key is not None:
-                request = self.cb_crawl_queue.pop()
-                logger.info(
-                    "From Crunchbase crawl queue: {} live:{}",
-                    request,
-                    self.cb_channel.is_open,
-                )
+            request = self._next_crawl_request()
             if request is not None:
                 self.counter = 0
         logger.info("request --->>>> {}", request)
         self.counter += 1
         return request
 
+    def _next_crawl_request(self):
+        """Pop from the crawl queues in the order the policy picks; first non-empty wins.
+        A source with an urgent (interactive lane) message buffered goes first."""
+        sources = [
+            name for name, queue in self.crawl_queues.items() if queue.key is not None
+        ]
+        order = sorted(self.policy.order(sources), key=lambda s: not self._has_urgent(s))
+        for source in order:
+            queue = self.crawl_queues[source]
+            request = queue.pop()
+            while request is not None and self._already_crawled(queue, request):
+                request = queue.pop()
+            if request is None:
+                if queue.drained():
+                    self.policy.empty(source)
+                continue
+            logger.info("From {} crawl queue: {}", source, request)
+            self.policy.served(source, request)
+            self._record_dequeue(source, request)
+            return request
+        return None
+
+    def _has_urgent(self, source):
+        priority = self.crawl_queues[source].head_priority()
+        return priority is not None and priority >= self.urgent_priority
+
+    def _already_crawled(self, queue, request):
+        """Ack and drop crawl messages for companies the dupefilter has seen."""
+        if request.dont_filter or not self.df.seen(request.url):
+            return False
+        queue.ack(request.meta.get("delivery_tag"))
+        self.df.log(request, self.spider)
+        return True
+
+    def _record_dequeue(self, source, request):
+        """Per-source share and queue wait time (from the publish timestamp) as stats."""
+        self._source_dequeued[source] = self._source_dequeued.get(source, 0) + 1
+        if not self.stats:
+            return
+        self.stats.inc_value(f"scheduler/source/{source}/dequeued", spider=self.spider)
+        total = sum(self._source_dequeued.values())
+        for name, count in self._source_dequeued.items():
+            self.stats.set_value(
+                f"scheduler/source/{name}/share", round(count / total, 3), spider=self.spider
+            )
+        enqueued_at = request.meta.get("enqueued_at")
+        if enqueued_at:
+            wait = max(time.time() - enqueued_at, 0)
+            self._source_wait_total[source] = self._source_wait_total.get(source, 0) + wait
+            self.stats.max_value(
+                f"scheduler/source/{source}/wait_time_max", round(wait, 1), spider=self.spider
+            )
+            self.stats.set_value(
+                f"scheduler/source/{source}/wait_time_avg",
+                round(self._source_wait_total[source] / self._source_dequeued[source], 1),
+                spider=self.spider,
+            )
+
+    def item_scraped(self, item, response, spider):
+        """The item made it through the pipelines: remember the company as crawled."""
+        if item.get("source") not in ("crunchbase", "tracxn"):
+            return
+        self.df.mark_seen(item.get("crunchbase_url") or item.get("tracxn_url"))
+        redirect_urls = response.meta.get("redirect_urls")
+        if redirect_urls:
+            self.df.mark_seen(redirect_urls[0])
+
+    def response_received(self, response, request, spider):
+        source = request.meta.get("queue")
+        if source in self.crawl_queues:
+            self.policy.latency(source, request.meta.get("download_latency"))
+
     def has_pending_requests(self):
         """
         We never want to say we have pending requests
@@ -0,0 +1,140 @@
+"""
+Event-driven page readiness for Playwright renders.
+
+Replaces fixed wait_for_timeout sleeps: a page is handed to the parser as
+soon as it is usable, and timeouts are only upper bounds. A readiness
+profile (defined per source in CrunchyCrawler.request) is a dict:
+
+    {
+        "name": "crunchbase",
+        "ready": ["span.entity-name", "overview-details"],   # all present -> ready
+        "challenge": [".cf-turnstile", ...],                 # any present -> stop waiting
+        "timeout_ms": 6000,
+        "network_idle_ms": 0,                 # optional wait for network idle (upper bound)
+        "expand_js": "() => {...}",           # optional: returns true when it clicked something
+        "expand_selector": "tile-description",  # element whose DOM changes once expanded
+        "expand_timeout_ms": 3500,
+    }
+
+wait_until_ready is used as a PageMethod callable:
+PageMethod(wait_until_ready, profile). The selector wait runs in the page
+as a MutationObserver, so it returns on the first DOM change that makes
+the page ready (or shows a challenge) instead of polling.
+
+The result ({"profile", "outcome", "wait_ms", "expanded"}) is stored on the
+PageMethod; ReadinessStatsMiddleware copies it to meta "readiness" and
+records readiness/<profile>/<outcome> and wait_ms_max/avg stats.
+"""
+
+import time
+from loguru import logger
+
+# Any of these means Cloudflare is in the way: the spider's challenge handling takes over
+CHALLENGE_SELECTORS = [
+    "#challenge-form",
+    "#cf-challenge-running",
+    ".cf-turnstile",
+    "iframe[src*='challenges.cloudflare.com']",
+]
+
+WAIT_READY_JS = """async ({ ready, challenge, timeout }) => {
+  const check = () => {
+    if (challenge.some((s) => document.querySelector(s))) return 'challenge';
+    if (ready.every((s) => document.querySelector(s))) return 'ready';
+    return null;
+  };
+  const now = check();
+  if (now) return now;
+  return await new Promise((resolve) => {
+    const observer = new MutationObserver(() => {
+      const outcome = check();
+      if (outcome) { observer.disconnect(); clearTimeout(timer); resolve(outcome); }
+    });
+    const timer = setTimeout(() => { observer.disconnect(); resolve('timeout'); }, timeout);
+    observer.observe(document.documentElement, { childList: true, subtree: true, attributes: true });
+  });
+}"""
+
+# Runs the profile's expand_js (inlined: page CSPs may forbid eval), then resolves on the
+# first change under `selector`. The observer is attached before the click since Angular
+# can re-render synchronously inside the click handler.
+EXPAND_JS = """async ({ selector, timeout }) => {
+  const expand = __EXPAND__;
+  const target = document.querySelector(selector);
+  let changed = false;
+  const observer = target ? new MutationObserver(() => { changed = true; }) : null;
+  if (observer) observer.observe(target, { childList: true, subtree: true, characterData: true, attributes: true });
+  if (!expand()) { if (observer) observer.disconnect(); return 'none'; }
+  if (!observer) return 'timeout';
+  return await new Promise((resolve) => {
+    const done = (outcome) => { observer.disconnect(); clearInterval(poll); clearTimeout(timer); resolve(outcome); };
+    const poll = setInterval(() => { if (changed) done('expanded'); }, 50);
+    const timer = setTimeout(() => done(changed ? 'expanded' : 'timeout'), timeout);
+  });
+}"""
+
+
+async def wait_until_ready(page, profile):
+    """PageMethod callable: wait for the profile's readiness condition, return what happened."""
+    start = time.monotonic()
+    result = {"profile": profile["name"], "outcome": "ready", "expanded": None}
+    try:
+        if profile.get("ready") or profile.get("challenge"):
+            result["outcome"] = await page.evaluate(
+                WAIT_READY_JS,
+                {
+                    "ready": profile.get("ready", []),
+                    "challenge": profile.get("challenge", []),
+                    "timeout": profile.get("timeout_ms", 10_000),
+                },
+            )
+        if result["outcome"] != "challenge" and profile.get("network_idle_ms"):
+            try:
+                await page.wait_for_load_state("networkidle", timeout=profile["network_idle_ms"])
+            except Exception:
+                # Long-polling or analytics keep the network busy: the bound is enough
+                pass
+        if result["outcome"] != "challenge" and profile.get("expand_js"):
+            result["expanded"] = await page.evaluate(
+                EXPAND_JS.replace("__EXPAND__", profile["expand_js"]),
+                {
+                    "selector": profile.get("expand_selector", "body"),
+                    "timeout": profile.get("expand_timeout_ms", 3500),
+                },
+            )
+    except Exception as e:
+        # A challenge redirect destroys the execution context; let the spider look at the page
+        logger.debug(f"Readiness wait for {page.url} interrupted: {e}")
+        result["outcome"] = "interrupted"
+    result["wait_ms"] = round((time.monotonic() - start) * 1000, 1)
+    return result
+
+
+class ReadinessStatsMiddleware(object):
+    """Downloader middleware: exposes readiness results in meta and stats."""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self._waits = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def process_response(self, request, response, spider):
+        for pm in request.meta.get("playwright_page_methods") or ():
+            if getattr(pm, "method", None) is wait_until_ready and pm.result:
+                self._record(pm.result)
+                request.meta["readiness"] = pm.result
+        return response
+
+    def _record(self, result):
+        name = result["profile"]
+        count, total = self._waits.get(name, (0, 0.0))
+        count, total = count + 1, total + result["wait_ms"]
+        self._waits[name] = (count, total)
+        self.stats.inc_value(f"readiness/{name}/{result['outcome']}")
+        if result.get("expanded"):
+            self.stats.inc_value(f"readiness/{name}/expand/{result['expanded']}")
+        self.stats.max_value(f"readiness/{name}/wait_ms_max", result["wait_ms"])
+        self.stats.set_value(f"readiness/{name}/wait_ms_avg", round(total / count, 1))
@@ -2,6 +2,7 @@ import pickle
 from scrapy import Request
 from scrapy_playwright.page import PageMethod
 from scrapy.spidermiddlewares.httperror import HttpError
+from CrunchyCrawler.readiness import CHALLENGE_SELECTORS, wait_until_ready
 
 
 headers = {
@@ -16,65 +17,107 @@ DEFAULT_DOWNLOAD_TIMEOUT = 60
 CLOUDFLARE_DOWNLOAD_TIMEOUT = 120
 
 
-def generateRequest(url, delivery_tag, queue="normal", callback=None, previousResult={}, entry_point=None):
+# Named page-method profiles. Requests only carry the profile name in meta
+# ("page_profile"); the codec in rabbitmq/codec.py stores the name instead of
+# the PageMethod list and rebuilds it from here on decode.
+
+CRUNCHBASE_READ_MORE_JS = """() => {
+  var tiles = document.querySelectorAll('tile-description');
+  for (var i = 0; i < tiles.length; i++) {
+    var tile = tiles[i];
+    var btn = tile.querySelector('button');
+    if (!btn) continue;
+    var t = (btn.textContent || '').trim();
+    if (!/^(read|show|see|view)\\s*more$|^expand$/i.test(t) || t.length > 25) continue;
+    btn.scrollIntoView({ block: 'center', behavior: 'instant' });
+    btn.dispatchEvent(new MouseEvent('mousedown', { bubbles: true, view: window }));
+    btn.dispatchEvent(new MouseEvent('mouseup', { bubbles: true, view: window }));
+    btn.dispatchEvent(new MouseEvent('click', { bubbles: true, view: window }));
+    btn.click();
+    return true;
+  }
+  return false;
+}"""
+
+
+# Readiness profiles (CrunchyCrawler.readiness): timeouts are upper bounds, the wait ends
+# as soon as the page is ready or shows a Cloudflare challenge.
+CRUNCHBASE_READINESS = {
+    "name": "crunchbase",
+    "ready": ["span.entity-name", "overview-details"],
+    "challenge": CHALLENGE_SELECTORS,
+    "timeout_ms": 6000,  # the fixed sleeps this replaces added up to 6s
+    "expand_js": CRUNCHBASE_READ_MORE_JS,
+    "expand_selector": "overview-details tile-description",
+    "expand_timeout_ms": 3500,  # wait for Angular to expand and render full text
+}
+
+TRACXN_READINESS = {
+    "name": "tracxn",
+    "ready": ["h1"],
+    "challenge": CHALLENGE_SELECTORS,
+    "timeout_ms": 10_000,
+}
+
+
+def _crunchbase_profile():
+    """Crunchbase: expand "Read More" under About the Company so we capture full long_description."""
+    return {
+        "playwright_page_methods": [
+            PageMethod("wait_for_load_state", "domcontentloaded"),
+            PageMethod(wait_until_ready, CRUNCHBASE_READINESS),
+        ],
+        "download_timeout": CLOUDFLARE_DOWNLOAD_TIMEOUT,
+        "playwright_navigation_timeout": CLOUDFLARE_DOWNLOAD_TIMEOUT * 1000,  # ms
+        # Allow Cloudflare challenge pages (403/503) to reach spider so we can call FlareSolverr
+        "handle_httpstatus_list": [403, 503],
+    }
+
+
+def _default_profile():
+    """Tracxn (and any other non-Crunchbase): bounded timeouts so stuck pages don't block the crawler."""
+    return {
+        # Explicit timeout on load state so we never wait forever (e.g. infinite spinner, block page)
+        "playwright_page_methods": [
+            PageMethod("wait_for_load_state", "domcontentloaded", timeout=50_000),  # 50s
+            PageMethod(wait_until_ready, TRACXN_READINESS),
+        ],
+        "download_timeout": DEFAULT_DOWNLOAD_TIMEOUT,
+        "playwright_navigation_timeout": DEFAULT_DOWNLOAD_TIMEOUT * 1000,  # 60s in ms
+    }
+
+
+PAGE_PROFILES = {
+    "crunchbase": _crunchbase_profile,
+    "default": _default_profile,
+}
+
+
+def page_profile_for_url(url):
+    return "crunchbase" if "crunchbase.com" in url else "default"
+
+
+def generateRequest(url, delivery_tag, queue="normal", callback=None, previousResult={}, entry_point=None, profile=None):
     """
     Generate a Scrapy Request with Playwright support.
 
     For Crunchbase URLs, includes extended timeout and page access
-    for Cloudflare challenge handling.
+    for Cloudflare challenge handling. `profile` names an entry of
+    PAGE_PROFILES; by default it is picked from the URL.
     """
+    if profile not in PAGE_PROFILES:
+        profile = page_profile_for_url(url)
     meta = {
         "queue": queue,
         "previousResult": previousResult,
         "delivery_tag": delivery_tag,
         "playwright": True,
         "playwright_include_page": True,  # Enable page access for Cloudflare handling
-        "playwright_page_methods": [
-            PageMethod("wait_for_load_state", "domcontentloaded"),
-        ],
+        "page_profile": profile,
     }
     if entry_point is not None:
         meta["entry_point"] = entry_point
-
-    # Crunchbase: expand "Read More" under About the Company so we capture full long_description
-    if "crunchbase.com" in url:
-        meta["playwright_page_methods"] = [
-            PageMethod("wait_for_load_state", "domcontentloaded"),
-            PageMethod("wait_for_timeout", 2500),  # let content render (skip long wait so Cloudflare pages don't timeout)
-            PageMethod(
-                "evaluate",
-                """() => {
-                  var tiles = document.querySelectorAll('tile-description');
-                  for (var i = 0; i < tiles.length; i++) {
-                    var tile = tiles[i];
-                    var btn = tile.querySelector('button');
-                    if (!btn) continue;
-                    var t = (btn.textContent || '').trim();
-                    if (!/^(read|show|see|view)\\s*more$|^expand$/i.test(t) || t.length > 25) continue;
-                    btn.scrollIntoView({ block: 'center', behavior: 'instant' });
-                    btn.dispatchEvent(new MouseEvent('mousedown', { bubbles: true, view: window }));
-                    btn.dispatchEvent(new MouseEvent('mouseup', { bubbles: true, view: window }));
-                    btn.dispatchEvent(new MouseEvent('click', { bubbles: true, view: window }));
-                    btn.click();
-                    return true;
-                  }
-                  return false;
-                }""",
-            ),
-            PageMethod("wait_for_timeout", 3500),  # wait for Angular to expand and render full text
-        ]
-        meta["download_timeout"] = CLOUDFLARE_DOWNLOAD_TIMEOUT
-        meta["playwright_navigation_timeout"] = CLOUDFLARE_DOWNLOAD_TIMEOUT * 1000  # ms
-        # Allow Cloudflare challenge pages (403/503) to reach spider so we can call FlareSolverr
-        meta["handle_httpstatus_list"] = [403, 503]
-    else:
-        # Tracxn (and any other non-Crunchbase): bounded timeouts so stuck pages don't block the crawler
-        meta["download_timeout"] = DEFAULT_DOWNLOAD_TIMEOUT
-        meta["playwright_navigation_timeout"] = DEFAULT_DOWNLOAD_TIMEOUT * 1000  # 60s in ms
-        # Explicit timeout on load state so we never wait forever (e.g. infinite spinner, block page)
-        meta["playwright_page_methods"] = [
-            PageMethod("wait_for_load_state", "domcontentloaded", timeout=50_000),  # 50s
-        ]
+    meta.update(PAGE_PROFILES[profile]())
 
     return Request(
         url,
@@ -82,4 +125,4 @@ def generateRequest(url, delivery_tag, queue="normal", callback=None, previousRe
         callback=callback,
         meta=meta,
         dont_filter=False,
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,148 @@
+"""
+Resource-blocking route filter for Playwright pages.
+
+CrunchbaseDataParser and TracxnDataParser only read the DOM, yet every render
+also pulls images, fonts, media, analytics and ad scripts. scrapy-playwright
+asks PLAYWRIGHT_ABORT_REQUEST (abort_request below) about every request a
+page makes; this module answers from per-source rules:
+
+    ROUTE_FILTER_RULES = {
+        "crunchbase": {
+            "block_types": ["image", "media", "font"],
+            "block_patterns": ["google-analytics[.]com", "doubleclick[.]net"],
+            "allow_patterns": ["challenges[.]cloudflare[.]com", "/cdn-cgi/"],
+        },
+        "default": {...},
+    }
+
+A request is aborted when its resource type is in `block_types` or its URL
+matches a `block_patterns` regex, unless it matches an `allow_patterns`
+regex (scripts the page or the Cloudflare challenge needs to render).
+Document requests (the page itself, iframes) are never aborted. The source
+is picked from the URL of the page making the request; pages of other sites
+use the "default" rules.
+
+Aborted requests never reach the network, so their size is unknown: bytes
+saved are estimated from ROUTE_FILTER_EST_BYTES (average bytes per resource
+type). Stats: route_filter/<source>/aborted/<type>, route_filter/<source>/allowed
+and route_filter/<source>/bytes_saved_est.
+
+The filter is built by RouteFilterExtension from the crawler settings; until
+then (or with ROUTE_FILTER_ENABLED = False) nothing is aborted.
+"""
+
+import re
+from scrapy.exceptions import NotConfigured
+from loguru import logger
+
+DEFAULT_EST_BYTES = {
+    "image": 40_000,
+    "media": 300_000,
+    "font": 30_000,
+    "stylesheet": 15_000,
+    "script": 25_000,
+}
+OTHER_EST_BYTES = 5_000
+
+NEVER_ABORT_TYPES = ("document",)
+
+_route_filter = None
+
+
+class _Rules(object):
+
+    def __init__(self, conf):
+        self.block_types = frozenset(conf.get("block_types", ()))
+        self.block = self._compile(conf.get("block_patterns"))
+        self.allow = self._compile(conf.get("allow_patterns"))
+
+    @staticmethod
+    def _compile(patterns):
+        return re.compile("|".join(f"(?:{p})" for p in patterns)) if patterns else None
+
+    def aborts(self, resource_type, url):
+        if resource_type in NEVER_ABORT_TYPES:
+            return False
+        if self.allow is not None and self.allow.search(url):
+            return False
+        return resource_type in self.block_types or (self.block is not None and self.block.search(url) is not None)
+
+
+class RouteFilter(object):
+    """Decides which page requests to abort, per source, and counts what was saved."""
+
+    def __init__(self, rules, sources, est_bytes=None, stats=None):
+        """
+        Args:
+            rules: {source: {"block_types", "block_patterns", "allow_patterns"}}, "default" for other pages
+            sources: {source: domain}, to tell the source of a page from its URL
+        """
+        self.rules = {source: _Rules(conf) for source, conf in rules.items()}
+        self.sources = sources
+        self.est_bytes = est_bytes or DEFAULT_EST_BYTES
+        self.stats = stats
+
+    def _inc(self, key, count=1):
+        if self.stats:
+            self.stats.inc_value(f"route_filter/{key}", count)
+
+    def source_for(self, page_url):
+        for source, domain in self.sources.items():
+            if domain in page_url:
+                return source
+        return "default"
+
+    def should_abort(self, resource_type, url, page_url):
+        source = self.source_for(page_url or "")
+        rules = self.rules.get(source) or self.rules.get("default")
+        if rules is None:
+            return False
+        if not rules.aborts(resource_type, url):
+            self._inc(f"{source}/allowed")
+            return False
+        self._inc(f"{source}/aborted")
+        self._inc(f"{source}/aborted/{resource_type}")
+        self._inc(f"{source}/bytes_saved_est", self.est_bytes.get(resource_type, OTHER_EST_BYTES))
+        return True
+
+
+def _page_url(playwright_request):
+    try:
+        return playwright_request.frame.page.url
+    except Exception:
+        # Service worker requests have no frame
+        return ""
+
+
+def abort_request(playwright_request):
+    """PLAYWRIGHT_ABORT_REQUEST hook."""
+    if _route_filter is None:
+        return False
+    return _route_filter.should_abort(
+        playwright_request.resource_type, playwright_request.url, _page_url(playwright_request)
+    )
+
+
+class RouteFilterExtension(object):
+    """Builds the route filter used by abort_request from the crawler settings and stats."""
+
+    def __init__(self, route_filter):
+        global _route_filter
+        _route_filter = route_filter
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("ROUTE_FILTER_ENABLED", True):
+            raise NotConfigured
+        sources = {
+            source: conf["domain"] for source, conf in settings.getdict("BROWSER_POOL_SOURCES").items()
+        }
+        route_filter = RouteFilter(
+            settings.getdict("ROUTE_FILTER_RULES"),
+            sources,
+            est_bytes=settings.getdict("ROUTE_FILTER_EST_BYTES") or None,
+            stats=crawler.stats,
+        )
+        logger.info("Route filter enabled for {}", ", ".join(route_filter.rules))
+        return cls(route_filter)
@@ -60,8 +60,19 @@ DOWNLOAD_HANDLERS = {
 PLAYWRIGHT_USE_STEALTH = True
 
 DOWNLOADER_MIDDLEWARES = {
+    # First: requests rescheduled by the Cloudflare solve stage are answered without a download
+    'CrunchyCrawler.cloudflare.solve_stage.SolveStageMiddleware': 500,
     'CrunchyCrawler.middlewares.CrunchyUserAgentMiddleware': 545,
     'CrunchyCrawler.middlewares.RabbitMQMiddleware': 546,
+    'CrunchyCrawler.readiness.ReadinessStatsMiddleware': 580,
+    # Before the pool (no page for plain HTTP requests); sees responses and
+    # errors before RetryMiddleware (550) and RabbitMQMiddleware (546)
+    'CrunchyCrawler.fetch_tier.FetchTierMiddleware': 585,
+    # Picks the proxy before the pool picks the (source, proxy) context; scores proxies from responses
+    'CrunchyCrawler.proxy_pool.ProxyPoolMiddleware': 590,
+    'CrunchyCrawler.browser_pool.BrowserPoolMiddleware': 595,
+    # After the pool: adds cached Cloudflare clearance cookies to the request's page context
+    'CrunchyCrawler.cloudflare.clearance.ClearanceMiddleware': 597,
 }
 
 SCHEDULER = "CrunchyCrawler.rabbitmq.scheduler.Scheduler"
@@ -72,8 +83,22 @@ LOG_LEVEL = "INFO"
 
 # rabbitMQ (crawl queues + databucket queues)
 RABBITMQ_URL = config('RABBITMQ_URL', cast=str)
-# Option B parallel execution: set to 'crunchbase' or 'tracxn' to bind this process to one queue only (run two processes for parallel CB + Tracxn). Unset = both queues, Tracxn first.
+# 'asyncio': pika AsyncioConnection on the reactor's event loop, so broker I/O never stalls Playwright (consume mode only).
+# 'blocking': the old pika BlockingConnection.
+RB_TRANSPORT = config('RB_TRANSPORT', cast=str, default='asyncio')
+# The connection is opened when the spider opens (not at import) and healed in place: channels the broker
+# closes are re-opened, a lost connection is re-established with jittered backoff capped at RB_RECONNECT_MAX_BACKOFF seconds.
+RB_HEARTBEAT = config('RB_HEARTBEAT', cast=int, default=60)
+RB_RECONNECT_MAX_BACKOFF = config('RB_RECONNECT_MAX_BACKOFF', cast=float, default=60)
+# Channels shared round-robin by callers without a role of their own (rabbitmq.connection.get_pooled_channel)
+RB_CHANNEL_POOL_SIZE = config('RB_CHANNEL_POOL_SIZE', cast=int, default=2)
+# Option B parallel execution: set to 'crunchbase' or 'tracxn' to bind this process to one queue only (run two processes for parallel CB + Tracxn). Unset = both queues, shared by SCHEDULER_POLICY_CLASS.
 CRUNCHY_CRAWL_QUEUE = os.environ.get('CRUNCHY_CRAWL_QUEUE')  # 'crunchbase' | 'tracxn' | None
+# Set by the fleet supervisor: workers of one source share its crawl queue but each spills follow-ups
+# to a broker queue of its own (their delivery tags only settle crawl messages in the spilling worker).
+CRUNCHY_WORKER = os.environ.get('CRUNCHY_WORKER')
+if CRUNCHY_WORKER:
+    SCHEDULER_QUEUE_KEY = f'%(spider)s:requests:{CRUNCHY_WORKER}'
 
 # Decoupled crawl queues: Crunchbase and Tracxn each have their own queue
 RB_CRAWL_EXCHANGE = config('RB_CRAWL_EXCHANGE', cast=str, default='crawl_exchange')
@@ -81,17 +106,97 @@ RB_CRUNCHBASE_CRAWL_QUEUE = config('RB_CRUNCHBASE_CRAWL_QUEUE', cast=str, defaul
 RB_CRUNCHBASE_CRAWL_RK = config('RB_CRUNCHBASE_CRAWL_RK', cast=str, default='crawl_crunchbase')
 RB_TRACXN_CRAWL_QUEUE = config('RB_TRACXN_CRAWL_QUEUE', cast=str, default='crawl_tracxn_queue')
 RB_TRACXN_CRAWL_RK = config('RB_TRACXN_CRAWL_RK', cast=str, default='crawl_tracxn')
+# Crawl queues are priority queues (lanes set by CrunchyRest: interactive > discovered > similar > refresh). Must match CrunchyRest.
+RB_CRAWL_MAX_PRIORITY = config('RB_CRAWL_MAX_PRIORITY', cast=int, default=10)
+# Failed crawls are not requeued at the head of the queue: they wait in TTL delay queues
+# (<queue>.retry.<n>s), one tier per failure, and land in <queue>.parked after the last one.
+RB_RETRY_DELAYS = config('RB_RETRY_DELAYS', cast=json.loads, default='[30, 300, 1800, 7200]')
 
 # Scheduler consumes from RB_CRUNCHBASE_CRAWL_QUEUE and RB_TRACXN_CRAWL_QUEUE (parallel binding applied in scheduler when CRUNCHY_CRAWL_QUEUE is set).
+# Push-based consumption: basic_consume with this prefetch window per queue, buffered locally so a free browser slot gets a request without a broker round trip. 0 = legacy basic_get polling.
+SCHEDULER_PREFETCH_COUNT = config('SCHEDULER_PREFETCH_COUNT', cast=int, default=2)
+# basic_get polling only: look at the crawl queues once every N next_request calls
+SCHEDULER_CRAWL_QUEUE_THRESHOLD = config('SCHEDULER_CRAWL_QUEUE_THRESHOLD', cast=int, default=60)
+# Fair scheduling between the Tracxn and Crunchbase crawl queues when one process serves both.
+# DeficitRoundRobinPolicy shares browser time by weight (cost = observed page latency); WeightedRoundRobinPolicy shares request count; SourcePriorityPolicy = old Tracxn-first behaviour.
+SCHEDULER_POLICY_CLASS = config('SCHEDULER_POLICY_CLASS', cast=str, default='CrunchyCrawler.rabbitmq.policy.DeficitRoundRobinPolicy')
+SCHEDULER_SOURCE_WEIGHTS = config('SCHEDULER_SOURCE_WEIGHTS', cast=json.loads, default='{"tracxn": 1, "crunchbase": 1}')
+# A buffered crawl message at or above this priority (the interactive lane) is served before the policy's pick
+SCHEDULER_URGENT_PRIORITY = config('SCHEDULER_URGENT_PRIORITY', cast=int, default=9)
+
+# Company dupefilter: scalable Bloom filter keyed on canonical company URLs, snapshotted to DUPEFILTER_PATH.
+# Point the CB and Tracxn crawlers at the same file (shared volume) to dedupe across processes.
+# Crawl messages with "dont_filter": true (refresh/recrawl) bypass it.
+DUPEFILTER_PATH = config('DUPEFILTER_PATH', default='state/companies.bloom')
+DUPEFILTER_CAPACITY = config('DUPEFILTER_CAPACITY', cast=int, default=1_000_000)  # first slice; grows beyond this
+DUPEFILTER_ERROR_RATE = 0.01
+DUPEFILTER_SYNC_INTERVAL = 60  # seconds between snapshot merges
+
+# Content-hash change detection: a company whose extracted item hashes the same as its last publish is
+# acked without publishing to databucket. Hashes are kept per canonical company URL in CONTENT_HASH_PATH
+# (SQLite, shareable between the CB and Tracxn crawlers). An unchanged item is republished anyway once its
+# last publish is older than CONTENT_HASH_MAX_AGE seconds (0: never).
+CONTENT_HASH_ENABLED = config('CONTENT_HASH_ENABLED', default=True, cast=bool)
+CONTENT_HASH_PATH = config('CONTENT_HASH_PATH', default='state/content_hashes.sqlite3')
+CONTENT_HASH_MAX_AGE = config('CONTENT_HASH_MAX_AGE', cast=int, default=30 * 24 * 3600)
+
+# Spider-generated follow-ups (e.g. similar companies) are kept in an in-process priority queue.
+# Beyond SCHEDULER_LOCAL_QUEUE_SIZE pending follow-ups they spill to the broker spider queue.
+SCHEDULER_LOCAL_QUEUE_SIZE = 1000
+# Spill pending follow-ups to the broker at shutdown (off: their crawl messages are redelivered anyway)
+SCHEDULER_SPILL_ON_CLOSE = config('SCHEDULER_SPILL_ON_CLOSE', default=False, cast=bool)
+
+# Fleet supervisor (go-crunchy-supervisor.py): workers per source between [min, max], sized to
+# ceil(crawl queue depth / SUPERVISOR_MESSAGES_PER_WORKER). Workers are only added while the load
+# average per core stays under SUPERVISOR_MAX_LOAD, available memory above SUPERVISOR_MIN_FREE_MEMORY
+# and the fleet's RSS (browsers included) under SUPERVISOR_MAX_RSS_MB (0: no cap).
+# Each worker is a separate process with its own AIMD throttle, download slot and UA bandit, so N
+# workers of a source send N times its per-domain rate: Crunchbase (Cloudflare, one page at a time)
+# stays at one worker unless that is wanted.
+SUPERVISOR_WORKERS = config('SUPERVISOR_WORKERS', cast=json.loads, default='{"crunchbase": [1, 1], "tracxn": [1, 4]}')
+SUPERVISOR_MESSAGES_PER_WORKER = config('SUPERVISOR_MESSAGES_PER_WORKER', cast=int, default=50)
+SUPERVISOR_SCALE_INTERVAL = config('SUPERVISOR_SCALE_INTERVAL', cast=float, default=30)
+SUPERVISOR_SCALE_DOWN_DELAY = config('SUPERVISOR_SCALE_DOWN_DELAY', cast=float, default=300)
+SUPERVISOR_MAX_LOAD = config('SUPERVISOR_MAX_LOAD', cast=float, default=0.85)
+SUPERVISOR_MIN_FREE_MEMORY = config('SUPERVISOR_MIN_FREE_MEMORY', cast=float, default=0.15)
+SUPERVISOR_MAX_RSS_MB = config('SUPERVISOR_MAX_RSS_MB', cast=int, default=0)
+# Crashed workers restart after a jittered exponential backoff capped at SUPERVISOR_RESTART_MAX_BACKOFF
+# seconds; the backoff resets once a worker has run for SUPERVISOR_STABLE_AFTER seconds.
+SUPERVISOR_RESTART_MAX_BACKOFF = config('SUPERVISOR_RESTART_MAX_BACKOFF', cast=float, default=300)
+SUPERVISOR_STABLE_AFTER = config('SUPERVISOR_STABLE_AFTER', cast=float, default=60)
+SUPERVISOR_STOP_TIMEOUT = config('SUPERVISOR_STOP_TIMEOUT', cast=float, default=60)
 
 # Databucket exchange: scraped items (Crunchbase/Tracxn) go to these queues for Django consumers
 RB_DATABUCKET_EXCHANGE = config('RB_DATABUCKET_EXCHANGE', cast=str, default='databucket_exchange')
 RB_DATABUCKET_CRUNCHBASE_RK = config('RB_DATABUCKET_CRUNCHBASE_RK', cast=str, default='crunchbase_databucket')
 RB_DATABUCKET_TRACXN_RK = config('RB_DATABUCKET_TRACXN_RK', cast=str, default='tracxn_databucket')
+# Items are published in confirm mode, in batches sent at RB_DATABUCKET_BATCH_SIZE items or
+# RB_DATABUCKET_FLUSH_INTERVAL seconds. An item not confirmed within RB_DATABUCKET_CONFIRM_TIMEOUT
+# seconds sends its crawl to the delayed retry queues.
+RB_DATABUCKET_BATCH_SIZE = config('RB_DATABUCKET_BATCH_SIZE', cast=int, default=50)
+RB_DATABUCKET_FLUSH_INTERVAL = config('RB_DATABUCKET_FLUSH_INTERVAL', cast=float, default=0.2)
+RB_DATABUCKET_CONFIRM_TIMEOUT = config('RB_DATABUCKET_CONFIRM_TIMEOUT', cast=float, default=30)
+# Item bodies of at least RB_DATABUCKET_COMPRESS_MIN_BYTES are compressed: 'gzip', 'zstd' (needs
+# zstandard on both sides) or 'none'. CrunchyRest's consumer decodes all of them.
+RB_DATABUCKET_COMPRESSION = config('RB_DATABUCKET_COMPRESSION', cast=str, default='gzip')
+RB_DATABUCKET_COMPRESS_MIN_BYTES = config('RB_DATABUCKET_COMPRESS_MIN_BYTES', cast=int, default=1024)
 
 # FlareSolverr settings for Cloudflare bypass (free, open-source)
 FLARESOLVERR_URL = config('FLARESOLVERR_URL', cast=str, default='http://localhost:8191/v1')
 CLOUDFLARE_SOLVE_TIMEOUT = 60000  # milliseconds to wait for FlareSolverr solution
+# Solves in flight at once (the others wait), and FlareSolverr sessions (browsers) created at start and leased per solve
+FLARESOLVERR_MAX_CONCURRENCY = config('FLARESOLVERR_MAX_CONCURRENCY', default=2, cast=int)
+FLARESOLVERR_SESSION_POOL_SIZE = config('FLARESOLVERR_SESSION_POOL_SIZE', default=2, cast=int)
+# Solve stage (CrunchyCrawler.cloudflare.solve_stage): challenged Crunchbase pages are solved in the background
+# while the crawler renders other pages; beyond SOLVE_STAGE_MAX_PENDING held solves, messages go to retry.
+SOLVE_STAGE_ENABLED = config('SOLVE_STAGE_ENABLED', default=True, cast=bool)
+SOLVE_STAGE_MAX_PENDING = config('SOLVE_STAGE_MAX_PENDING', default=8, cast=int)
+# Clearance cache (CrunchyCrawler.cloudflare.clearance): cookies of a FlareSolverr solve are sent with later
+# requests of the domain (HTTP and Playwright) until cf_clearance expires, at most CLEARANCE_MAX_AGE seconds.
+# Cloudflare ties cf_clearance to the solver's user agent: pinning switches requests to it.
+CLEARANCE_CACHE_ENABLED = config('CLEARANCE_CACHE_ENABLED', default=True, cast=bool)
+CLEARANCE_MAX_AGE = config('CLEARANCE_MAX_AGE', default=1800, cast=int)
+CLEARANCE_PIN_USER_AGENT = config('CLEARANCE_PIN_USER_AGENT', default=True, cast=bool)
 
 # Dump raw scraped HTML + parsed item to <company_name>.json for testing extractors (test_crunchy_extractor.py, test_tracxy_extractor.py)
 DUMP_RAW_SCRAPED_DATA = config('DUMP_RAW_SCRAPED_DATA', default=False, cast=bool)
@@ -117,9 +222,96 @@ PLAYWRIGHT_DEFAULT_NAVIGATION_TIMEOUT = 60 * 1000  # 60 seconds, milliseconds
 # Obey robots.txt rules
 # ROBOTSTXT_OBEY = True
 
+# Browser pool (CrunchyCrawler.browser_pool): one Playwright context per source with warm pages reused
+# between navigations. `concurrency` caps parallel pages of the source (its download slot), a context is
+# recycled after `recycle_after` navigations or on a Cloudflare challenge.
+BROWSER_POOL_ENABLED = config('BROWSER_POOL_ENABLED', default=True, cast=bool)
+BROWSER_POOL_SOURCES = config(
+    'BROWSER_POOL_SOURCES',
+    cast=json.loads,
+    default='{"crunchbase": {"domain": "crunchbase.com", "concurrency": 1, "recycle_after": 40},'
+            ' "tracxn": {"domain": "tracxn.com", "concurrency": 12, "recycle_after": 200}}',
+)
+_pool_sources = {
+    source: conf for source, conf in BROWSER_POOL_SOURCES.items()
+    if not CRUNCHY_CRAWL_QUEUE or source == CRUNCHY_CRAWL_QUEUE
+}
+# Per-source caps; the pool routes every request of a source to the slot of its domain
+DOWNLOAD_SLOTS = {
+    conf["domain"]: {"concurrency": conf["concurrency"]} for conf in BROWSER_POOL_SOURCES.values()
+}
+# Crawl messages of a source being worked on at once: its prefetch window grows by this much
+SCHEDULER_SOURCE_INFLIGHT = {source: conf["concurrency"] for source, conf in BROWSER_POOL_SOURCES.items()} if BROWSER_POOL_ENABLED else {}
+# Crunchbase messages held by the solve stage are not rendering: don't let them use up the fetch window
+if SOLVE_STAGE_ENABLED and "crunchbase" in SCHEDULER_SOURCE_INFLIGHT:
+    SCHEDULER_SOURCE_INFLIGHT["crunchbase"] += SOLVE_STAGE_MAX_PENDING
+# Pages never exceed the largest source cap in one context (idle + in use)
+PLAYWRIGHT_MAX_PAGES_PER_CONTEXT = max(conf["concurrency"] for conf in BROWSER_POOL_SOURCES.values())
+
+# Route filter (CrunchyCrawler.route_filter): requests of Playwright pages the parsers don't need are aborted
+# by resource type or URL regex, per source. `allow_patterns` always wins: keep the Cloudflare challenge
+# scripts there. Bytes saved are estimated with ROUTE_FILTER_EST_BYTES (average bytes per resource type).
+ROUTE_FILTER_ENABLED = config('ROUTE_FILTER_ENABLED', default=True, cast=bool)
+_route_filter_trackers = [
+    r"google-analytics[.]com", r"googletagmanager[.]com", r"doubleclick[.]net", r"googlesyndication[.]com",
+    r"connect[.]facebook[.]net", r"snap[.]licdn[.]com", r"px[.]ads[.]linkedin[.]com", r"bat[.]bing[.]com",
+    r"hotjar[.]com", r"clarity[.]ms", r"cdn[.]segment[.]com", r"api[.]segment[.]io", r"fullstory[.]com",
+    r"mixpanel[.]com", r"amplitude[.]com", r"intercom[.]io", r"intercomcdn[.]com", r"hs-scripts[.]com",
+    r"hs-analytics[.]net", r"hubspot[.]com", r"cookielaw[.]org", r"onetrust[.]com", r"sentry[.]io",
+    r"pendo[.]io", r"zdassets[.]com",
+]
+# Sources without rules of their own use "default", e.g. {"crunchbase": {...}, "default": {...}}
+ROUTE_FILTER_RULES = config(
+    'ROUTE_FILTER_RULES',
+    cast=json.loads,
+    default=json.dumps({
+        "default": {
+            "block_types": ["image", "media", "font"],
+            "block_patterns": _route_filter_trackers,
+            "allow_patterns": [r"challenges[.]cloudflare[.]com", r"/cdn-cgi/"],
+        },
+    }),
+)
+ROUTE_FILTER_EST_BYTES = config('ROUTE_FILTER_EST_BYTES', cast=json.loads, default='{}')
+if ROUTE_FILTER_ENABLED:
+    PLAYWRIGHT_ABORT_REQUEST = "CrunchyCrawler.route_filter.abort_request"
+
+# Fetch tier (CrunchyCrawler.fetch_tier): matching pages of a source are first fetched over plain HTTP and
+# only rendered with Playwright when the HTTP page is blocked, challenged or misses a `required_xpaths` node.
+FETCH_TIER_ENABLED = config('FETCH_TIER_ENABLED', default=True, cast=bool)
+FETCH_TIER_HTTP_FIRST = config(
+    'FETCH_TIER_HTTP_FIRST',
+    cast=json.loads,
+    default='{"tracxn": {"url_contains": ["/d/companies/"],'
+            ' "required_xpaths": ["//h1//text()", "//*[contains(@class, \'txn--seo-companies\')]"]}}',
+)
+
+# User agent selection (CrunchyCrawler.ua_bandit): Thompson sampling per domain over AGENTS, favouring the
+# agents that get through without a Cloudflare challenge. Outcomes are synced to UA_BANDIT_PATH (shareable
+# between crawler processes) every UA_BANDIT_SYNC_INTERVAL seconds; an agent's history is capped at
+# UA_BANDIT_MAX_OBSERVATIONS so old outcomes fade. UA_BANDIT_ENABLED=false: uniform random choice.
+UA_BANDIT_ENABLED = config('UA_BANDIT_ENABLED', default=True, cast=bool)
+UA_BANDIT_PATH = config('UA_BANDIT_PATH', default='state/ua_bandit.json')
+UA_BANDIT_SYNC_INTERVAL = 300
+UA_BANDIT_MAX_OBSERVATIONS = 500
+
+# Proxy pool (CrunchyCrawler.proxy_pool): requests go through proxies from PROXY_POOL_LIST (JSON list) and/or
+# PROXY_POOL_LIST_PATH (one per line), picked at random weighted by success rate and latency. Proxies that fail,
+# get blocked or challenged are dead until their backoff passes (checked every PROXY_POOL_REANIMATE_INTERVAL s).
+# Disabled when no proxy is listed.
+PROXY_POOL_ENABLED = config('PROXY_POOL_ENABLED', default=True, cast=bool)
+PROXY_POOL_LIST = config('PROXY_POOL_LIST', cast=json.loads, default='[]')
+PROXY_POOL_LIST_PATH = config('PROXY_POOL_LIST_PATH', default='')
+PROXY_POOL_REANIMATE_INTERVAL = 60
+PROXY_POOL_HEALTH_ALPHA = 0.2  # weight of the newest response in the success/latency averages
+PROXY_POOL_DEFAULT_LATENCY = 5.0  # seconds, assumed until a proxy is measured
+
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
+# Every source can fill its slot and keep its prefetched messages waiting without starving the other one.
+if BROWSER_POOL_ENABLED:
+    CONCURRENT_REQUESTS = sum(SCHEDULER_SOURCE_INFLIGHT[source] + SCHEDULER_PREFETCH_COUNT for source in _pool_sources)
 # Option B (single queue per process): one request at a time so we don't bombard Crunchbase/Tracxn; parallel is 1 CB + 1 Tracxn across the two processes.
-if CRUNCHY_CRAWL_QUEUE:
+elif CRUNCHY_CRAWL_QUEUE:
     CONCURRENT_REQUESTS = 1
 else:
     CONCURRENT_REQUESTS = 2
@@ -162,17 +354,40 @@ DEFAULT_REQUEST_HEADERS = {
 # EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
 # }
+EXTENSIONS = {
+    "CrunchyCrawler.throttle.AIMDThrottle": 500,
+    "CrunchyCrawler.route_filter.RouteFilterExtension": 510,
+}
+
+# Per-domain AIMD rate control (requests/minute), driven by Cloudflare challenges, 403/429/503 and page latency.
+# DOWNLOAD_DELAY is only the delay before the first response of a domain comes back.
+AIMD_ENABLED = config('AIMD_ENABLED', default=True, cast=bool)
+AIMD_START_RATE = 12  # = DOWNLOAD_DELAY 5s
+AIMD_MIN_RATE = 1
+AIMD_MAX_RATE = 120
+AIMD_INCREASE = 1  # requests/minute added per clean response
+AIMD_DECREASE_FACTOR = 0.5  # on challenge / 403 / 429 / 503
+AIMD_LATENCY_DECREASE_FACTOR = 0.8  # on pages slower than AIMD_TARGET_LATENCY
+AIMD_TARGET_LATENCY = 30  # seconds
+AIMD_DECREASE_COOLDOWN = 10  # seconds; at most one decrease per window
+AIMD_DOMAIN_SETTINGS = {
+    "crunchbase.com": {"start_rate": 12, "max_rate": 20},
+    "tracxn.com": {"start_rate": 20, "max_rate": 240, "increase": 4},
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
+# Databucket first: the crawl message is only acked once the item's publish is confirmed
 ITEM_PIPELINES = {
-    "CrunchyCrawler.pipelines.RabbitMQPipeline": 300,
-    "CrunchyCrawler.pipelines.DatabucketPipeline": 301,
+    "CrunchyCrawler.pipelines.ContentHashPipeline": 290,
+    "CrunchyCrawler.pipelines.DatabucketPipeline": 300,
+    "CrunchyCrawler.pipelines.RabbitMQPipeline": 301,
 }
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-AUTOTHROTTLE_ENABLED = True
+# Disabled in favour of AIMDThrottle (both would fight over the slot delay)
+AUTOTHROTTLE_ENABLED = not AIMD_ENABLED
 # The initial download delay
 # AUTOTHROTTLE_START_DELAY = 5
 # The maximum download delay to be set in case of high latencies
@@ -0,0 +1,5 @@
+"""Project-specific Scrapy signals (sent with crawler.signals.send_catch_log)."""
+
+# Sent by the spider when a response turned out to be a Cloudflare challenge.
+# Arguments: request, response, spider
+cloudflare_challenge = object()
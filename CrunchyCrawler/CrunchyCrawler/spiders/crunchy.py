@@ -8,8 +8,14 @@ from CrunchyCrawler.rabbitmq.spiders import RabbitMQMixin
 from CrunchyCrawler.parser.CrunchbaseDataParser import CrunchbaseDataParser
 from CrunchyCrawler.parser.TracxnDataParser import TracxnDataParser
 from CrunchyCrawler.cloudflare.handler import CloudflareHandler, is_cloudflare_challenge
+from CrunchyCrawler.cloudflare.solver import FlareSolverrClient
+from CrunchyCrawler.cloudflare.solve_stage import SOLVE_FAILED_KEY
+from CrunchyCrawler.proxy_pool import PROXY_KEY
+from CrunchyCrawler.signals import cloudflare_challenge
 from scrapy.linkextractors import LinkExtractor
 from scrapy.utils.project import get_project_settings
+from scrapy.utils.defer import deferred_from_coro
+from scrapy import signals
 from loguru import logger
 
 
@@ -22,16 +28,34 @@ class CrunchySpider(RabbitMQMixin):
 
     name = "crunchy"
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def _set_crawler(self, crawler):
+        super()._set_crawler(crawler)
         # Initialize Cloudflare handler with FlareSolverr settings
-        settings = get_project_settings()
+        settings = crawler.settings
+        flaresolverr_url = settings.get("FLARESOLVERR_URL", "http://localhost:8191/v1")
+        solve_timeout = settings.getint("CLOUDFLARE_SOLVE_TIMEOUT", 60000)
+        client = FlareSolverrClient(
+            flaresolverr_url=flaresolverr_url,
+            solve_timeout=solve_timeout,
+            max_concurrency=settings.getint("FLARESOLVERR_MAX_CONCURRENCY", 2),
+            session_pool_size=settings.getint("FLARESOLVERR_SESSION_POOL_SIZE", 2),
+            stats=crawler.stats,
+        )
         self.cloudflare_handler = CloudflareHandler(
-            flaresolverr_url=settings.get(
-                "FLARESOLVERR_URL", "http://localhost:8191/v1"
-            ),
-            solve_timeout=settings.get("CLOUDFLARE_SOLVE_TIMEOUT", 60000),
+            flaresolverr_url=flaresolverr_url,
+            solve_timeout=solve_timeout,
+            client=client,
         )
+        crawler.signals.connect(self._start_flaresolverr, signal=signals.spider_opened)
+        crawler.signals.connect(self._stop_flaresolverr, signal=signals.spider_closed)
+
+    def _start_flaresolverr(self, spider):
+        # Sessions are ready before the first challenge instead of launched by it.
+        # Not awaited: a slow FlareSolverr must not hold up the crawl (solves wait for the pool).
+        deferred_from_coro(self.cloudflare_handler.client.start())
+
+    def _stop_flaresolverr(self, spider):
+        return deferred_from_coro(self.cloudflare_handler.close())
 
     async def parse(self, response):
         """Route to appropriate parser based on URL domain."""
@@ -58,7 +82,11 @@ class CrunchySpider(RabbitMQMixin):
             yield item
 
     async def _close_page(self, response):
-        """Safely close the Playwright page if available."""
+        """Done with the Playwright page: back to the browser pool, or closed if there is none."""
+        pool = getattr(self, "browser_pool", None)
+        if pool is not None:
+            await pool.release(response.meta)
+            return
         page = response.meta.get("playwright_page")
         if page:
             try:
@@ -126,6 +154,15 @@ class CrunchySpider(RabbitMQMixin):
             "_retry": True,
         }
 
+    def _report_challenge(self, response):
+        """Let extensions (AIMD throttle) know this domain just challenged us."""
+        self.crawler.signals.send_catch_log(
+            signal=cloudflare_challenge,
+            request=response.request,
+            response=response,
+            spider=self,
+        )
+
     async def _solve_cloudflare(self, response):
         """
         Attempt to solve Cloudflare challenge using FlareSolverr.
@@ -137,10 +174,16 @@ class CrunchySpider(RabbitMQMixin):
 
         # Use FlareSolverr to solve the challenge
         # FlareSolverr makes its own request and returns solved HTML
-        result = await self.cloudflare_handler.solve(response.url)
+        # Through the request's proxy: Cloudflare ties cf_clearance to the client IP
+        proxy = response.meta.get(PROXY_KEY)
+        result = await self.cloudflare_handler.solve(response.url, proxy=proxy)
 
         if result and result.get("response"):
             logger.info("FlareSolverr solved Cloudflare challenge successfully!")
+            # Keep the clearance cookies so the next pages of the domain skip the challenge
+            clearance_cache = getattr(self, "clearance_cache", None)
+            if clearance_cache is not None:
+                clearance_cache.store(response.url, result.get("userAgent"), result.get("cookies"), proxy=proxy)
             # Replace response body with FlareSolverr's solved HTML and set status=200
             # so the pipeline acks (it only acks when _response == 200)
             solved_html = result["response"]
@@ -157,8 +200,21 @@ class CrunchySpider(RabbitMQMixin):
 
     async def _parse_crunchbase(self, response):
         """Parse Crunchbase company page with Cloudflare handling."""
+        if SOLVE_FAILED_KEY in response.meta:
+            # Solved out of band (cloudflare/solve_stage.py) and FlareSolverr failed
+            yield self._create_retry_item(response, "cloudflare_solve_failed")
+            return
+
         # Check for Cloudflare challenge
         if is_cloudflare_challenge(response):
+            self._report_challenge(response)
+            solve_stage = getattr(self, "solve_stage", None)
+            if solve_stage is not None:
+                # Free the page now; the solve stage reschedules the request with the solved page
+                await self._close_page(response)
+                if not solve_stage.submit(response, self._solve_cloudflare):
+                    yield self._create_retry_item(response, "cloudflare_solve_backlog")
+                return
             success, new_response = await self._solve_cloudflare(response)
 
             if success and new_response:
@@ -223,7 +279,7 @@ class CrunchySpider(RabbitMQMixin):
                 callback=self.parseSimilarCompanies,
                 previousResult=item,
                 queue=queue,
-            )
+            ).replace(priority=response.request.priority)
         else:
             yield item
 
@@ -257,6 +313,7 @@ class CrunchySpider(RabbitMQMixin):
         """Parse similar companies from Crunchbase similarity page."""
         # Check for Cloudflare on similar companies page too
         if is_cloudflare_challenge(response):
+            self._report_challenge(response)
             success, new_response = await self._solve_cloudflare(response)
 
             if success and new_response:
@@ -0,0 +1,394 @@
+"""
+Crawler fleet supervisor: N worker processes per crawl source, scaled on queue depth.
+
+Each worker is an ordinary single-source crawler process (go-crunchy-cb.py /
+go-crunchy-tracxn.py). The supervisor:
+
+- restarts a worker that exits without being asked to, after a jittered
+  exponential backoff (SUPERVISOR_RESTART_MAX_BACKOFF); the backoff resets
+  once a worker has stayed up for SUPERVISOR_STABLE_AFTER seconds
+- every SUPERVISOR_SCALE_INTERVAL seconds reads the ready-message count of
+  each crawl queue (passive queue_declare, like
+  RabbitMQManager.get_pending_in_*_crawl_queue) and aims for
+  ceil(depth / SUPERVISOR_MESSAGES_PER_WORKER) workers, within the
+  per-source bounds of SUPERVISOR_WORKERS
+- adds workers only while the host has headroom (load average per core,
+  available memory and the fleet's total RSS including browser processes),
+  and removes one per tick while over those limits
+- removes workers only after the lower target has held for
+  SUPERVISOR_SCALE_DOWN_DELAY seconds, so a briefly drained queue does not
+  cause churn
+
+Per-domain limits are per process: every worker has its own AIMD throttle,
+download slot (concurrency) and user agent bandit, so N workers of a source
+send up to N times that source's request rate. Scaling out suits Tracxn;
+Crunchbase is Cloudflare-protected and limited to one page at a time, so it
+defaults to a single worker (SUPERVISOR_WORKERS) and a higher bound is
+logged as a warning.
+
+Workers of a source share its crawl queue but not their spill queue: the
+delivery tags spilled follow-ups carry only settle crawl messages in the
+worker that spilled them, so worker N (CRUNCHY_WORKER) spills to
+"<spider>:requests:<N>". Worker numbers are reused, lowest free first, so a
+new worker still crawls the follow-ups a retired one left in its spill
+queue. It cannot settle their crawl messages with them (the tags are
+unknown to its RetryRouter and ignored); those went back to the crawl queue
+when the retired worker's connection closed and are crawled again.
+
+Stopping a worker sends SIGTERM, which makes Scrapy shut down gracefully.
+Unacked crawl messages go back to the queue when its connection closes,
+and the shared dupefilter file is merged on close.
+"""
+
+import math
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pika
+from loguru import logger
+
+from CrunchyCrawler.expire import exp_backoff_full_jitter
+
+# Entry script per crawl source (run from the CrunchyCrawler project root)
+WORKER_SCRIPTS = {
+    "crunchbase": "go-crunchy-cb.py",
+    "tracxn": "go-crunchy-tracxn.py",
+}
+
+# Sources whose per-domain limits assume one crawler process
+SINGLE_WORKER_SOURCES = ("crunchbase",)
+
+
+def load_per_core():
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return 0.0
+
+
+def memory_available_fraction():
+    """MemAvailable / MemTotal from /proc/meminfo (1.0 where unavailable)."""
+    try:
+        with open("/proc/meminfo") as f:
+            info = {line.split(":")[0]: int(line.split()[1]) for line in f}
+        return info["MemAvailable"] / info["MemTotal"]
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        return 1.0
+
+
+def process_tree_rss(pids):
+    """Total RSS in bytes of `pids` and all their descendants (Linux /proc; 0 elsewhere)."""
+    parents = {}
+    rss = {}
+    page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+    try:
+        entries = [entry for entry in os.listdir("/proc") if entry.isdigit()]
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces: fields start after the last ")"
+                fields = f.read().rsplit(")", 1)[1].split()
+            parents[int(entry)] = int(fields[1])
+            rss[int(entry)] = int(fields[21]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    children = {}
+    for pid, ppid in parents.items():
+        children.setdefault(ppid, []).append(pid)
+    total = 0
+    stack = list(pids)
+    seen = set()
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, ()))
+    return total
+
+
+class QueueDepthProbe(object):
+    """Ready-message counts of the crawl queues, over one long-lived blocking connection."""
+
+    def __init__(self, url, queues):
+        self.url = url
+        self.queues = queues
+        self.connection = None
+        self.channel = None
+
+    def _ensure_channel(self):
+        if self.connection is None or not self.connection.is_open:
+            self.connection = pika.BlockingConnection(pika.URLParameters(self.url))
+            self.channel = None
+        if self.channel is None or not self.channel.is_open:
+            self.channel = self.connection.channel()
+        return self.channel
+
+    def depth(self, source):
+        """Messages ready in the source's crawl queue, or None if the broker can't tell."""
+        try:
+            channel = self._ensure_channel()
+            state = channel.queue_declare(queue=self.queues[source], passive=True)
+            return state.method.message_count
+        except pika.exceptions.ChannelClosedByBroker as e:
+            # Queue not declared yet (no crawler has started): nothing to crawl
+            logger.debug(f"Crawl queue {self.queues[source]} not found: {e}")
+            self.channel = None
+            return 0
+        except pika.exceptions.AMQPError as e:
+            logger.warning(f"Queue depth probe failed: {e!r}")
+            self.close()
+            return None
+
+    def pump(self):
+        """Service heartbeats between scaling ticks."""
+        if self.connection is not None and self.connection.is_open:
+            try:
+                self.connection.process_data_events(time_limit=0)
+            except pika.exceptions.AMQPError:
+                self.close()
+
+    def close(self):
+        connection, self.connection, self.channel = self.connection, None, None
+        if connection is not None and connection.is_open:
+            try:
+                connection.close()
+            except pika.exceptions.AMQPError:
+                pass
+
+
+class Worker(object):
+
+    def __init__(self, source, number):
+        self.source = source
+        self.number = number
+        self.process = None
+        self.started_at = 0.0
+        self.crashes = 0
+        self.restart_at = 0.0
+        self.stopping_since = None
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process is not None else None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, cwd):
+        # CRUNCHY_WORKER gives the worker a spill queue of its own (SCHEDULER_QUEUE_KEY in settings)
+        env = dict(os.environ, CRUNCHY_CRAWL_QUEUE=self.source, CRUNCHY_WORKER=str(self.number))
+        self.process = subprocess.Popen([sys.executable, WORKER_SCRIPTS[self.source]], cwd=cwd, env=env)
+        self.started_at = time.monotonic()
+        self.stopping_since = None
+        logger.info("Started {} worker {} (pid {})", self.source, self.number, self.process.pid)
+
+    def stop(self):
+        if self.running and self.stopping_since is None:
+            self.stopping_since = time.monotonic()
+            self.process.terminate()
+
+    def kill(self):
+        if self.running:
+            self.process.kill()
+
+
+class Supervisor(object):
+    """Keeps between min and max workers per source alive and sized to the queue backlog."""
+
+    def __init__(self, probe, bounds, messages_per_worker=50, scale_interval=30, scale_down_delay=300,
+                 max_load=0.85, min_free_memory=0.15, max_rss_mb=0, restart_max_backoff=300,
+                 stable_after=60, stop_timeout=60, tick=2, cwd="."):
+        """
+        Args:
+            probe: QueueDepthProbe (anything with depth(source) -> int or None)
+            bounds: {source: (min_workers, max_workers)}
+            max_rss_mb: cap on the fleet's total RSS, 0 for no cap
+        """
+        self.probe = probe
+        self.bounds = bounds
+        self.messages_per_worker = max(1, messages_per_worker)
+        self.scale_interval = scale_interval
+        self.scale_down_delay = scale_down_delay
+        self.max_load = max_load
+        self.min_free_memory = min_free_memory
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.restart_max_backoff = restart_max_backoff
+        self.stable_after = stable_after
+        self.stop_timeout = stop_timeout
+        self.tick = tick
+        self.cwd = cwd
+        self.workers = {source: [] for source in bounds}
+        self.retiring = []
+        self.desired = {source: low for source, (low, _) in bounds.items()}
+        self._lower_since = {}
+        self._running = False
+
+    @classmethod
+    def from_settings(cls, settings, cwd="."):
+        queues = {
+            "crunchbase": settings.get("RB_CRUNCHBASE_CRAWL_QUEUE", "crawl_crunchbase_queue"),
+            "tracxn": settings.get("RB_TRACXN_CRAWL_QUEUE", "crawl_tracxn_queue"),
+        }
+        bounds = {
+            source: (int(low), max(int(low), int(high)))
+            for source, (low, high) in settings.getdict("SUPERVISOR_WORKERS", {"crunchbase": [1, 1], "tracxn": [1, 4]}).items()
+            if source in WORKER_SCRIPTS
+        }
+        for source in SINGLE_WORKER_SOURCES:
+            if bounds.get(source, (1, 1))[1] > 1:
+                logger.warning(
+                    "SUPERVISOR_WORKERS allows {} {} workers: each has its own throttle and download slot, "
+                    "so the domain gets up to {}x the single-worker request rate",
+                    bounds[source][1], source, bounds[source][1],
+                )
+        return cls(
+            QueueDepthProbe(settings.get("RABBITMQ_URL"), queues),
+            bounds,
+            messages_per_worker=settings.getint("SUPERVISOR_MESSAGES_PER_WORKER", 50),
+            scale_interval=settings.getfloat("SUPERVISOR_SCALE_INTERVAL", 30),
+            scale_down_delay=settings.getfloat("SUPERVISOR_SCALE_DOWN_DELAY", 300),
+            max_load=settings.getfloat("SUPERVISOR_MAX_LOAD", 0.85),
+            min_free_memory=settings.getfloat("SUPERVISOR_MIN_FREE_MEMORY", 0.15),
+            max_rss_mb=settings.getint("SUPERVISOR_MAX_RSS_MB", 0),
+            restart_max_backoff=settings.getfloat("SUPERVISOR_RESTART_MAX_BACKOFF", 300),
+            stable_after=settings.getfloat("SUPERVISOR_STABLE_AFTER", 60),
+            stop_timeout=settings.getfloat("SUPERVISOR_STOP_TIMEOUT", 60),
+            cwd=cwd,
+        )
+
+    def all_workers(self):
+        return [worker for workers in self.workers.values() for worker in workers] + self.retiring
+
+    def run(self):
+        self._running = True
+        signal.signal(signal.SIGINT, self._on_signal)
+        signal.signal(signal.SIGTERM, self._on_signal)
+        next_scale = 0.0
+        while self._running:
+            now = time.monotonic()
+            if now >= next_scale:
+                self.scale()
+                next_scale = now + self.scale_interval
+            self.reconcile()
+            self.probe.pump()
+            time.sleep(self.tick)
+        self.shutdown()
+
+    def _on_signal(self, signum, frame):
+        logger.info("Supervisor got signal {}, stopping workers", signum)
+        self._running = False
+
+    def headroom(self):
+        """(can_grow, must_shrink) from host load, free memory and fleet RSS."""
+        load = load_per_core()
+        free = memory_available_fraction()
+        rss = process_tree_rss([w.pid for w in self.all_workers() if w.running]) if self.max_rss else 0
+        over = load > self.max_load or free < self.min_free_memory or (self.max_rss and rss > self.max_rss)
+        # Grow only with some margin, so one new worker (and its browser) doesn't push us over
+        can_grow = (
+            load < self.max_load * 0.9
+            and free > self.min_free_memory * 1.2
+            and (not self.max_rss or rss < self.max_rss * 0.9)
+        )
+        logger.debug("Host load/core {:.2f}, memory free {:.0%}, fleet RSS {:.0f} MB", load, free, rss / 1e6)
+        return can_grow, bool(over)
+
+    def target(self, source, depth):
+        low, high = self.bounds[source]
+        return min(max(math.ceil(depth / self.messages_per_worker), low), high)
+
+    def scale(self):
+        can_grow, must_shrink = self.headroom()
+        now = time.monotonic()
+        for source, (low, high) in self.bounds.items():
+            current = self.desired[source]
+            depth = self.probe.depth(source)
+            if depth is None:
+                continue
+            wanted = self.target(source, depth)
+            if must_shrink:
+                wanted = max(current - 1, low)
+            elif wanted > current and not can_grow:
+                wanted = current
+            elif wanted < current:
+                # Only scale down once the lower target has held for scale_down_delay
+                since = self._lower_since.setdefault(source, now)
+                if now - since < self.scale_down_delay:
+                    continue
+            self._lower_since.pop(source, None)
+            if wanted != current:
+                logger.info(
+                    "Scaling {} workers {} -> {} (queue depth {}{})",
+                    source, current, wanted, depth, ", host under pressure" if must_shrink else "",
+                )
+                self.desired[source] = wanted
+
+    def reconcile(self):
+        """Restart crashed workers, start or retire workers to match the desired counts."""
+        now = time.monotonic()
+        for source, workers in self.workers.items():
+            for worker in workers:
+                if worker.process is not None and not worker.running:
+                    code = worker.process.returncode
+                    uptime = now - worker.started_at
+                    worker.crashes = 1 if uptime >= self.stable_after else worker.crashes + 1
+                    delay = exp_backoff_full_jitter(worker.crashes - 1, cap=self.restart_max_backoff, base=1)
+                    logger.warning(
+                        "{} worker {} exited with {} after {:.0f}s, restarting in {:.1f}s",
+                        source, worker.number, code, uptime, delay,
+                    )
+                    worker.process = None
+                    worker.restart_at = now + delay
+                if worker.process is None and now >= worker.restart_at:
+                    worker.start(self.cwd)
+
+            while len(workers) < self.desired[source]:
+                worker = Worker(source, self._free_number(source))
+                worker.start(self.cwd)
+                workers.append(worker)
+            while len(workers) > self.desired[source]:
+                # Newest first: the oldest workers have warm browsers and proxies
+                worker = workers.pop()
+                logger.info("Retiring {} worker {}", source, worker.number)
+                worker.stop()
+                self.retiring.append(worker)
+
+        for worker in list(self.retiring):
+            if not worker.running:
+                self.retiring.remove(worker)
+            elif worker.stopping_since is not None and now - worker.stopping_since > self.stop_timeout:
+                logger.warning("{} worker {} did not stop in {:.0f}s, killing it", worker.source, worker.number, self.stop_timeout)
+                worker.kill()
+
+    def _free_number(self, source):
+        """Lowest worker number of `source` not held by a live or still-stopping worker.
+
+        Numbers are reused so a new worker drains the spill queue a retired one left behind
+        (its follow-ups are crawled; their delivery tags settle nothing in the new worker).
+        """
+        taken = {w.number for w in self.workers[source]}
+        taken.update(w.number for w in self.retiring if w.source == source and w.running)
+        number = 1
+        while number in taken:
+            number += 1
+        return number
+
+    def shutdown(self):
+        workers = self.all_workers()
+        for worker in workers:
+            worker.stop()
+        deadline = time.monotonic() + self.stop_timeout
+        while any(worker.running for worker in workers) and time.monotonic() < deadline:
+            time.sleep(0.5)
+        for worker in workers:
+            worker.kill()
+        self.probe.close()
+        logger.info("Supervisor stopped")
@@ -0,0 +1,139 @@
+"""
+Per-domain AIMD (additive increase / multiplicative decrease) rate controller.
+
+Replaces the fixed DOWNLOAD_DELAY / AutoThrottle for Crunchbase and Tracxn.
+Each download slot (one per domain) has a request rate in requests/minute:
+
+- every clean response adds AIMD_INCREASE to the rate
+- a Cloudflare challenge, a 403/429/503 or a page slower than the target
+  latency multiplies the rate by a decrease factor
+
+The slot delay is then 60 / rate. At most one decrease is applied per
+cooldown window, so a challenge page that is also a 403 is only punished once.
+
+Per-domain overrides (matched on the slot hostname suffix), e.g.:
+
+    AIMD_DOMAIN_SETTINGS = {
+        "crunchbase.com": {"start_rate": 12, "max_rate": 20},
+        "tracxn.com": {"start_rate": 30, "max_rate": 240},
+    }
+"""
+
+import time
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from loguru import logger
+from CrunchyCrawler.signals import cloudflare_challenge
+
+# Statuses that mean "slow down" (403/503 are what Cloudflare uses for challenges)
+BACKOFF_STATUSES = (403, 429, 503)
+
+DOMAIN_KEYS = (
+    "start_rate",
+    "min_rate",
+    "max_rate",
+    "increase",
+    "decrease_factor",
+    "latency_decrease_factor",
+    "target_latency",
+)
+
+
+class AIMDThrottle:
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("AIMD_ENABLED"):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.defaults = {
+            "start_rate": settings.getfloat("AIMD_START_RATE", 12.0),
+            "min_rate": settings.getfloat("AIMD_MIN_RATE", 1.0),
+            "max_rate": settings.getfloat("AIMD_MAX_RATE", 120.0),
+            "increase": settings.getfloat("AIMD_INCREASE", 1.0),
+            "decrease_factor": settings.getfloat("AIMD_DECREASE_FACTOR", 0.5),
+            "latency_decrease_factor": settings.getfloat(
+                "AIMD_LATENCY_DECREASE_FACTOR", 0.8
+            ),
+            "target_latency": settings.getfloat("AIMD_TARGET_LATENCY", 30.0),
+        }
+        self.domain_settings = settings.getdict("AIMD_DOMAIN_SETTINGS")
+        self.cooldown = settings.getfloat("AIMD_DECREASE_COOLDOWN", 10.0)
+        self.rates = {}
+        self._last_decrease = {}
+
+        crawler.signals.connect(
+            self._response_downloaded, signal=signals.response_downloaded
+        )
+        crawler.signals.connect(self._challenge, signal=cloudflare_challenge)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _params(self, key):
+        params = dict(self.defaults)
+        for domain, overrides in self.domain_settings.items():
+            if key == domain or key.endswith("." + domain):
+                params.update({k: v for k, v in overrides.items() if k in DOMAIN_KEYS})
+                break
+        return params
+
+    def _get_slot(self, request):
+        key = request.meta.get("download_slot")
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def _rate(self, key):
+        if key not in self.rates:
+            self.rates[key] = self._params(key)["start_rate"]
+        return self.rates[key]
+
+    def _response_downloaded(self, response, request, spider):
+        key, slot = self._get_slot(request)
+        if slot is None:
+            return
+        params = self._params(key)
+        latency = request.meta.get("download_latency")
+        if response.status in BACKOFF_STATUSES:
+            self._decrease(key, slot, params["decrease_factor"], f"status_{response.status}")
+        elif latency is not None and latency > params["target_latency"]:
+            self._decrease(key, slot, params["latency_decrease_factor"], "latency")
+        else:
+            self._increase(key, slot, params)
+
+    def _challenge(self, request, response, spider):
+        key, slot = self._get_slot(request)
+        if slot is None:
+            return
+        self._decrease(key, slot, self._params(key)["decrease_factor"], "challenge")
+
+    def _increase(self, key, slot, params):
+        rate = min(self._rate(key) + params["increase"], params["max_rate"])
+        self._apply(key, slot, rate)
+        self.stats.inc_value(f"aimd/{key}/increase")
+
+    def _decrease(self, key, slot, factor, reason):
+        # Count every signal, but only cut the rate once per cooldown window
+        self.stats.inc_value(f"aimd/{key}/signal/{reason}")
+        now = time.monotonic()
+        if now - self._last_decrease.get(key, float("-inf")) < self.cooldown:
+            return
+        self._last_decrease[key] = now
+        params = self._params(key)
+        rate = max(self._rate(key) * factor, params["min_rate"])
+        logger.info(
+            "AIMD {}: {} -> rate {:.1f}/min (was {:.1f}/min)",
+            key,
+            reason,
+            rate,
+            self._rate(key),
+        )
+        self._apply(key, slot, rate)
+        self.stats.inc_value(f"aimd/{key}/decrease/{reason}")
+
+    def _apply(self, key, slot, rate):
+        self.rates[key] = rate
+        slot.delay = 60.0 / rate
+        self.stats.set_value(f"aimd/{key}/rate", round(rate, 2))
+        self.stats.set_value(f"aimd/{key}/delay", round(slot.delay, 2))
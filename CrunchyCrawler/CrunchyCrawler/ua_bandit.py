@@ -0,0 +1,123 @@
+"""
+Thompson-sampling user agent selection, per domain.
+
+Every (domain, user agent) pair is an arm of a Bernoulli bandit: a response
+that gets through is a success, a Cloudflare challenge (or a 403/429/503)
+a failure. For each request, a success rate is sampled for every agent from
+its Beta(1 + successes, 1 + challenges) posterior and the agent with the
+highest sample is sent. Agents that get challenged fade out, untried ones
+are still tried now and then, and a domain that starts flagging the current
+favourite shifts traffic away from it on its own.
+
+Cloudflare changes its mind over time, so an arm never holds more than
+`max_observations` outcomes: beyond that both counts are scaled down and
+recent outcomes weigh more.
+
+Counts are synced to UA_BANDIT_PATH (JSON) every UA_BANDIT_SYNC_INTERVAL
+seconds and on close. Like the dupefilter snapshot, a sync locks the file,
+adds this process's outcomes since the last sync to the file's counts and
+writes the result back, so the CB and Tracxn crawlers can share one file.
+"""
+
+import fcntl
+import json
+import os
+import random
+import tempfile
+from urllib.parse import urlparse
+
+# Statuses counted as a challenge (what Cloudflare answers blocked clients with)
+CHALLENGE_STATUSES = (403, 429, 503)
+
+
+def domain_of(url):
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class UABandit(object):
+    """Per-domain Beta-Bernoulli arms over a fixed list of user agents."""
+
+    def __init__(self, agents, max_observations=500, rng=None):
+        self.agents = list(agents)
+        self._known = set(self.agents)
+        self.max_observations = max_observations
+        self.rng = rng or random.Random()
+        # {domain: {agent: [successes, challenges]}}: as of the last sync, and recorded since
+        self.counts = {}
+        self.pending = {}
+
+    def _arm(self, domain, agent):
+        synced = self.counts.get(domain, {}).get(agent, (0.0, 0.0))
+        recent = self.pending.get(domain, {}).get(agent, (0.0, 0.0))
+        return synced[0] + recent[0], synced[1] + recent[1]
+
+    def choose(self, domain):
+        """The agent with the highest sampled success rate for `domain`."""
+        best, best_sample = None, -1.0
+        for agent in self.agents:
+            successes, challenges = self._arm(domain, agent)
+            sample = self.rng.betavariate(1.0 + successes, 1.0 + challenges)
+            if sample > best_sample:
+                best, best_sample = agent, sample
+        return best
+
+    def record(self, domain, agent, success):
+        if agent not in self._known:
+            # Set by something else (e.g. a clearance's pinned agent)
+            return
+        arm = self.pending.setdefault(domain, {}).setdefault(agent, [0.0, 0.0])
+        arm[0 if success else 1] += 1
+        self._cap(domain, agent)
+
+    def _cap(self, domain, agent):
+        synced = self.counts.get(domain, {}).get(agent)
+        recent = self.pending[domain][agent]
+        total = sum(recent) + (sum(synced) if synced else 0.0)
+        if total <= self.max_observations:
+            return
+        scale = self.max_observations / total
+        recent[0] *= scale
+        recent[1] *= scale
+        if synced:
+            synced[0] *= scale
+            synced[1] *= scale
+
+    def success_rate(self, domain, agent):
+        """Posterior mean success rate."""
+        successes, challenges = self._arm(domain, agent)
+        return (1.0 + successes) / (2.0 + successes + challenges)
+
+    def merge(self, counts):
+        """Add this process's pending outcomes to `counts` (a snapshot) and adopt the result."""
+        for domain, arms in self.pending.items():
+            merged = counts.setdefault(domain, {})
+            for agent, (successes, challenges) in arms.items():
+                arm = merged.setdefault(agent, [0.0, 0.0])
+                arm[0] += successes
+                arm[1] += challenges
+                total = arm[0] + arm[1]
+                if total > self.max_observations:
+                    arm[0] *= self.max_observations / total
+                    arm[1] *= self.max_observations / total
+        self.counts = counts
+        self.pending = {}
+
+    def sync(self, path):
+        """Merge with the snapshot at `path` and write it back, under an exclusive lock."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                counts = {}
+                if os.path.exists(path):
+                    with open(path, encoding="utf-8") as f:
+                        counts = json.load(f)
+                self.merge(counts)
+                fd, tmp = tempfile.mkstemp(dir=directory, prefix=".ua-bandit-")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(self.counts, f)
+                os.replace(tmp, path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,90 @@
+"""
+Benchmark Cloudflare challenge detection on archived pages.
+
+Compares detect_challenge (precompiled marker and title patterns over the
+first CHALLENGE_SCAN_BYTES of the raw body, plus the cf-mitigated header) with the
+previous is_cloudflare_challenge, kept below as `legacy_is_challenge`: decode
+the whole body, search each marker in turn, then build a Selector for the
+title.
+
+Pages come from raw_scraped_dumps (written with DUMP_RAW_SCRAPED_DATA=true);
+challenge pages dumped by hand (e.g. saved from a blocked crawl) can be put in
+the same directory as {"url": ..., "html": ...}. Both detectors must agree on
+every page; disagreements are listed.
+
+Run from CrunchyCrawler project root (parent of CrunchyCrawler/):
+
+  PYTHONPATH=. python CrunchyCrawler/utility/bench_challenge_detector.py [dump_dir] [rounds]
+"""
+
+import glob
+import json
+import os
+import sys
+import time
+
+from scrapy.http import HtmlResponse
+from scrapy.selector import Selector
+
+from CrunchyCrawler.cloudflare.handler import (
+    CLOUDFLARE_MARKERS,
+    CLOUDFLARE_TITLE_MARKERS,
+    detect_challenge,
+)
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+DUMP_DIR = os.path.join(_script_dir, "..", "..", "raw_scraped_dumps")
+
+
+def legacy_is_challenge(response):
+    """is_cloudflare_challenge before the fast path (without its logging)."""
+    body = response.text if hasattr(response, "text") else response.body.decode("utf-8", errors="ignore")
+    for marker in CLOUDFLARE_MARKERS:
+        if marker in body:
+            return True
+    title = Selector(response).xpath("//title/text()").get() or ""
+    return any(marker.lower() in title.lower() for marker in CLOUDFLARE_TITLE_MARKERS)
+
+
+def load_pages(dump_dir):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(dump_dir, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("html"):
+            pages.append((os.path.basename(path), data.get("url") or "https://example.com/", data["html"].encode("utf-8")))
+    return pages
+
+
+def responses(pages):
+    # A fresh response per call: Scrapy caches the decoded text and the Selector on it
+    return [HtmlResponse(url, body=body, encoding="utf-8") for _, url, body in pages]
+
+
+def bench(detector, pages, rounds):
+    total = 0.0
+    verdicts = None
+    for _ in range(rounds):
+        batch = responses(pages)
+        start = time.perf_counter()
+        verdicts = [bool(detector(response)) for response in batch]
+        total += time.perf_counter() - start
+    return verdicts, total / rounds * 1e6 / len(pages)
+
+
+if __name__ == "__main__":
+    dump_dir = sys.argv[1] if len(sys.argv) > 1 else DUMP_DIR
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    pages = load_pages(dump_dir)
+    if not pages:
+        sys.exit(f"No dumps in {dump_dir}. Crawl with DUMP_RAW_SCRAPED_DATA=true first.")
+
+    sizes = sorted(len(body) for _, _, body in pages)
+    print(f"{len(pages)} pages from {dump_dir}: median {sizes[len(sizes) // 2]} B, max {sizes[-1]} B")
+    legacy, legacy_us = bench(legacy_is_challenge, pages, rounds)
+    fast, fast_us = bench(detect_challenge, pages, rounds)
+    print(f"legacy  {legacy_us:9.1f} us/page   challenges {sum(legacy)}")
+    print(f"fast    {fast_us:9.1f} us/page   challenges {sum(fast)}   ({legacy_us / fast_us:.0f}x)")
+    for (name, _, _), old, new in zip(pages, legacy, fast):
+        if old != new:
+            print(f"  disagree: {name} legacy={old} fast={new}")
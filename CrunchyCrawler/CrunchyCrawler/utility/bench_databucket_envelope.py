@@ -0,0 +1,91 @@
+"""
+Benchmark the databucket envelope: broker bytes and consumer decode time.
+
+Loads real items from raw_scraped_dumps (written with
+DUMP_RAW_SCRAPED_DATA=true): Tracxn dumps carry the parsed item, while
+Crunchbase dumps are parsed again with CrunchbaseDataParser. Each item is
+encoded as DatabucketPipeline would for every compression (none, gzip, and
+zstd if zstandard is installed) and decoded as the CrunchyRest consumer
+does (decompress + json.loads).
+
+"bytes" is what the broker receives and persists (the sum of the bodies).
+"uncompressed" counts the items sent as plain JSON (below the threshold).
+
+Run from CrunchyCrawler project root (parent of CrunchyCrawler/):
+
+  PYTHONPATH=. python CrunchyCrawler/utility/bench_databucket_envelope.py [dump_dir] [min_bytes]
+"""
+
+import glob
+import json
+import os
+import sys
+import time
+
+from scrapy.selector import Selector
+
+from CrunchyCrawler.parser.CrunchbaseDataParser import CrunchbaseDataParser
+from CrunchyCrawler.rabbitmq.envelope import decode_envelope, encode_envelope, zstandard
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+DUMP_DIR = os.path.join(_script_dir, "..", "..", "raw_scraped_dumps")
+
+# Same keys DatabucketPipeline leaves out
+SKIP_KEYS = ("_response", "delivery_tag", "queue")
+
+
+def load_items(dump_dir):
+    items = []
+    for path in sorted(glob.glob(os.path.join(dump_dir, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("parsed_item"):
+            item = dict(data["parsed_item"])
+        elif data.get("source") == "crunchbase" and data.get("html"):
+            item = dict(CrunchbaseDataParser.extract_item(Selector(text=data["html"])) or {})
+            item.setdefault("source", "crunchbase")
+            item.setdefault("crunchbase_url", data.get("url"))
+        else:
+            continue
+        items.append(json.dumps({k: v for k, v in item.items() if k not in SKIP_KEYS}, default=str))
+    return items
+
+
+def bench(name, payloads, min_size, rounds=5):
+    encoded = [encode_envelope(payload, name, min_size) for payload in payloads]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for payload in payloads:
+            encode_envelope(payload, name, min_size)
+    encode_s = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for body, properties in encoded:
+            json.loads(decode_envelope(body, properties.content_encoding, properties.headers))
+    decode_s = (time.perf_counter() - start) / rounds
+
+    total = sum(len(body) for body, _ in encoded)
+    small = sum(1 for _, properties in encoded if properties.content_encoding is None)
+    us = 1e6 / len(payloads)
+    return total, small, encode_s * us, decode_s * us
+
+
+if __name__ == "__main__":
+    dump_dir = sys.argv[1] if len(sys.argv) > 1 else DUMP_DIR
+    min_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    payloads = load_items(dump_dir)
+    if not payloads:
+        sys.exit(f"No dumps in {dump_dir}. Crawl with DUMP_RAW_SCRAPED_DATA=true first.")
+
+    sizes = sorted(len(payload.encode("utf-8")) for payload in payloads)
+    print(f"{len(payloads)} items from {dump_dir}: median {sizes[len(sizes) // 2]} B, max {sizes[-1]} B")
+    baseline = None
+    for name in ("none", "gzip", "zstd"):
+        if name == "zstd" and zstandard is None:
+            print("zstd: skipped (zstandard not installed)")
+            continue
+        total, small, encode_us, decode_us = bench(name, payloads, min_size)
+        baseline = baseline or total
+        print(f"{name}:")
+        print(f"  bytes   {total:9d} B  ({total / baseline:.0%})   uncompressed {small}/{len(payloads)}")
+        print(f"  encode  {encode_us:7.1f} us/item   decode {decode_us:7.1f} us/item")
@@ -0,0 +1,84 @@
+"""
+Benchmark the spider queue request codec against the old pickle path.
+
+Compares message size and encode/decode time for a Crunchbase request (the
+one with the inline "Read more" JS), a Tracxn request and a similar-companies
+follow-up carrying a previousResult item.
+
+Run from CrunchyCrawler project root (parent of CrunchyCrawler/):
+
+  PYTHONPATH=. python CrunchyCrawler/utility/bench_request_codec.py [iterations]
+"""
+
+import pickle
+import sys
+import timeit
+
+from scrapy import Spider
+from scrapy.utils.request import request_from_dict
+
+from CrunchyCrawler.request import generateRequest
+from CrunchyCrawler.rabbitmq.codec import encode_request, decode_request
+
+
+class BenchSpider(Spider):
+    name = "bench"
+
+    def parseSimilarCompanies(self, response):
+        pass
+
+
+def sample_requests(spider):
+    item = {
+        "name": "Hofy",
+        "website": "https://hofy.co",
+        "industries": ["Human Resources", "SaaS", "Logistics"],
+        "description": "Hofy lets companies equip remote employees. " * 4,
+        "long_description": "Long description text. " * 60,
+        "source": "crunchbase",
+        "crunchbase_url": "https://www.crunchbase.com/organization/hofy",
+    }
+    return {
+        "crunchbase": generateRequest(
+            "https://www.crunchbase.com/organization/hofy", 17,
+            queue="crunchbase", entry_point="crunchbase",
+        ),
+        "tracxn": generateRequest(
+            "https://tracxn.com/d/companies/hofy/__abc123", 18,
+            queue="tracxn", entry_point="tracxn",
+        ),
+        "similar_followup": generateRequest(
+            "https://www.crunchbase.com/organization/hofy/similarity", 17,
+            queue="crunchbase", callback=spider.parseSimilarCompanies,
+            previousResult=item,
+        ),
+    }
+
+
+def pickle_encode(request, spider):
+    return pickle.dumps(request.to_dict(spider=spider))
+
+
+def pickle_decode(data, spider):
+    return request_from_dict(pickle.loads(data), spider=spider)
+
+
+def bench(name, request, spider, iterations):
+    old = pickle_encode(request, spider)
+    new = encode_request(request, spider)
+    t_old_enc = timeit.timeit(lambda: pickle_encode(request, spider), number=iterations)
+    t_new_enc = timeit.timeit(lambda: encode_request(request, spider), number=iterations)
+    t_old_dec = timeit.timeit(lambda: pickle_decode(old, spider), number=iterations)
+    t_new_dec = timeit.timeit(lambda: decode_request(new, spider), number=iterations)
+    us = 1e6 / iterations
+    print(f"{name}:")
+    print(f"  size    pickle {len(old):6d} B   codec {len(new):6d} B   ({len(new) / len(old):.0%})")
+    print(f"  encode  pickle {t_old_enc * us:6.1f} us  codec {t_new_enc * us:6.1f} us")
+    print(f"  decode  pickle {t_old_dec * us:6.1f} us  codec {t_new_dec * us:6.1f} us")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    spider = BenchSpider()
+    for name, request in sample_requests(spider).items():
+        bench(name, request, spider, iterations)
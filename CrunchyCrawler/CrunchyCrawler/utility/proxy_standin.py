@@ -0,0 +1,100 @@
+"""
+Local stand-in proxies for trying the proxy pool (CrunchyCrawler/proxy_pool.py).
+
+Runs one HTTP proxy per port, each with a behaviour:
+
+  ok     forwards requests (plain HTTP and CONNECT tunnels)
+  slow   forwards after a delay (--delay seconds)
+  block  answers every request with 403, like a banned IP
+  down   is not started: connections are refused
+
+The default matches proxy-list.txt, so a crawl with
+PROXY_POOL_LIST_PATH=CrunchyCrawler/proxy-list.txt should end with 9990 and
+9991 good (9990 getting more traffic), 9992 and 9993 dead:
+
+  python CrunchyCrawler/utility/proxy_standin.py [9990:ok 9991:slow 9992:block 9993:down] [--delay 2]
+"""
+
+import argparse
+import asyncio
+from urllib.parse import urlsplit
+
+DEFAULT_PROXIES = ["9990:ok", "9991:slow", "9992:block", "9993:down"]
+
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _read_head(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    method, target, version = request_line.split(" ", 2)
+    return method, target, version, [h for h in header_lines if h]
+
+
+def handler(mode, delay):
+    async def handle(reader, writer):
+        try:
+            method, target, version, headers = await _read_head(reader)
+        except (asyncio.IncompleteReadError, ValueError):
+            writer.close()
+            return
+        if mode == "block":
+            writer.write(b"HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            writer.close()
+            return
+        if mode == "slow":
+            await asyncio.sleep(delay)
+        if method == "CONNECT":
+            host, _, port = target.rpartition(":")
+            upstream_reader, upstream_writer = await asyncio.open_connection(host, int(port))
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+            await writer.drain()
+        else:
+            url = urlsplit(target)
+            upstream_reader, upstream_writer = await asyncio.open_connection(url.hostname, url.port or 80)
+            path = url.path or "/"
+            if url.query:
+                path += "?" + url.query
+            kept = [h for h in headers if not h.lower().startswith(("proxy-", "connection:"))]
+            head = "\r\n".join([f"{method} {path} {version}", *kept, "Connection: close", "", ""])
+            upstream_writer.write(head.encode("latin-1"))
+        await asyncio.gather(_pipe(reader, upstream_writer), _pipe(upstream_reader, writer))
+
+    return handle
+
+
+async def main(specs, delay):
+    servers = []
+    for spec in specs:
+        port, _, mode = spec.partition(":")
+        mode = mode or "ok"
+        if mode == "down":
+            print(f"127.0.0.1:{port} down")
+            continue
+        servers.append(await asyncio.start_server(handler(mode, delay), "127.0.0.1", int(port)))
+        print(f"127.0.0.1:{port} {mode}")
+    await asyncio.gather(*(server.serve_forever() for server in servers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("proxies", nargs="*", default=DEFAULT_PROXIES, help="port:mode (ok, slow, block, down)")
+    parser.add_argument("--delay", type=float, default=2.0, help="delay of the slow proxies (seconds)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.proxies, args.delay))
+    except KeyboardInterrupt:
+        pass
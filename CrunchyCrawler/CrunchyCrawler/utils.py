@@ -3,6 +3,7 @@ try:
     from urllib2 import _parse_proxy
 except ImportError:
     from urllib.request import _parse_proxy
+from urllib.parse import urlsplit
 
 
 def extract_proxy_hostport(proxy):
@@ -25,3 +26,34 @@ def extract_proxy_hostport(proxy):
     'baz:1234'
     """
     return _parse_proxy(proxy)[3]
+
+
+def canonical_company_url(url):
+    """
+    Return the canonical form of a company URL, used as the dedupe key.
+
+    Lowercases the host, drops "www.", query, fragment, trailing slash and
+    sub-pages of a company profile:
+
+    >>> canonical_company_url('https://www.crunchbase.com/organization/Hofy/?utm=x')
+    'https://crunchbase.com/organization/hofy'
+    >>> canonical_company_url('https://crunchbase.com/organization/hofy/people')
+    'https://crunchbase.com/organization/hofy'
+    >>> canonical_company_url('https://tracxn.com/d/companies/hofy/__AbC12/funding-and-investors#x')
+    'https://tracxn.com/d/companies/hofy/__AbC12'
+    >>> canonical_company_url('http://Example.com/a/')
+    'https://example.com/a'
+    """
+    parts = urlsplit((url or "").strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/")
+    segments = path.split("/")
+    if host.endswith("crunchbase.com") and len(segments) > 2 and segments[1] == "organization":
+        # Crunchbase slugs are case-insensitive
+        path = "/organization/" + segments[2].lower()
+    elif host.endswith("tracxn.com") and len(segments) > 4 and segments[1:3] == ["d", "companies"]:
+        # /d/companies/<slug>/__<id>; the id is case-sensitive
+        path = "/".join(segments[:5])
+    return "https://" + host + path
@@ -0,0 +1,11 @@
+"""Run a supervised crawler fleet: Crunchbase and Tracxn workers, restarted on crash and scaled on queue depth.
+
+Worker bounds and scaling thresholds are the SUPERVISOR_* settings. Ctrl+C / SIGTERM stops every worker gracefully.
+"""
+import os
+
+from scrapy.utils.project import get_project_settings
+from CrunchyCrawler.supervisor import Supervisor
+
+supervisor = Supervisor.from_settings(get_project_settings(), cwd=os.path.dirname(os.path.abspath(__file__)))
+supervisor.run()
@@ -0,0 +1,47 @@
+from CrunchyCrawler.bloom import ScalableBloomFilter
+import os
+import tempfile
+import unittest
+
+
+def false_positive_rate(bf, probes=20000):
+    return sum(f"absent-{i}" in bf for i in range(probes)) / probes
+
+
+class TestScalableBloomFilter(unittest.TestCase):
+    def test_add_and_contains(self):
+        bf = ScalableBloomFilter(100, 0.01)
+        self.assertFalse(bf.add("a"))
+        self.assertTrue(bf.add("a"))
+        self.assertIn("a", bf)
+        self.assertEqual(len(bf), 1)
+
+    def test_snapshot_roundtrip(self):
+        bf = ScalableBloomFilter(100, 0.01)
+        for i in range(250):
+            bf.add(f"url-{i}")
+        copy = ScalableBloomFilter.loads(bf.dumps())
+        self.assertEqual(len(copy), len(bf))
+        self.assertTrue(all(f"url-{i}" in copy for i in range(250)))
+
+    def test_shared_snapshot_keeps_error_rate(self):
+        # Two processes adding different URLs (2% of a slice between syncs) and syncing through one file
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "companies.bloom")
+            filters = [ScalableBloomFilter(1000, 0.01), ScalableBloomFilter(1000, 0.01)]
+            for round_ in range(180):
+                for n, bf in enumerate(filters):
+                    for i in range(20):
+                        bf.add(f"p{n}-r{round_}-{i}")
+                    bf.sync(path)
+            merged = filters[1]
+            # 7200 adds, less the few that were already false positives
+            self.assertGreater(len(merged), 7000)
+            self.assertGreater(len(merged.slices), 3)
+            self.assertTrue(all(f"p0-r{r}-{i}" in merged for r in range(180) for i in range(20)))
+            # About what one filter holding all 7200 gets (~1%); counting the union as max() gave ~19%
+            self.assertLess(false_positive_rate(merged), 0.015)
+
+
+if __name__ == '__main__':
+    unittest.main()
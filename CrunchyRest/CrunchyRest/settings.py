@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 from decouple import config as DefaultConfig
@@ -174,6 +175,9 @@ RB_CRUNCHBASE_CRAWL_QUEUE = config('RB_CRUNCHBASE_CRAWL_QUEUE', cast=str, defaul
 RB_CRUNCHBASE_CRAWL_RK = config('RB_CRUNCHBASE_CRAWL_RK', cast=str, default='crawl_crunchbase')
 RB_TRACXN_CRAWL_QUEUE = config('RB_TRACXN_CRAWL_QUEUE', cast=str, default='crawl_tracxn_queue')
 RB_TRACXN_CRAWL_RK = config('RB_TRACXN_CRAWL_RK', cast=str, default='crawl_tracxn')
+# Crawl queues are priority queues (x-max-priority); must match the crawler. Changing it
+# requires re-creating the queues: python manage.py migrate_crawl_queues_priority
+RB_CRAWL_MAX_PRIORITY = config('RB_CRAWL_MAX_PRIORITY', cast=int, default=10)
 
 # Databucket queues (scraped items from crawler, consumed by Django)
 RB_DATABUCKET_EXCHANGE = config(
@@ -192,6 +196,16 @@ RB_DATABUCKET_TRACXN_RK = config(
     'RB_DATABUCKET_TRACXN_RK', cast=str, default='tracxn_databucket'
 )
 
+# Recrawl planner (python manage.py plan_recrawl): every RECRAWL_INTERVAL seconds, enqueue the pages
+# most likely to be stale, at most RECRAWL_BUDGET[source] per cycle, RECRAWL_RATE messages per second.
+# A page is recrawled at most every RECRAWL_MIN_AGE_DAYS days; a source with RECRAWL_MAX_QUEUE_DEPTH
+# messages already in its crawl queue is skipped for the cycle.
+RECRAWL_INTERVAL = config('RECRAWL_INTERVAL', cast=int, default=3600)
+RECRAWL_BUDGET = config('RECRAWL_BUDGET', cast=json.loads, default='{"crunchbase": 200, "tracxn": 200}')
+RECRAWL_RATE = config('RECRAWL_RATE', cast=float, default=0.5)
+RECRAWL_MIN_AGE_DAYS = config('RECRAWL_MIN_AGE_DAYS', cast=float, default=7)
+RECRAWL_MAX_QUEUE_DEPTH = config('RECRAWL_MAX_QUEUE_DEPTH', cast=int, default=500)
+
 NEO4J_RESOURCE_URI = config('NEO4J_RESOURCE_URI', cast=str)
 NEO4J_USERNAME = config('NEO4J_USERNAME', cast=str)
 NEO4J_PASSWORD = config('NEO4J_PASSWORD', cast=str)
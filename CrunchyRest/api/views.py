@@ -31,7 +31,9 @@ def createCrawl(request):
             )
         for url in urls:
             entry_point = "crunchbase" if is_crunchbase_url(url) else "tracxn"
-            message = {"url": url, "entry_point": entry_point}
+            # Someone is waiting on this one: jump the discovery backlog, and recrawl
+            # even if the crawler's dupefilter has seen the company before
+            message = {"url": url, "entry_point": entry_point, "lane": "interactive", "dont_filter": True}
             if entry_point == "crunchbase":
                 RabbitMQManager.publish_crunchbase_crawl(message)
             else:
@@ -16,7 +16,11 @@ from rabbitmq.apps import RabbitMQManager
 from rabbitmq.databucket_consumer import run_consumer
 from databucket.models import Crunchbase, TracxnRaw
 from databucket.discovery import discover_tracxn_url
-from databucket.similar_companies import publish_similar_companies_if_interested
+from databucket.recrawl import record_observation
+from databucket.similar_companies import (
+    industries_match_interested,
+    publish_similar_companies_if_interested,
+)
 from utils.domain import normalize_domain
 import regex as re
 from utils.Currency import CurrencyConverter
@@ -145,6 +149,7 @@ class Command(BaseCommand):
                 crunchbase_url=crunchbase_url, defaults=defaults
             )
             print("Created:", crunchbase, created, data)
+            record_observation("crunchbase", crunchbase_url, data)
 
             # Log merge lookup: when Crunchbase data is received, how many CB vs Tracxn records share this normalized_domain (for merge debugging)
             if normalized:
@@ -181,7 +186,12 @@ class Command(BaseCommand):
                 if tracxn_url:
                     print(f"Discovered Tracxn URL, pushing to queue: {tracxn_url}")
                     RabbitMQManager.publish_tracxn_crawl(
-                        {"url": tracxn_url, "entry_point": "crunchbase"}
+                        {
+                            "url": tracxn_url,
+                            "entry_point": "crunchbase",
+                            "lane": "discovered",
+                            "interested": industries_match_interested(industries),
+                        }
                     )
 
             return True
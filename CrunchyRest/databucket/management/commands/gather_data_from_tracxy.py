@@ -19,6 +19,7 @@ from rabbitmq.apps import RabbitMQManager
 from rabbitmq.databucket_consumer import run_consumer
 from databucket.models import Crunchbase, TracxnRaw
 from databucket.discovery import discover_crunchbase_url
+from databucket.recrawl import record_observation
 from databucket.similar_companies import publish_similar_companies_if_interested
 from utils.domain import normalize_domain
 from utils.Currency import CurrencyConverter
@@ -143,6 +144,8 @@ class Command(BaseCommand):
             # print entire data in json format
             print(json.dumps(data, indent=4))
 
+            record_observation("tracxn", tracxn_url, data)
+
             action = "Created" if created else "Updated"
             print(f"{action}: {tracxn_record.name} ({tracxn_url})")
             print(f"  - Funding: {funding_total} -> ${funding_total_usd:,.0f} USD")
@@ -206,7 +209,9 @@ class Command(BaseCommand):
                 if crunchbase_url:
                     crunchbase_url = crunchbase_url.strip().rstrip('/')
                     print(f"  - Discovered Crunchbase URL, pushing to queue: {crunchbase_url}")
-                    RabbitMQManager.publish_crunchbase_crawl({"url": crunchbase_url, "entry_point": "tracxn"})
+                    RabbitMQManager.publish_crunchbase_crawl(
+                        {"url": crunchbase_url, "entry_point": "tracxn", "lane": "discovered"}
+                    )
 
             # Push competitor/alternate URLs only when merged Crunchbase row has industries in interested list
             if not normalized:
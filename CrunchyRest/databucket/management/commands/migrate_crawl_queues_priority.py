@@ -0,0 +1,167 @@
+"""
+Re-create the crawl queues as priority queues (x-max-priority = RB_CRAWL_MAX_PRIORITY).
+
+RabbitMQ cannot add x-max-priority to an existing queue: declaring it with
+different arguments fails with PRECONDITION_FAILED. For each crawl queue that
+is not yet a priority queue this command:
+
+  1. moves every message to a durable holding queue "<queue>.priority-migration"
+     and binds it to the crawl exchange with the queue's routing key
+  2. deletes the queue, re-declares/binds it with x-max-priority and unbinds
+     the holding queue
+  3. republishes the held messages with a priority derived from their lane
+
+While the queue is gone, messages routed to it (e.g. crawl retries expiring
+out of the <queue>.retry.<n>s tiers) land in the holding queue instead of
+being dropped. If it is interrupted, run it again: messages left in a
+holding queue are republished first. Stop the crawlers and consumers that
+publish to the crawl queues while it runs.
+
+Usage:
+  python manage.py migrate_crawl_queues_priority [--dry-run]
+"""
+import json
+from django.core.management import BaseCommand
+from django.conf import settings
+import pika
+from rabbitmq.manager import (
+    crawl_exchange,
+    crawl_crunchbase_queue,
+    crawl_crunchbase_rk,
+    crawl_tracxn_queue,
+    crawl_tracxn_rk,
+    crawl_max_priority,
+    crawl_queue_arguments,
+)
+from utils.crawl_priority import message_priority
+
+PRECONDITION_FAILED = 406
+NOT_FOUND = 404
+
+
+def holding_queue_name(queue_name):
+    return f"{queue_name}.priority-migration"
+
+
+def body_priority(body):
+    """Priority for a raw crawl queue body (JSON message or plain URL)."""
+    try:
+        message = json.loads(body)
+    except (TypeError, ValueError):
+        message = None
+    return min(message_priority(message), crawl_max_priority)
+
+
+class Command(BaseCommand):
+    help = "Re-create the crawl queues with x-max-priority, keeping their messages"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report which queues need migrating and how many messages they hold",
+        )
+
+    def handle(self, *args, **options):
+        connection_string = getattr(settings, "RABBITMQ_URL", None)
+        if not connection_string:
+            print("RABBITMQ_URL not set")
+            return
+        conn = pika.BlockingConnection(pika.URLParameters(connection_string))
+        try:
+            for queue_name, routing_key in (
+                (crawl_crunchbase_queue, crawl_crunchbase_rk),
+                (crawl_tracxn_queue, crawl_tracxn_rk),
+            ):
+                self._migrate(conn, queue_name, routing_key, options["dry_run"])
+        finally:
+            conn.close()
+
+    def _is_priority_queue(self, conn, queue_name):
+        """Declare with the priority arguments on a throwaway channel; 406 = old queue."""
+        channel = conn.channel()
+        try:
+            channel.queue_declare(
+                queue=queue_name, durable=True, arguments=crawl_queue_arguments
+            )
+        except pika.exceptions.ChannelClosedByBroker as e:
+            if e.reply_code != PRECONDITION_FAILED:
+                raise
+            return False
+        channel.close()
+        return True
+
+    def _held_count(self, conn, holding):
+        """Messages in an existing holding queue, without creating it (passive declare; 404 = none)."""
+        channel = conn.channel()
+        try:
+            held = channel.queue_declare(queue=holding, passive=True).method.message_count
+        except pika.exceptions.ChannelClosedByBroker as e:
+            if e.reply_code != NOT_FOUND:
+                raise
+            return 0
+        channel.close()
+        return held
+
+    def _move(self, channel, source, exchange, routing_key, reprioritize=False):
+        moved = 0
+        while True:
+            method_frame, properties, body = channel.basic_get(queue=source)
+            if body is None:
+                return moved
+            properties = pika.BasicProperties(
+                delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
+                content_type=properties.content_type or "application/json",
+                timestamp=properties.timestamp,
+                headers=properties.headers,
+                priority=body_priority(body) if reprioritize else properties.priority,
+            )
+            channel.basic_publish(
+                exchange=exchange, routing_key=routing_key, body=body, properties=properties
+            )
+            channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+            moved += 1
+            if moved % 1000 == 0:
+                print(f"  Moved {moved} from {source}")
+
+    def _migrate(self, conn, queue_name, routing_key, dry_run):
+        holding = holding_queue_name(queue_name)
+        channel = conn.channel()
+        channel.confirm_delivery()
+        if dry_run:
+            held = self._held_count(conn, holding)
+        else:
+            held = channel.queue_declare(queue=holding, durable=True).method.message_count
+
+        if self._is_priority_queue(conn, queue_name):
+            if not held:
+                if not dry_run:
+                    channel.queue_delete(queue=holding)
+                print(f"{queue_name}: already a priority queue")
+                return
+            print(f"{queue_name}: resuming, {held} message(s) in {holding}")
+        else:
+            pending = channel.queue_declare(queue=queue_name, passive=True).method.message_count
+            print(f"{queue_name}: not a priority queue, {pending} message(s)")
+            if dry_run:
+                return
+            moved = self._move(channel, queue_name, "", holding)
+            # Catch what is routed to the queue while it is re-created (retry tiers dead-letter to it),
+            # then move what arrived meanwhile (a message routed in between may end up held twice)
+            channel.queue_bind(queue=holding, exchange=crawl_exchange, routing_key=routing_key)
+            moved += self._move(channel, queue_name, "", holding)
+            print(f"  Moved {moved} message(s) to {holding}")
+            channel.queue_delete(queue=queue_name)
+            channel.queue_declare(
+                queue=queue_name, durable=True, arguments=crawl_queue_arguments
+            )
+            channel.queue_bind(queue=queue_name, exchange=crawl_exchange, routing_key=routing_key)
+
+        if dry_run:
+            return
+        # Also when resuming: republishing through the exchange must not route back into the holding queue
+        channel.queue_unbind(queue=holding, exchange=crawl_exchange, routing_key=routing_key)
+        restored = self._move(channel, holding, crawl_exchange, routing_key, reprioritize=True)
+        channel.queue_delete(queue=holding)
+        channel.close()
+        print(f"  Republished {restored} message(s) to {queue_name} (x-max-priority={crawl_max_priority})")
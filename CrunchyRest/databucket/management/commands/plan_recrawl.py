@@ -0,0 +1,157 @@
+"""
+Staleness-driven recrawl planner.
+
+Every cycle, scores each Crunchbase and TracxnRaw row by how likely its page
+changed since it was last crawled (age since updated_at or the last recrawl
+sent, change rate observed by the databucket consumers, see
+utils.staleness) and its weight (companies in an interested industry weigh
+more; a Tracxn row takes the interest of the Crunchbase row with the same
+domain). The highest-value pages, up to RECRAWL_BUDGET[source] per cycle,
+are published to the crawl queues in the "refresh" lane, at a steady
+RECRAWL_RATE messages per second shared by both sources.
+
+A page is not recrawled more often than every RECRAWL_MIN_AGE_DAYS days, and
+a source whose crawl queue already holds RECRAWL_MAX_QUEUE_DEPTH messages
+gets nothing this cycle: refreshes only fill idle browser capacity.
+
+Usage:
+    python manage.py plan_recrawl [--once] [--dry-run] [--budget-crunchbase N] [--budget-tracxn N]
+"""
+
+import itertools
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from databucket.models import Crunchbase, InterestedIndustries, RecrawlState, TracxnRaw
+from databucket.recrawl import mark_enqueued
+from databucket.similar_companies import industries_match_interested
+from rabbitmq.apps import RabbitMQManager
+from utils.staleness import DAY, recrawl_score, select_stale
+
+
+def _url(value):
+    return (value or "").strip().rstrip("/")
+
+
+class Command(BaseCommand):
+    help = "Enqueue recrawls of the company pages most likely to be stale, within a per-source budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run one cycle and exit")
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Print the pages a cycle would enqueue; publish nothing"
+        )
+        parser.add_argument("--budget-crunchbase", type=int, default=None, help="Crunchbase pages per cycle")
+        parser.add_argument("--budget-tracxn", type=int, default=None, help="Tracxn pages per cycle")
+
+    def handle(self, *args, **options):
+        budget = dict(getattr(settings, "RECRAWL_BUDGET", {"crunchbase": 200, "tracxn": 200}))
+        if options["budget_crunchbase"] is not None:
+            budget["crunchbase"] = options["budget_crunchbase"]
+        if options["budget_tracxn"] is not None:
+            budget["tracxn"] = options["budget_tracxn"]
+        interval = getattr(settings, "RECRAWL_INTERVAL", 3600)
+        dry_run = options["dry_run"]
+        while True:
+            started = time.monotonic()
+            if not dry_run:
+                # A fresh connection per cycle: the blocking one does not survive an idle hour
+                RabbitMQManager.connect_to_rabbitmq()
+            self.cycle(budget, dry_run)
+            if options["once"] or dry_run:
+                return
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def cycle(self, budget, dry_run=False):
+        now = timezone.now()
+        min_age = getattr(settings, "RECRAWL_MIN_AGE_DAYS", 7) * DAY
+        states = {(s.source, s.url): s for s in RecrawlState.objects.all()}
+        interested = InterestedIndustries.get_interested_industries()
+
+        crunchbase, interested_domains = [], set()
+        for row in Crunchbase.objects.all():
+            is_interested = bool(interested) and industries_match_interested(row.industries, interested)
+            if is_interested and row.normalized_domain:
+                interested_domains.add(row.normalized_domain)
+            crunchbase.append((_url(row.crunchbase_url), row, is_interested))
+        tracxn = [
+            (_url(row.tracxn_url), row, row.normalized_domain in interested_domains)
+            for row in TracxnRaw.objects.all()
+        ]
+
+        picked = {}
+        for source, rows in (("crunchbase", crunchbase), ("tracxn", tracxn)):
+            limit = self._source_budget(source, budget.get(source, 0))
+            candidates = (
+                self._candidate(url, row, is_interested, states.get((source, url)), now)
+                for url, row, is_interested in rows if url
+            )
+            picked[source] = select_stale(candidates, limit, min_age)
+            print(f"[Recrawl] {source}: {len(rows)} pages, {len(picked[source])} picked (budget {limit})")
+
+        if dry_run:
+            for source, keys in picked.items():
+                for score, age, url, is_interested in keys:
+                    print(f"  [dry-run] {source} score={score:.3f} age={age / DAY:.1f}d interested={is_interested} {url}")
+            return
+        self._publish(picked)
+
+    def _source_budget(self, source, budget):
+        """The cycle's budget for `source`, nothing if its crawl queue is already backed up."""
+        if source == "crunchbase":
+            pending = RabbitMQManager.get_pending_in_crunchbase_crawl_queue()
+        else:
+            pending = RabbitMQManager.get_pending_in_tracxn_crawl_queue()
+        max_depth = getattr(settings, "RECRAWL_MAX_QUEUE_DEPTH", 500)
+        if pending is not None and pending >= max_depth:
+            print(f"[Recrawl] {source}: {pending} messages already queued, skipping this cycle")
+            return 0
+        return budget
+
+    def _candidate(self, url, row, is_interested, state, now):
+        checked = row.updated_at
+        if state is not None and state.last_enqueued_at and (checked is None or state.last_enqueued_at > checked):
+            checked = state.last_enqueued_at
+        # Never crawled as far as we know: as stale as a year-old page
+        age = (now - checked).total_seconds() if checked else 365 * DAY
+        first_seen = (state.first_observed_at if state is not None else None) or row.created_at or now
+        score = recrawl_score(
+            age,
+            changes=state.changes if state is not None else 0,
+            watched_seconds=(now - first_seen).total_seconds(),
+            interested=is_interested,
+        )
+        return score, age, (score, age, url, is_interested)
+
+    def _publish(self, picked):
+        """Publish the picked pages at RECRAWL_RATE per second, alternating between sources."""
+        rate = getattr(settings, "RECRAWL_RATE", 0.5)
+        delay = 1.0 / rate if rate > 0 else 0.0
+        published = 0
+        queues = [[(source, key) for key in keys] for source, keys in picked.items()]
+        for source, (_, _, url, is_interested) in (
+            entry for group in itertools.zip_longest(*queues) for entry in group if entry
+        ):
+            message = {
+                "url": url,
+                "entry_point": "recrawl",
+                "lane": "refresh",
+                "interested": is_interested,
+                # A refresh is a recrawl by definition: bypass the crawler's company dupefilter
+                "dont_filter": True,
+            }
+            if source == "crunchbase":
+                ok = RabbitMQManager.publish_crunchbase_crawl(message)
+            else:
+                ok = RabbitMQManager.publish_tracxn_crawl(message)
+            if not ok:
+                print("[Recrawl] Publish failed (channel unavailable), ending cycle")
+                break
+            mark_enqueued(source, url)
+            published += 1
+            if delay:
+                time.sleep(delay)
+        print(f"[Recrawl] Enqueued {published} page(s)")
@@ -77,10 +77,12 @@ class Command(BaseCommand):
         params = pika.URLParameters(connection_string)
         conn = pika.BlockingConnection(params)
         channel = conn.channel()
-        channel.queue_declare(queue=queue_name, durable=True)
 
         # Ensure manager can publish (separate channel)
         from rabbitmq.apps import RabbitMQManager
+        from rabbitmq.manager import crawl_queue_arguments
+
+        channel.queue_declare(queue=queue_name, durable=True, arguments=crawl_queue_arguments)
 
         RabbitMQManager.connect_to_rabbitmq()
 
@@ -91,7 +93,7 @@ class Command(BaseCommand):
         while True:
             if limit and requeued >= limit:
                 break
-            method_frame, _, body = channel.basic_get(queue=queue_name)
+            method_frame, properties, body = channel.basic_get(queue=queue_name)
             if body is None:
                 break
             url, old_ep = parse_crawl_body(body)
@@ -119,8 +121,10 @@ class Command(BaseCommand):
                 if limit and requeued >= limit:
                     break
                 continue
+            # Keep the message in its lane
             ok = RabbitMQManager.publish_tracxn_crawl(
-                {"url": url, "entry_point": "tracxn"}
+                {"url": url, "entry_point": "tracxn"},
+                priority=properties.priority,
             )
             if not ok:
                 print("Publish failed (channel unavailable), requeuing message")
@@ -156,8 +160,9 @@ class Command(BaseCommand):
                 print(f"  [dry-run] would push: {url[:80]}")
                 pushed += 1
                 continue
+            # Repopulating means recrawling: bypass the crawler's company dupefilter
             ok = RabbitMQManager.publish_tracxn_crawl(
-                {"url": url, "entry_point": "tracxn"}
+                {"url": url, "entry_point": "tracxn", "lane": "refresh", "dont_filter": True}
             )
             if not ok:
                 print("Publish failed (channel unavailable)")
@@ -17,4 +17,4 @@ class Command(BaseCommand):
 
         for index, doc in enumerate(queryset):
             print("Published", doc.name, doc.crunchbase_url, index)
-            RabbitMQManager.publish_crunchbase_crawl({"url": doc.crunchbase_url, "entry_point": "flood_test"})
+            RabbitMQManager.publish_crunchbase_crawl({"url": doc.crunchbase_url, "entry_point": "flood_test", "lane": "refresh", "dont_filter": True})
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.13
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databucket', '0007_tracxnraw_similar_companies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecrawlState',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('source', models.TextField()),
+                ('url', models.TextField()),
+                ('content_hash', models.TextField(blank=True, null=True)),
+                ('observations', models.IntegerField(default=0)),
+                ('changes', models.IntegerField(default=0)),
+                ('first_observed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_observed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_changed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_enqueued_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recrawlstate',
+            index=models.Index(fields=['source', 'url'], name='databucket__source_802b16_idx'),
+        ),
+    ]
@@ -167,3 +167,24 @@ class DiscoveryCache(models.Model):
         indexes = [
             models.Index(fields=['domain']),
         ]
+
+
+class RecrawlState(models.Model):
+    """Change history of a crawled company page, used by the recrawl planner (plan_recrawl)."""
+    _id = models.ObjectIdField()
+    source = models.TextField()  # crunchbase, tracxn
+    url = models.TextField()
+    content_hash = models.TextField(null=True, blank=True)  # fingerprint of the last item received
+    observations = models.IntegerField(default=0)
+    changes = models.IntegerField(default=0)  # items whose content differed from the previous one
+    first_observed_at = models.DateTimeField(null=True, blank=True)
+    last_observed_at = models.DateTimeField(null=True, blank=True)
+    last_changed_at = models.DateTimeField(null=True, blank=True)
+    last_enqueued_at = models.DateTimeField(null=True, blank=True)  # last recrawl sent by the planner
+
+    objects = models.DjongoManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['source', 'url']),
+        ]
@@ -0,0 +1,56 @@
+"""
+Change history of crawled company pages, for the recrawl planner.
+
+The databucket consumers call record_observation for every item they save:
+the item's content fingerprint is compared with the previous one to count
+changes per page. plan_recrawl turns that history into a change rate (see
+utils.staleness) and marks the pages it enqueues with mark_enqueued.
+
+The crawler does not publish a page whose content did not change (content
+hash check), so unchanged recrawls are mostly not observed here; the change
+rate is estimated over time watched, not per crawl, and does not need them.
+"""
+
+from django.utils import timezone
+
+from databucket.models import RecrawlState
+from utils.staleness import content_fingerprint
+
+
+def record_observation(source: str, url: str, data: dict) -> None:
+    """Count a received item for (source, url); a different fingerprint than last time is a change."""
+    url = (url or "").strip().rstrip("/")
+    if not url:
+        return
+    try:
+        now = timezone.now()
+        fingerprint = content_fingerprint(data)
+        state = RecrawlState.objects.filter(source=source, url=url).first()
+        if state is None:
+            RecrawlState.objects.create(
+                source=source,
+                url=url,
+                content_hash=fingerprint,
+                observations=1,
+                first_observed_at=now,
+                last_observed_at=now,
+            )
+            return
+        state.observations += 1
+        state.last_observed_at = now
+        if state.content_hash and state.content_hash != fingerprint:
+            state.changes += 1
+            state.last_changed_at = now
+        state.content_hash = fingerprint
+        state.save()
+    except Exception as e:
+        # Planner bookkeeping must never fail the item
+        print(f"  - [Recrawl] Could not record observation for {url}: {e}")
+
+
+def mark_enqueued(source: str, url: str, when=None) -> None:
+    """Remember that the planner sent `url` for a recrawl."""
+    when = when or timezone.now()
+    updated = RecrawlState.objects.filter(source=source, url=url).update(last_enqueued_at=when)
+    if not updated:
+        RecrawlState.objects.create(source=source, url=url, last_enqueued_at=when)
@@ -4,12 +4,25 @@ the company's industries intersect the configured interested industries.
 
 Used by both Crunchbase and Tracxn databucket consumers after they have the
 merged view (industries + list of similar/competitor URLs).
+
+Similar companies go to the "similar" crawl lane (see utils.crawl_priority):
+below cross-source discovery and far below URLs submitted through the API.
 """
 
 from databucket.models import Crunchbase, InterestedIndustries, TracxnRaw
 from rabbitmq.apps import RabbitMQManager
 
 
+def industries_match_interested(industries: list, interested: list | None = None) -> bool:
+    """True if any of the company's industries is an interested industry."""
+    if interested is None:
+        interested = InterestedIndustries.get_interested_industries()
+    # Ensure industry values are strings for set intersection
+    industries_set = set(str(x) for x in (industries or []) if x is not None)
+    interested_set = set(str(x) for x in (interested or []) if x is not None)
+    return bool(industries_set & interested_set)
+
+
 def publish_similar_companies_if_interested(
     industries: list,
     similar_urls: list,
@@ -25,10 +38,7 @@ def publish_similar_companies_if_interested(
         print("  - Skipping similar company push: no interested industries configured")
         return
 
-    # Ensure industry values are strings for set intersection
-    industries_set = set(str(x) for x in (industries or []) if x is not None)
-    interested_set = set(str(x) for x in interested if x is not None)
-    if not (industries_set & interested_set):
+    if not industries_match_interested(industries, interested):
         print("  - Skipping similar company push: industries not in interested list")
         return
 
@@ -55,7 +65,7 @@ def publish_similar_companies_if_interested(
                 pass
             try:
                 RabbitMQManager.publish_crunchbase_crawl(
-                    {"url": url, "entry_point": entry_point}
+                    {"url": url, "entry_point": entry_point, "lane": "similar", "interested": True}
                 )
                 print(f"  - Pushing similar company (CB) to queue: {url}")
             except Exception as e:
@@ -69,7 +79,7 @@ def publish_similar_companies_if_interested(
                 pass
             try:
                 RabbitMQManager.publish_tracxn_crawl(
-                    {"url": url, "entry_point": "tracxn"}
+                    {"url": url, "entry_point": "tracxn", "lane": "similar", "interested": True}
                 )
                 print(f"  - Pushing similar company (Tracxn) to queue: {url}")
             except Exception as e:
@@ -3,6 +3,8 @@ from django.conf import settings
 from django.apps import AppConfig
 from rabbitmq.manager import RabbitMQManager
 
+PRECONDITION_FAILED = 406
+
 
 class RabbitMQConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -10,4 +12,14 @@ class RabbitMQConfig(AppConfig):
 
     def ready(self):
         # Connect to RabbitMQ upon app initialization
-        RabbitMQManager.connect_to_rabbitmq()
+        try:
+            RabbitMQManager.connect_to_rabbitmq()
+        except pika.exceptions.ChannelClosedByBroker as e:
+            if e.reply_code != PRECONDITION_FAILED:
+                raise
+            # Crawl queues created before x-max-priority: keep manage.py usable so they can be migrated;
+            # publishing stays unavailable (publish_*_crawl return False) until then
+            print(
+                "RabbitMQ: crawl queues are not priority queues yet "
+                f"({e.reply_text}); run `python manage.py migrate_crawl_queues_priority`"
+            )
@@ -2,13 +2,16 @@
 RabbitMQ consumer for databucket queues (replaces Kafka consumers).
 
 Consumes from crunchbase_databucket_queue or tracxn_databucket_queue,
-parses JSON body and calls the provided callback. Acks on success, nacks with
-requeue on failure.
+decodes the message envelope (schema version, optional gzip/zstd, see
+utils/envelope.py) and calls the provided callback. Acks on success, nacks
+with requeue on failure. A message this consumer cannot decode (unknown
+encoding or newer schema) is rejected without requeue, so it does not
+block the queue.
 """
 
-import json
 import pika
 from django.conf import settings
+from utils.envelope import EnvelopeError, decode_message
 
 
 def run_consumer(queue_name, routing_key, exchange, callback):
@@ -19,7 +22,7 @@ def run_consumer(queue_name, routing_key, exchange, callback):
         queue_name: RabbitMQ queue name (e.g. crunchbase_databucket_queue)
         routing_key: Routing key the queue is bound with
         exchange: Exchange name (databucket_exchange)
-        callback: Callable that receives one dict (parsed JSON body). Return True to ack, False to nack+requeue.
+        callback: Callable that receives one dict (decoded JSON body). Return True to ack, False to nack+requeue.
 
     Does not return; runs until interrupted.
     """
@@ -42,7 +45,12 @@ def run_consumer(queue_name, routing_key, exchange, callback):
 
     def on_message(ch, method, properties, body):
         try:
-            data = json.loads(body)
+            data = decode_message(body, properties)
+        except EnvelopeError as e:
+            print(f"Rejecting undecodable message: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        try:
             if callback(data) is True:
                 ch.basic_ack(delivery_tag=method.delivery_tag)
             else:
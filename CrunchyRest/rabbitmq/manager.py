@@ -2,7 +2,9 @@
 
 import pika
 import json
+import time
 from django.conf import settings
+from utils.crawl_priority import MAX_PRIORITY, message_priority
 
 # Crawl queues (decoupled: Crunchbase and Tracxn)
 crawl_exchange = getattr(settings, 'RB_CRAWL_EXCHANGE', 'crawl_exchange')
@@ -10,6 +12,9 @@ crawl_crunchbase_queue = getattr(settings, 'RB_CRUNCHBASE_CRAWL_QUEUE', 'crawl_c
 crawl_crunchbase_rk = getattr(settings, 'RB_CRUNCHBASE_CRAWL_RK', 'crawl_crunchbase')
 crawl_tracxn_queue = getattr(settings, 'RB_TRACXN_CRAWL_QUEUE', 'crawl_tracxn_queue')
 crawl_tracxn_rk = getattr(settings, 'RB_TRACXN_CRAWL_RK', 'crawl_tracxn')
+# Priority lanes: RB_CRAWL_MAX_PRIORITY, read in utils.crawl_priority; must match the crawler's declaration
+crawl_max_priority = MAX_PRIORITY
+crawl_queue_arguments = {'x-max-priority': crawl_max_priority}
 
 # Databucket: queues for scraped items (replaces Kafka topics)
 databucket_exchange = getattr(
@@ -32,6 +37,7 @@ connection_string = settings.RABBITMQ_URL
 
 
 class RabbitMQManager:
+    _connection = None
     _channel = None
     _databucket_channel = None
     _crawl_channel = None
@@ -103,15 +109,18 @@ class RabbitMQManager:
             pass
 
     @classmethod
-    def publish_crunchbase_crawl(cls, message):
-        """Publish a crawl request to the Crunchbase crawl queue (decoupled)."""
+    def publish_crunchbase_crawl(cls, message, priority=None):
+        """Publish a crawl request to the Crunchbase crawl queue (decoupled). Returns True if published, False if channel unavailable.
+        priority defaults to the message's lane (see utils.crawl_priority)."""
         if isinstance(message, dict):
             url = message.get("url", "")
             if url and "crunchbase.com" not in url:
                 raise ValueError("publish_crunchbase_crawl requires a Crunchbase URL")
         cls._ensure_crawl_channel()
         if cls._crawl_channel is None:
-            return
+            return False
+        if priority is None:
+            priority = message_priority(message)
         body = json.dumps(message) if isinstance(message, dict) else message
         cls._crawl_channel.basic_publish(
             exchange=crawl_exchange,
@@ -120,12 +129,17 @@ class RabbitMQManager:
             properties=pika.BasicProperties(
                 delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
                 content_type='application/json',
+                # Crawler reports queue wait time per source from this
+                timestamp=int(time.time()),
+                priority=min(priority, crawl_max_priority),
             ),
         )
+        return True
 
     @classmethod
-    def publish_tracxn_crawl(cls, message):
-        """Publish a crawl request to the Tracxn crawl queue (decoupled). Returns True if published, False if channel unavailable."""
+    def publish_tracxn_crawl(cls, message, priority=None):
+        """Publish a crawl request to the Tracxn crawl queue (decoupled). Returns True if published, False if channel unavailable.
+        priority defaults to the message's lane (see utils.crawl_priority)."""
         if isinstance(message, dict):
             url = message.get("url", "")
             if url and "tracxn.com" not in url:
@@ -133,6 +147,8 @@ class RabbitMQManager:
         cls._ensure_crawl_channel()
         if cls._crawl_channel is None:
             return False
+        if priority is None:
+            priority = message_priority(message)
         body = json.dumps(message) if isinstance(message, dict) else message
         cls._crawl_channel.basic_publish(
             exchange=crawl_exchange,
@@ -141,6 +157,9 @@ class RabbitMQManager:
             properties=pika.BasicProperties(
                 delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
                 content_type='application/json',
+                # Crawler reports queue wait time per source from this
+                timestamp=int(time.time()),
+                priority=min(priority, crawl_max_priority),
             ),
         )
         return True
@@ -151,6 +170,26 @@ class RabbitMQManager:
             return
         parameters = pika.URLParameters(connection_string)
         connection = pika.BlockingConnection(parameters)
+        try:
+            crawl_channel, databucket_channel = RabbitMQManager._declare(connection)
+        except Exception:
+            # e.g. 406 PRECONDITION_FAILED from a crawl queue declared before x-max-priority
+            if connection.is_open:
+                connection.close()
+            raise
+        print("Connected to RabbitMQ")
+        RabbitMQManager.set_crawl_channel(crawl_channel)
+        RabbitMQManager.set_databucket_channel(databucket_channel)
+        # Reconnecting (e.g. plan_recrawl every cycle) replaces the connection: close the old one
+        previous, RabbitMQManager._connection = RabbitMQManager._connection, connection
+        if previous is not None and previous.is_open:
+            try:
+                previous.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _declare(connection):
         crawl_channel = connection.channel()
         databucket_channel = connection.channel()
         connection.add_on_connection_blocked_callback(
@@ -158,9 +197,13 @@ class RabbitMQManager:
 
         # Crawl exchange and queues (decoupled Crunchbase / Tracxn)
         crawl_channel.exchange_declare(exchange=crawl_exchange, exchange_type='direct')
-        crawl_channel.queue_declare(queue=crawl_crunchbase_queue, durable=True)
+        crawl_channel.queue_declare(
+            queue=crawl_crunchbase_queue, durable=True, arguments=crawl_queue_arguments
+        )
         crawl_channel.queue_bind(queue=crawl_crunchbase_queue, exchange=crawl_exchange, routing_key=crawl_crunchbase_rk)
-        crawl_channel.queue_declare(queue=crawl_tracxn_queue, durable=True)
+        crawl_channel.queue_declare(
+            queue=crawl_tracxn_queue, durable=True, arguments=crawl_queue_arguments
+        )
         crawl_channel.queue_bind(queue=crawl_tracxn_queue, exchange=crawl_exchange, routing_key=crawl_tracxn_rk)
 
         # Databucket exchange and queues (for scraped items, replaces Kafka)
@@ -179,10 +222,7 @@ class RabbitMQManager:
             exchange=databucket_exchange,
             routing_key=databucket_tracxn_rk,
         )
-
-        print("Connected to RabbitMQ")
-        RabbitMQManager.set_crawl_channel(crawl_channel)
-        RabbitMQManager.set_databucket_channel(databucket_channel)
+        return crawl_channel, databucket_channel
 
     @staticmethod
     def get_pending_in_tracxn_crawl_queue():
@@ -0,0 +1,37 @@
+from utils.crawl_priority import (
+    LANE_PRIORITIES,
+    MAX_PRIORITY,
+    crawl_priority,
+    lane_for_message,
+    message_priority,
+)
+import unittest
+
+
+class TestCrawlPriority(unittest.TestCase):
+    def test_lane_for_message(self):
+        self.assertEqual(lane_for_message({"url": "u", "lane": "interactive"}), "interactive")
+        self.assertEqual(lane_for_message({"url": "u", "entry_point": "flood_test"}), "refresh")
+        self.assertEqual(lane_for_message({"url": "u", "entry_point": "crunchbase"}), "discovered")
+        self.assertEqual(lane_for_message({"url": "u", "lane": "bogus"}), "discovered")
+
+    def test_lane_order(self):
+        self.assertGreater(crawl_priority("interactive"), crawl_priority("discovered"))
+        self.assertGreater(crawl_priority("discovered"), crawl_priority("similar"))
+        self.assertGreater(crawl_priority("similar"), crawl_priority("refresh"))
+
+    def test_interested_boost(self):
+        self.assertEqual(crawl_priority("similar", interested=True), LANE_PRIORITIES["similar"] + 1)
+        # The boost never reaches the interactive lane
+        self.assertLess(crawl_priority("discovered", interested=True), crawl_priority("interactive"))
+        self.assertEqual(crawl_priority("interactive", interested=True), LANE_PRIORITIES["interactive"])
+
+    def test_message_priority(self):
+        self.assertEqual(message_priority({"url": "u", "lane": "similar", "interested": True}), 4)
+        self.assertEqual(message_priority("https://www.crunchbase.com/organization/x"), crawl_priority())
+        for lane in LANE_PRIORITIES:
+            self.assertTrue(0 <= crawl_priority(lane, True) <= MAX_PRIORITY)
+
+
+if __name__ == '__main__':
+    unittest.main()
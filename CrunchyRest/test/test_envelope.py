@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+from utils.envelope import (
+    SCHEMA_HEADER,
+    SCHEMA_VERSION,
+    EnvelopeError,
+    decode_message,
+    zstandard,
+)
+import gzip
+import json
+import unittest
+
+
+ITEM = {
+    "name": "Hofy",
+    "industries": ["Human Resources", "SaaS"],
+    "long_description": "Hofy lets companies equip remote employees. " * 40,
+}
+
+
+def properties(content_encoding=None, version=SCHEMA_VERSION):
+    headers = {SCHEMA_HEADER: version} if version is not None else None
+    return SimpleNamespace(content_encoding=content_encoding, headers=headers)
+
+
+class TestEnvelope(unittest.TestCase):
+    def test_plain(self):
+        body = json.dumps(ITEM).encode()
+        self.assertEqual(decode_message(body, properties()), ITEM)
+
+    def test_legacy_message_without_envelope(self):
+        # Published before the envelope: no headers, no encoding
+        self.assertEqual(decode_message(json.dumps(ITEM), properties(version=None)), ITEM)
+        self.assertEqual(decode_message(json.dumps(ITEM).encode(), None), ITEM)
+
+    def test_gzip(self):
+        body = gzip.compress(json.dumps(ITEM).encode(), mtime=0)
+        self.assertLess(len(body), len(json.dumps(ITEM)))
+        self.assertEqual(decode_message(body, properties("gzip")), ITEM)
+
+    @unittest.skipIf(zstandard is None, "zstandard not installed")
+    def test_zstd(self):
+        body = zstandard.ZstdCompressor().compress(json.dumps(ITEM).encode())
+        self.assertEqual(decode_message(body, properties("zstd")), ITEM)
+
+    def test_undecodable(self):
+        with self.assertRaises(EnvelopeError):
+            decode_message(b"{}", properties(version=SCHEMA_VERSION + 1))
+        with self.assertRaises(EnvelopeError):
+            decode_message(b"{}", properties("br"))
+        with self.assertRaises(EnvelopeError):
+            decode_message(gzip.compress(b'{"name": "Hofy"}')[:10], properties("gzip"))
+        with self.assertRaises(EnvelopeError):
+            decode_message(b"not json", properties())
+
+
+if __name__ == '__main__':
+    unittest.main()
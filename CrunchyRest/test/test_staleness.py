@@ -0,0 +1,44 @@
+from utils.staleness import (
+    DAY,
+    INTERESTED_WEIGHT,
+    change_probability,
+    change_rate,
+    content_fingerprint,
+    recrawl_score,
+    select_stale,
+)
+import unittest
+
+
+class TestStaleness(unittest.TestCase):
+    def test_content_fingerprint(self):
+        item = {"name": "Hofy", "description": "Laptops  as\na service", "industries": ["SaaS"]}
+        same = {"industries": ["SaaS"], "description": "Laptops as a service", "name": "Hofy",
+                "entry_point": "recrawl", "_response": 200}
+        self.assertEqual(content_fingerprint(item), content_fingerprint(same))
+        self.assertNotEqual(content_fingerprint(item), content_fingerprint({**item, "industries": ["HR"]}))
+
+    def test_change_rate(self):
+        # Observed changes raise the rate, watching without a change lowers it
+        self.assertGreater(change_rate(5, 90 * DAY), change_rate(0, 0))
+        self.assertLess(change_rate(0, 365 * DAY), change_rate(0, 0))
+
+    def test_change_probability(self):
+        self.assertEqual(change_probability(1.0, 0), 0.0)
+        self.assertAlmostEqual(change_probability(1 / DAY, 1000 * DAY), 1.0)
+
+    def test_recrawl_score(self):
+        self.assertGreater(recrawl_score(60 * DAY), recrawl_score(10 * DAY))
+        self.assertGreater(recrawl_score(30 * DAY, changes=6, watched_seconds=180 * DAY),
+                           recrawl_score(30 * DAY, changes=0, watched_seconds=180 * DAY))
+        self.assertAlmostEqual(recrawl_score(30 * DAY, interested=True), INTERESTED_WEIGHT * recrawl_score(30 * DAY))
+
+    def test_select_stale(self):
+        candidates = [(0.9, 40 * DAY, "a"), (0.5, 20 * DAY, "b"), (0.95, 2 * DAY, "c"), (0.7, 30 * DAY, "d")]
+        self.assertEqual(select_stale(candidates, 2, min_age_seconds=7 * DAY), ["a", "d"])
+        self.assertEqual(select_stale(candidates, 10, min_age_seconds=7 * DAY), ["a", "d", "b"])
+        self.assertEqual(select_stale(candidates, 0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Crawl lanes: AMQP message priority for crawl queue publishes."""
+
+try:
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+except ImportError:
+    # Used without Django (unit tests)
+    settings = None
+
+DEFAULT_MAX_PRIORITY = 10
+
+
+def _max_priority():
+    if settings is None:
+        return DEFAULT_MAX_PRIORITY
+    try:
+        return int(getattr(settings, "RB_CRAWL_MAX_PRIORITY", DEFAULT_MAX_PRIORITY))
+    except ImproperlyConfigured:
+        return DEFAULT_MAX_PRIORITY
+
+
+# x-max-priority of the crawl queues (RB_CRAWL_MAX_PRIORITY); rabbitmq.manager declares them with it
+MAX_PRIORITY = _max_priority()
+
+# interactive: submitted through the API, someone is waiting for it
+# discovered:  cross-source discovery (CB <-> Tracxn) of a company we just scraped
+# similar:     similar/competitor fan-out of a company in an interested industry
+# refresh:     bulk recrawls (flood test, requeue from DB)
+LANE_PRIORITIES = {
+    "interactive": 9,
+    "discovered": 5,
+    "similar": 3,
+    "refresh": 1,
+}
+DEFAULT_LANE = "discovered"
+
+# Entry points that are never fresh work
+REFRESH_ENTRY_POINTS = ("flood_test",)
+
+# Companies in an interested industry move up one step, but never into the interactive lane
+INTERESTED_BOOST = 1
+
+
+def lane_for_message(message: dict) -> str:
+    """
+    Lane of a crawl message: its explicit "lane", else derived from "entry_point".
+
+    Examples:
+        - {"url": ..., "lane": "interactive"} -> interactive
+        - {"url": ..., "entry_point": "flood_test"} -> refresh
+        - {"url": ..., "entry_point": "crunchbase"} -> discovered
+    """
+    lane = message.get("lane")
+    if lane in LANE_PRIORITIES:
+        return lane
+    if message.get("entry_point") in REFRESH_ENTRY_POINTS:
+        return "refresh"
+    return DEFAULT_LANE
+
+
+def crawl_priority(lane: str | None = None, interested: bool = False) -> int:
+    """
+    AMQP priority (0..MAX_PRIORITY) for a crawl lane.
+
+    Args:
+        lane: One of LANE_PRIORITIES (unknown/None -> DEFAULT_LANE)
+        interested: The company's industries intersect the interested industries
+
+    Returns:
+        The priority to publish with
+    """
+    priority = LANE_PRIORITIES.get(lane, LANE_PRIORITIES[DEFAULT_LANE])
+    if interested and priority < LANE_PRIORITIES["interactive"]:
+        priority = min(priority + INTERESTED_BOOST, LANE_PRIORITIES["interactive"] - 1)
+    return max(0, min(priority, MAX_PRIORITY))
+
+
+def message_priority(message) -> int:
+    """Priority for a crawl message (dict or raw body); raw bodies get the default lane."""
+    if not isinstance(message, dict):
+        return crawl_priority()
+    return crawl_priority(lane_for_message(message), bool(message.get("interested")))
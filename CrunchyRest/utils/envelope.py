@@ -0,0 +1,65 @@
+"""
+Decoding of databucket message envelopes published by CrunchyCrawler.
+
+The crawler (CrunchyCrawler/rabbitmq/envelope.py) sends the item JSON as the
+body, compressed above a size threshold, with:
+
+    content_encoding  gzip | zstd | (unset: plain JSON)
+    headers           {"x-schema-version": 1}
+
+Messages without the schema header are plain JSON from crawlers that
+predate the envelope and decode the same way.
+"""
+
+import gzip
+import json
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SCHEMA_VERSION = 1
+SCHEMA_HEADER = "x-schema-version"
+
+
+class EnvelopeError(ValueError):
+    """The message cannot be decoded by this version (retrying will not help)."""
+
+
+def schema_version(headers):
+    try:
+        return int((headers or {}).get(SCHEMA_HEADER, 0))
+    except (TypeError, ValueError):
+        raise EnvelopeError(f"Invalid {SCHEMA_HEADER} header: {headers.get(SCHEMA_HEADER)!r}")
+
+
+def decompress(body, content_encoding):
+    if not content_encoding or content_encoding == "identity":
+        return body
+    if content_encoding == "gzip":
+        return gzip.decompress(body)
+    if content_encoding == "zstd":
+        if zstandard is None:
+            raise EnvelopeError("zstd message but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise EnvelopeError(f"Unknown content encoding: {content_encoding}")
+
+
+def decode_message(body, properties=None):
+    """Return the item dict of a databucket message (pika body + BasicProperties)."""
+    headers = getattr(properties, "headers", None)
+    version = schema_version(headers)
+    if version > SCHEMA_VERSION:
+        raise EnvelopeError(f"Unsupported databucket schema version {version}")
+    try:
+        data = decompress(body, getattr(properties, "content_encoding", None))
+    except EnvelopeError:
+        raise
+    except Exception as e:
+        # Truncated or corrupt compressed body (gzip raises OSError/EOFError, zstd its own error)
+        raise EnvelopeError(f"Body cannot be decompressed: {e}")
+    try:
+        return json.loads(data)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise EnvelopeError(f"Body is not JSON: {e}")